@@ -0,0 +1,108 @@
+"""
+Per-token cost of forwarding upstream SSE frames.
+
+Compares the line parser (decode, strip, json.loads, re-encode) with the
+byte pass-through used when UPSTREAM_SSE_PASSTHROUGH is on.
+
+    python -m benchmarks.sse_passthrough [--tokens 20000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from chat_api.chats.chats_services import sse_frame_from_line
+from chat_api.chats.sse import frame_from_line, passthrough_events
+
+
+def build_stream(tokens: int) -> bytes:
+    lines = [json.dumps({"type": "search_results", "data": [{"id": "1", "title": "t", "text": "x" * 200}]})]
+    lines += [json.dumps({"type": "token", "data": f" word{index}"}) for index in range(tokens)]
+    lines.append(json.dumps({"type": "done", "data": {}}))
+    return "".join(f"data: {line}\n\n" for line in lines).encode("utf-8")
+
+
+def chunked(raw: bytes, size: int = 4096):
+    return [raw[start:start + size] for start in range(0, len(raw), size)]
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def line_events(chunks):
+    # What upstream_events does without pass-through: httpx decodes the bytes into
+    # lines, then every line is stripped, parsed and re-encoded.
+    text = b"".join(chunks).decode("utf-8")
+    async for line in _aiter(text.splitlines()):
+        items = []
+        frame = sse_frame_from_line(line, on_json=items.append)
+        if frame:
+            yield frame, items[0] if items else None
+
+
+async def consume(events) -> int:
+    frames = 0
+    async for _ in events:
+        frames += 1
+    return frames
+
+
+async def line_parser(chunks) -> int:
+    return await consume(line_events(chunks))
+
+
+async def passthrough(chunks) -> int:
+    return await consume(passthrough_events(_aiter(chunks)))
+
+
+def measure(run, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def parse_lines(lines) -> None:
+    collected = []
+    for line in lines:
+        sse_frame_from_line(line, on_json=collected.append)
+
+
+def parse_raw_lines(raw_lines) -> None:
+    for line in raw_lines:
+        frame_from_line(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = build_stream(args.tokens)
+    chunks = chunked(raw)
+    lines = raw.decode("utf-8").splitlines()
+    raw_lines = raw.splitlines()
+
+    results = [
+        ("per-frame work", measure(lambda: parse_lines(lines), args.repeat),
+         measure(lambda: parse_raw_lines(raw_lines), args.repeat)),
+        ("end-to-end stream", measure(lambda: asyncio.run(line_parser(chunks)), args.repeat),
+         measure(lambda: asyncio.run(passthrough(chunks)), args.repeat)),
+    ]
+
+    print(f"tokens: {args.tokens}")
+    for name, line_seconds, passthrough_seconds in results:
+        print(
+            f"{name:<18} line parser {line_seconds * 1e6 / args.tokens:.2f} us/token, "
+            f"pass-through {passthrough_seconds * 1e6 / args.tokens:.2f} us/token "
+            f"({line_seconds / passthrough_seconds:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Cost of building and encoding a thread details response.
+
+Compares validated models re-validated by FastAPI against ``response_model`` and
+encoded with the stdlib (the previous path) with constructed models encoded by
+ModelJSONResponse.
+
+    python -m benchmarks.thread_serialization [--turns 500] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from chat_api.json_response import ModelJSONResponse
+from chat_api.threads.thread_enums import MessageRole
+from chat_api.threads.thread_response_model import Message, SearchResult, ThreadResponse
+from chat_api.threads.thread_service import passages_to_search_results, transform_chats_to_messages_from_sorted
+
+RESPONSE_FIELD = create_model_field(name="Response_get_thread_details", type_=ThreadResponse, mode="serialization")
+
+
+def build_rows(turns: int):
+    passages = {
+        f"p{index}": SimpleNamespace(source_id=str(index), title=f"Source {index}", text="passage text " * 40)
+        for index in range(20)
+    }
+    started = datetime(2024, 1, 1)
+    chats = [
+        SimpleNamespace(
+            id=uuid4(),
+            question=f"Question {index} about the teachings?",
+            answer="An answer sentence. " * 60,
+            search_results=None,
+            passage_ids=[f"p{(index + offset) % 20}" for offset in range(5)],
+            response=None,
+            created_at=started + timedelta(minutes=index),
+        )
+        for index in range(turns)
+    ]
+    return chats, passages
+
+
+def validated_response(thread_id, chats, passages) -> ThreadResponse:
+    # The service before model_construct: every model validated on creation.
+    results = {
+        pid: SearchResult(id=passage.source_id, title=passage.title, text=passage.text)
+        for pid, passage in passages.items()
+    }
+    messages = []
+    for chat in chats:
+        messages.append(Message(role=MessageRole.USER, content=chat.question, id=chat.id, searchResults=None))
+        messages.append(Message(
+            role=MessageRole.ASSISTANT,
+            content=chat.answer,
+            id=chat.id,
+            searchResults=[results[pid] for pid in chat.passage_ids],
+        ))
+    return ThreadResponse(id=thread_id, title="Thread", messages=messages, next_cursor=None)
+
+
+async def previous_path(thread_id, chats, passages) -> bytes:
+    content = await serialize_response(
+        field=RESPONSE_FIELD, response_content=validated_response(thread_id, chats, passages)
+    )
+    return JSONResponse(content).body
+
+
+def constructed_path(thread_id, chats, passages) -> bytes:
+    response = ThreadResponse.model_construct(
+        id=thread_id,
+        title="Thread",
+        messages=transform_chats_to_messages_from_sorted(chats, passages_to_search_results(passages)),
+        next_cursor=None,
+    )
+    return ModelJSONResponse(response).body
+
+
+def measure(run, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    thread_id = uuid4()
+    chats, passages = build_rows(args.turns)
+    previous = asyncio.run(previous_path(thread_id, chats, passages))
+    constructed = constructed_path(thread_id, chats, passages)
+    assert json.loads(constructed) == json.loads(previous)
+
+    previous_seconds = measure(lambda: asyncio.run(previous_path(thread_id, chats, passages)), args.repeat)
+    constructed_seconds = measure(lambda: constructed_path(thread_id, chats, passages), args.repeat)
+
+    print(f"turns: {args.turns} ({2 * args.turns} messages), {len(previous) / 1024:.0f} KiB")
+    print(
+        f"validated + stdlib {previous_seconds * 1e3:.2f} ms, "
+        f"constructed + ModelJSONResponse {constructed_seconds * 1e3:.2f} ms "
+        f"({previous_seconds / constructed_seconds:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from chat_api.applications.models import Application
 from chat_api.threads.models import Thread
 from chat_api.chats.models import Chat
+from chat_api.passages.models import Passage
 
 from chat_api.threads.thread_views import thread_router
 from chat_api.chats.chats_views import chats_router
 from chat_api.applications.application_views import applications_router
+from chat_api.applications.application_registry import application_registry
+from chat_api.chats.chat_writer import chat_writer, is_write_behind_enabled
+from chat_api.http_client import close_http_client, get_http_client
+from chat_api.views.metrics import router as metrics_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_http_client()
+    await application_registry.reload()
+    if is_write_behind_enabled():
+        await chat_writer.start()
+    yield
+    await chat_writer.stop()
+    await close_http_client()
+
 
-api = FastAPI(title="ai-chat")
+api = FastAPI(title="ai-chat", lifespan=lifespan)
 api.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,4 +38,5 @@ api.add_middleware(
 )
 api.include_router(thread_router)
 api.include_router(chats_router)
-api.include_router(applications_router)
\ No newline at end of file
+api.include_router(applications_router)
+api.include_router(metrics_router)
\ No newline at end of file
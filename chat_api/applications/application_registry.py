@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import UUID
+
+from chat_api.applications.applications_repository import get_application_ids_by_name
+from chat_api.config import get_float
+from chat_api.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def load_application_ids() -> Dict[str, UUID]:
+    async with SessionLocal() as db_session:
+        return await get_application_ids_by_name(db_session)
+
+
+class ApplicationRegistry:
+    """
+    In-process name -> id map of all applications.
+
+    The whole table is reloaded once ``ttl_seconds`` have passed, or earlier when
+    an unknown name is looked up (at most once per ``min_reload_interval_seconds``,
+    so requests for a bogus application cannot hammer the database). Concurrent
+    callers share a single reload. A reload that started before ``invalidate`` is
+    discarded when it finishes, so it cannot bring back the invalidated list.
+    """
+
+    def __init__(
+        self,
+        load_ids: Callable[[], Awaitable[Dict[str, UUID]]],
+        ttl_seconds: float,
+        min_reload_interval_seconds: float,
+    ):
+        self._load_ids = load_ids
+        self._ttl_seconds = ttl_seconds
+        self._min_reload_interval_seconds = min_reload_interval_seconds
+        self._ids_by_name: Dict[str, UUID] = {}
+        self._loaded_at: Optional[float] = None
+        self._last_attempt_at: Optional[float] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._generation = 0
+
+    async def get_application_id(self, name: str) -> Optional[UUID]:
+        application_id = self._ids_by_name.get(name)
+        if application_id is not None and self._is_fresh():
+            return application_id
+        if self._can_reload():
+            await self.reload()
+        return self._ids_by_name.get(name)
+
+    async def reload(self) -> None:
+        if self._reload_task is None or self._reload_task.done():
+            self._last_attempt_at = time.monotonic()
+            self._reload_task = asyncio.ensure_future(self._load_and_store())
+        await asyncio.shield(self._reload_task)
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._loaded_at = None
+        self._last_attempt_at = None
+        # The next reload must not join one started before the invalidation.
+        self._reload_task = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl_seconds
+
+    def _can_reload(self) -> bool:
+        if self._loaded_at is None or self._last_attempt_at is None:
+            return True
+        return time.monotonic() - self._last_attempt_at >= self._min_reload_interval_seconds
+
+    async def _load_and_store(self) -> None:
+        generation = self._generation
+        try:
+            ids_by_name = await self._load_ids()
+        except Exception as e:
+            logger.warning(f"Failed to load applications, keeping {len(self._ids_by_name)} cached: {e}")
+            return
+        if generation != self._generation:
+            logger.info("Discarding an application reload that started before the registry was invalidated")
+            return
+        self._ids_by_name = ids_by_name
+        self._loaded_at = time.monotonic()
+
+
+application_registry = ApplicationRegistry(
+    load_application_ids,
+    ttl_seconds=get_float("APPLICATION_REGISTRY_TTL_SECONDS"),
+    min_reload_interval_seconds=get_float("APPLICATION_REGISTRY_MIN_RELOAD_INTERVAL_SECONDS"),
+)
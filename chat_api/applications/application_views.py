@@ -10,5 +10,5 @@ applications_router = APIRouter(
 )
 
 @applications_router.post("")
-def create_application(application: ApplicationCreateRequest) -> ApplicationResponse:
-    return create_application_service(application=application)
\ No newline at end of file
+async def create_application(application: ApplicationCreateRequest) -> ApplicationResponse:
+    return await create_application_service(application=application)
\ No newline at end of file
@@ -1,17 +1,23 @@
-from typing import Optional
+from typing import Dict, Optional
+from uuid import UUID
 
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from chat_api.applications.models import Application
 from chat_api.applications.applications_response_models import ApplicationCreateRequest
 
-def get_application_by_name(db: Session, name: str) -> Application:
-    return db.execute(select(Application).where(Application.name == name)).scalar_one()
+async def get_application_by_name(db: AsyncSession, name: str) -> Optional[Application]:
+    result = await db.execute(select(Application).where(Application.name == name))
+    return result.scalar_one_or_none()
 
-def create_application_repo(db: Session, application: ApplicationCreateRequest) -> Application:
+async def get_application_ids_by_name(db: AsyncSession) -> Dict[str, UUID]:
+    result = await db.execute(select(Application.name, Application.id))
+    return {name: application_id for name, application_id in result.all()}
+
+async def create_application_repo(db: AsyncSession, application: ApplicationCreateRequest) -> Application:
     db_application = Application(name=application.name)
     db.add(db_application)
-    db.commit()
-    db.refresh(db_application)
+    await db.commit()
+    await db.refresh(db_application)
     return db_application
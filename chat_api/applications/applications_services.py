@@ -1,21 +1,22 @@
 from chat_api.applications.applications_repository import get_application_by_name, create_application_repo
+from chat_api.applications.application_registry import application_registry
 from chat_api.applications.models import Application
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from chat_api.db import SessionLocal
 
 from chat_api.applications.applications_response_models import ApplicationCreateRequest
 
-def get_application_by_name_service(db: SessionLocal(), name: str) -> Application:
+async def get_application_by_name_service(db: AsyncSession, name: str) -> Application:
 
-    with SessionLocal() as db_session:
-        application = get_application_by_name(db_session, name=name)
-        if application is None:
-            raise HTTPException(status_code=404, detail="Application not found")
-        return application
+    application = await get_application_by_name(db, name=name)
+    if application is None:
+        raise HTTPException(status_code=404, detail="Application not found")
+    return application
 
 
-def create_application_service(application: ApplicationCreateRequest) -> Application:
-    with SessionLocal() as db_session:
-        application = create_application_repo(db_session, application=application)
-        return application
-
+async def create_application_service(application: ApplicationCreateRequest) -> Application:
+    async with SessionLocal() as db_session:
+        application = await create_application_repo(db_session, application=application)
+    application_registry.invalidate()
+    return application
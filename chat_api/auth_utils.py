@@ -1,45 +1,207 @@
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Annotated
 
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-import requests
-
-from chat_api.config import get
-
-
-def validate_token(token: str) -> Dict[str, Any]:
+from starlette import status
+
+from chat_api.config import get, get_float, get_int
+from chat_api.error_contant import ErrorConstant, ResponseError
+from chat_api.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+oauth2_scheme = HTTPBearer()
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    email: str
+    issuer: Optional[str] = None
+
+
+class VerifiedClaimsCache:
+    """
+    LRU cache of already verified token claims, keyed by a SHA-256 of the token.
+
+    An entry never outlives the token's own ``exp`` claim and is kept at most
+    ``max_ttl_seconds`` even for long-lived tokens.
+    """
+
+    def __init__(self, max_size: int, max_ttl_seconds: float):
+        self._max_size = max_size
+        self._max_ttl_seconds = max_ttl_seconds
+        self._entries: "OrderedDict[bytes, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        if self._max_size <= 0:
+            return
+        expires_at = time.time() + self._max_ttl_seconds
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+verified_claims_cache = VerifiedClaimsCache(
+    max_size=get_int("VERIFIED_CLAIMS_CACHE_SIZE"),
+    max_ttl_seconds=get_float("VERIFIED_CLAIMS_CACHE_MAX_TTL_SECONDS"),
+)
+
+
+async def validate_token(token: str) -> Dict[str, Any]:
+
+    claims = verified_claims_cache.get(token)
+    if claims is not None:
+        return claims
 
     if get("DOMAIN_NAME") in jwt.get_unverified_claims(token=token)["iss"]:
-        return verify_auth0_token(token)
+        claims = await verify_auth0_token(token)
     else:
-        return decode_backend_token(token)
+        claims = decode_backend_token(token)
+
+    verified_claims_cache.put(token, claims)
+    return claims
 
 
 def decode_backend_token(token: str) -> Dict[str, Any]:
     claims = jwt.get_unverified_claims(token)
     logging.info(f"Token audience: {claims.get('aud')}, Expected: {get('JWT_AUD')}")
-    
+
     return jwt.decode(
-        token, 
-        get("JWT_SECRET_KEY"), 
-        algorithms=[get("JWT_ALGORITHM")], 
+        token,
+        get("JWT_SECRET_KEY"),
+        algorithms=[get("JWT_ALGORITHM")],
         audience=get("JWT_AUD")
     )
 
 
-def get_auth0_public_key():
+async def fetch_auth0_jwks() -> Dict[str, Dict[str, Any]]:
 
     jwks_url = f"https://{get('DOMAIN_NAME')}/.well-known/jwks.json"
-    jwks = requests.get(jwks_url).json()
+    response = await get_http_client().get(jwks_url, timeout=get_float("JWKS_FETCH_TIMEOUT_SECONDS"))
+    response.raise_for_status()
+    jwks = response.json()
     return {key["kid"]: key for key in jwks["keys"]}
 
 
-def verify_auth0_token(token: str) -> Dict[str, Any]:
+class JWKSKeyStore:
+    """
+    Caches the Auth0 signing keys by ``kid``.
+
+    Keys are refetched once ``ttl_seconds`` have passed, or earlier when a token
+    carries an unknown ``kid``. Refetches are spaced at least
+    ``min_refresh_interval_seconds`` apart and concurrent callers share one fetch.
+    If a fetch fails the previously known keys keep being served.
+    """
+
+    def __init__(self, fetch_keys, ttl_seconds: float, min_refresh_interval_seconds: float):
+        self._fetch_keys = fetch_keys
+        self._ttl_seconds = ttl_seconds
+        self._min_refresh_interval_seconds = min_refresh_interval_seconds
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at: Optional[float] = None
+        self._last_attempt_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        key = self._keys.get(kid)
+        if key is not None and self._is_fresh():
+            return key
+        if self._can_refresh():
+            await self._refresh()
+        return self._keys.get(kid)
+
+    def clear(self) -> None:
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt_at = None
+        self._refresh_task = None
+
+    def _is_fresh(self) -> bool:
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self._ttl_seconds
+
+    def _can_refresh(self) -> bool:
+        if not self._keys or self._last_attempt_at is None:
+            return True
+        return time.monotonic() - self._last_attempt_at >= self._min_refresh_interval_seconds
+
+    async def _refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_attempt_at = time.monotonic()
+            self._refresh_task = asyncio.ensure_future(self._fetch_and_store())
+        await asyncio.shield(self._refresh_task)
+
+    async def _fetch_and_store(self) -> None:
+        try:
+            keys = await self._fetch_keys()
+        except Exception as e:
+            logger.warning(f"Failed to refresh JWKS, keeping {len(self._keys)} cached keys: {e}")
+            return
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+
+jwks_key_store = JWKSKeyStore(
+    fetch_auth0_jwks,
+    ttl_seconds=get_float("JWKS_CACHE_TTL_SECONDS"),
+    min_refresh_interval_seconds=get_float("JWKS_MIN_REFRESH_INTERVAL_SECONDS"),
+)
+
+
+async def get_auth0_public_key(kid: str) -> Optional[Dict[str, Any]]:
+    return await jwks_key_store.get_key(kid)
+
+
+async def verify_auth0_token(token: str) -> Dict[str, Any]:
 
     try:
-        jwks = get_auth0_public_key()
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = jwks.get(unverified_header["kid"])
+        rsa_key = await get_auth0_public_key(unverified_header["kid"])
 
         if not rsa_key:
             raise ValueError("Unable to find appropriate key")
@@ -56,14 +218,28 @@ def verify_auth0_token(token: str) -> Dict[str, Any]:
         raise ValueError(f"Token validation failed: {e}")
 
 
-def get_user_email_from_token(token: str) -> str:
+async def get_authenticated_user(token: str) -> AuthenticatedUser:
 
     try:
-        payload = validate_token(token)
-        email = payload.get("email")
-        if email is None:
-            raise ValueError("Email not found in token")
-        return email
+        payload = await validate_token(token)
     except Exception as e:
-        logging.error(f"Error extracting email from token: {e}")
+        logging.error(f"Error validating token: {e}")
         raise ValueError(f"Invalid token: {e}")
+
+    email = payload.get("email")
+    if email is None:
+        raise ValueError("Invalid token: Email not found in token")
+    return AuthenticatedUser(email=email, issuer=payload.get("iss"))
+
+
+async def get_current_user(
+    authentication_credential: Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)]
+) -> AuthenticatedUser:
+    try:
+        return await get_authenticated_user(authentication_credential.credentials)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=ResponseError(error=ErrorConstant.UNAUTHORIZED, message=ErrorConstant.INVALID_TOKEN).model_dump(),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from chat_api.config import get_float, get_int
+from chat_api.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "upstream_admission_wait_seconds",
+    "Time chat requests waited for an upstream stream slot.",
+)
+ADMISSION_REJECTIONS = Counter(
+    "upstream_admission_rejections_total",
+    "Chat requests turned away before reaching the upstream, by reason.",
+    ["reason"],
+)
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, reason: str, retry_after_seconds: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionSlot:
+    """One admitted upstream stream; release it exactly once when the stream ends."""
+
+    def __init__(self, limiter: "FairAdmissionLimiter"):
+        self._limiter = limiter
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(time.monotonic() - self._acquired_at)
+
+    def transfer(self) -> "AdmissionSlot":
+        """Hand the slot to a new owner; releasing this handle afterwards does nothing."""
+        slot = AdmissionSlot(self._limiter)
+        slot._acquired_at = self._acquired_at
+        slot._released = self._released
+        self._released = True
+        return slot
+
+    def __del__(self):
+        if not self._released:
+            logger.warning("Admission slot was garbage collected without being released")
+
+
+class FairAdmissionLimiter:
+    """
+    Caps concurrent upstream streams and queues the excess fairly.
+
+    Waiters are served round robin across applications, then round robin across
+    the users of that application, so one busy user or application cannot starve
+    the rest. At most ``max_queue_size`` requests wait, each for at most
+    ``max_wait_seconds``; beyond that :class:`AdmissionRejected` is raised, with a
+    retry delay estimated from the queue depth and how long slots are usually held.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue_size: int, max_wait_seconds: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue_size = max_queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.active = 0
+        self.waiting = 0
+        self.mean_hold_seconds: Optional[float] = None
+        self._waiters: "OrderedDict[str, OrderedDict[str, Deque[asyncio.Future]]]" = OrderedDict()
+
+    @property
+    def retry_after_seconds(self) -> int:
+        hold_seconds = self.mean_hold_seconds if self.mean_hold_seconds is not None else self.max_wait_seconds
+        # Every slot frees up about once per mean hold time; the caller queues behind everyone waiting.
+        return max(1, math.ceil(hold_seconds * (self.waiting + 1) / self.max_concurrent))
+
+    async def acquire(self, application: str, user: str) -> AdmissionSlot:
+        if self.active < self.max_concurrent and self.waiting == 0:
+            self.active += 1
+            ADMISSION_WAIT_SECONDS.observe(0.0)
+            return AdmissionSlot(self)
+
+        if self.waiting >= self.max_queue_size:
+            ADMISSION_REJECTIONS.inc(reason="queue_full")
+            raise AdmissionRejected("queue_full", self.retry_after_seconds)
+
+        waiter = asyncio.get_running_loop().create_future()
+        users = self._waiters.setdefault(application, OrderedDict())
+        users.setdefault(user, deque()).append(waiter)
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # Granted just as we gave up: hand the slot straight back.
+                self._release()
+            else:
+                waiter.cancel()
+                self.waiting -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTIONS.inc(reason="timeout")
+                raise AdmissionRejected("timeout", self.retry_after_seconds)
+            raise
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+        return AdmissionSlot(self)
+
+    def _release(self, held_seconds: Optional[float] = None) -> None:
+        if held_seconds is not None:
+            self.mean_hold_seconds = (
+                held_seconds if self.mean_hold_seconds is None
+                else 0.9 * self.mean_hold_seconds + 0.1 * held_seconds
+            )
+        self.active -= 1
+        while self.active < self.max_concurrent:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self.waiting -= 1
+            self.active += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        while self._waiters:
+            application, users = next(iter(self._waiters.items()))
+            self._waiters.move_to_end(application)
+            user, queue = next(iter(users.items()))
+            users.move_to_end(user)
+            waiter = queue.popleft()
+            if not queue:
+                del users[user]
+                if not users:
+                    del self._waiters[application]
+            # Waiters that gave up are cancelled and already uncounted.
+            if not waiter.done():
+                return waiter
+        return None
+
+
+chat_admission = FairAdmissionLimiter(
+    max_concurrent=get_int("UPSTREAM_MAX_CONCURRENT_STREAMS"),
+    max_queue_size=get_int("UPSTREAM_ADMISSION_QUEUE_SIZE"),
+    max_wait_seconds=get_float("UPSTREAM_ADMISSION_MAX_WAIT_SECONDS"),
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "upstream_admission_queue_depth",
+    "Chat requests waiting for an upstream stream slot.",
+    function=lambda: chat_admission.waiting,
+)
+ADMISSION_ACTIVE = Gauge(
+    "upstream_admission_active_streams",
+    "Upstream streams currently admitted.",
+    function=lambda: chat_admission.active,
+)
@@ -0,0 +1,402 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set
+from uuid import UUID, uuid4
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from chat_api.chats.chats_reponse_model import ChatResponsePayload
+from chat_api.chats.chats_repository import save_chats
+from chat_api.chats.history_builder import estimate_chat_size, extract_answer
+from chat_api.config import get, get_bool, get_float, get_int
+from chat_api.db import SessionLocal
+from chat_api.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITES = Counter(
+    "chat_writes_total",
+    "Chats handed to the write-behind queue, by how they were persisted.",
+    ["outcome"],
+)
+
+
+@dataclass
+class PendingChat:
+    id: UUID
+    thread_id: UUID
+    question: str
+    response: list
+    size_estimate: int
+    created_at: datetime
+
+    @classmethod
+    def from_payload(cls, payload: ChatResponsePayload) -> "PendingChat":
+        return cls(
+            id=uuid4(),
+            thread_id=payload.thread_id,
+            question=payload.question,
+            response=payload.response,
+            size_estimate=estimate_chat_size(payload.question, extract_answer(payload.response)),
+            created_at=datetime.utcnow(),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "thread_id": str(self.thread_id),
+            "question": self.question,
+            "response": self.response,
+            "size_estimate": self.size_estimate,
+            "created_at": self.created_at.isoformat(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "PendingChat":
+        return cls(
+            id=UUID(data["id"]),
+            thread_id=UUID(data["thread_id"]),
+            question=data["question"],
+            response=data["response"],
+            size_estimate=data["size_estimate"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+        )
+
+
+def is_transient_write_error(error: BaseException) -> bool:
+    """Whether ``error`` says the database was unreachable rather than that a row was bad."""
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (OperationalError, InterfaceError, OSError, asyncio.TimeoutError))
+
+
+class ChatWriteBehindQueue:
+    """
+    Persists finished chats off the request path.
+
+    Chats are buffered in memory and written by one background task in batches of
+    up to ``batch_size``, at least every ``flush_interval_seconds``. A batch that
+    cannot be written because the database is unreachable (or that overflows the
+    queue) is appended to ``spool_path`` as JSON lines and replayed every
+    ``replay_interval_seconds``. Appends and the replay's claim of the file hold an
+    exclusive lock on ``{spool_path}.lock``, so no line can land in a spool that
+    was already claimed, whether it comes from this worker or another one sharing
+    the path. Any other batch failure is retried row by row and
+    rows that still fail are moved to ``{spool_path}.quarantine`` so they cannot
+    block the rest. Writes are idempotent on the chat id, so a batch may safely be
+    spooled and written twice.
+
+    ``stop`` lets the in-flight batch and the queue drain for up to
+    ``stop_timeout_seconds``; whatever is still unwritten then is spooled.
+
+    Reads are not read-your-writes: a chat is missing from the thread's messages
+    until its batch is written, up to ``flush_interval_seconds`` normally and
+    ``replay_interval_seconds`` or longer when it was spooled. Only this worker's
+    history cache sees it sooner. That is why the queue is opt-in.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[PendingChat]], Awaitable[None]],
+        batch_size: int,
+        flush_interval_seconds: float,
+        max_queue_size: int,
+        spool_path: str,
+        replay_interval_seconds: float,
+        stop_timeout_seconds: float = 10.0,
+    ):
+        self._write_batch = write_batch
+        self._batch_size = batch_size
+        self._flush_interval_seconds = flush_interval_seconds
+        self._max_queue_size = max_queue_size
+        self._spool_path = spool_path
+        self._replay_interval_seconds = replay_interval_seconds
+        self._stop_timeout_seconds = stop_timeout_seconds
+        self._quarantine_path = f"{spool_path}.quarantine"
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._batch: List[PendingChat] = []
+        self._in_flight: List[PendingChat] = []
+        self._spool_tasks: Set[asyncio.Task] = set()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping.is_set()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), self._stop_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat writer did not drain within {self._stop_timeout_seconds}s, spooling the rest")
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            leftover = self._in_flight + self._batch + self._drain_queue()
+            self._in_flight, self._batch = [], []
+            if leftover:
+                await self._spool(leftover)
+        self._task = None
+        if self._spool_tasks:
+            await asyncio.gather(*self._spool_tasks)
+
+    def submit(self, chat: PendingChat) -> bool:
+        """Queue ``chat`` for writing; returns False when the writer is not running."""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(chat)
+        except asyncio.QueueFull:
+            logger.warning("Chat write queue is full, spooling chat %s", chat.id)
+            task = asyncio.create_task(self._spool([chat]))
+            self._spool_tasks.add(task)
+            task.add_done_callback(self._spool_tasks.discard)
+        return True
+
+    async def _run(self) -> None:
+        await self._replay_orphaned_spools()
+        await self._replay_spool()
+        loop = asyncio.get_running_loop()
+        next_replay = loop.time() + self._replay_interval_seconds
+        while not self._stopping.is_set():
+            await self._collect_batch()
+            if self._batch:
+                batch, self._batch = self._batch, []
+                await self._flush(batch)
+            if loop.time() >= next_replay:
+                await self._replay_spool()
+                next_replay = loop.time() + self._replay_interval_seconds
+
+        remaining = self._drain_queue()
+        for start in range(0, len(remaining), self._batch_size):
+            await self._flush(remaining[start:start + self._batch_size])
+
+    def _drain_queue(self) -> List[PendingChat]:
+        chats = []
+        while not self._queue.empty():
+            chats.append(self._queue.get_nowait())
+        return chats
+
+    async def _collect_batch(self) -> None:
+        loop = asyncio.get_running_loop()
+        chat = await self._next_chat(self._replay_interval_seconds)
+        if chat is None:
+            return
+        self._batch.append(chat)
+        deadline = loop.time() + self._flush_interval_seconds
+        while len(self._batch) < self._batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            chat = await self._next_chat(remaining)
+            if chat is None:
+                break
+            self._batch.append(chat)
+
+    async def _next_chat(self, timeout: float) -> Optional[PendingChat]:
+        """The next queued chat, or None after ``timeout`` or once stopping."""
+        getter = asyncio.ensure_future(self._queue.get())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({getter, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if not getter.done():
+                getter.cancel()
+        if getter.done() and not getter.cancelled():
+            return getter.result()
+        return None
+
+    async def _flush(self, batch: List[PendingChat]) -> None:
+        # Left set if the flush is cancelled, so stop() can spool the batch.
+        self._in_flight = batch
+        try:
+            await self._write_batch(batch)
+        except Exception as e:
+            if is_transient_write_error(e):
+                logger.error(f"Failed to write {len(batch)} chats, spooling them: {e}")
+                await self._spool(batch)
+            else:
+                logger.warning(f"Failed to write a batch of {len(batch)} chats, retrying row by row: {e}")
+                await self._write_rows(batch)
+        else:
+            CHAT_WRITES.inc(len(batch), outcome="written")
+        self._in_flight = []
+
+    async def _write_rows(self, batch: List[PendingChat]) -> None:
+        for index, chat in enumerate(batch):
+            try:
+                await self._write_batch([chat])
+            except Exception as e:
+                if is_transient_write_error(e):
+                    logger.error(f"Failed to write {len(batch) - index} chats, spooling them: {e}")
+                    await self._spool(batch[index:])
+                    return
+                logger.error(f"Quarantining chat {chat.id} that cannot be written: {e}")
+                await self._quarantine(chat)
+            else:
+                CHAT_WRITES.inc(outcome="written")
+
+    async def _spool(self, batch: List[PendingChat]) -> None:
+        try:
+            await asyncio.to_thread(_append_to_spool, self._spool_path, _spool_lines(batch))
+        except OSError as e:
+            logger.error(f"Failed to spool {len(batch)} chats to {self._spool_path}, dropping them: {e}")
+            CHAT_WRITES.inc(len(batch), outcome="dropped")
+            return
+        CHAT_WRITES.inc(len(batch), outcome="spooled")
+
+    async def _quarantine(self, chat: PendingChat) -> None:
+        try:
+            await asyncio.to_thread(_append_to_file, self._quarantine_path, _spool_lines([chat]))
+        except OSError as e:
+            logger.error(f"Failed to quarantine chat {chat.id} to {self._quarantine_path}, dropping it: {e}")
+            CHAT_WRITES.inc(outcome="dropped")
+            return
+        CHAT_WRITES.inc(outcome="quarantined")
+
+    async def _replay_orphaned_spools(self) -> None:
+        """Replay claimed spool files left behind by workers that died mid-replay."""
+        pattern = re.compile(re.escape(self._spool_path) + r"\.(\d+)\.replay$")
+        for path in glob.glob(f"{glob.escape(self._spool_path)}.*.replay"):
+            match = pattern.match(path)
+            if match is None or _is_process_alive(int(match.group(1))):
+                continue
+            logger.info(f"Replaying orphaned chat spool {path}")
+            await self._replay_spool(path)
+
+    async def _replay_spool(self, source_path: Optional[str] = None) -> None:
+        replay_path = f"{self._spool_path}.{os.getpid()}.replay"
+        try:
+            # Claim the spool atomically so concurrent workers never replay the same file.
+            await asyncio.to_thread(_claim_spool, self._spool_path, source_path or self._spool_path, replay_path)
+        except FileNotFoundError:
+            return
+        try:
+            chats = await asyncio.to_thread(_read_spool, replay_path)
+        except OSError as e:
+            logger.error(f"Failed to read chat spool {replay_path}: {e}")
+            return
+
+        logger.info(f"Replaying {len(chats)} spooled chats")
+        for start in range(0, len(chats), self._batch_size):
+            await self._flush(chats[start:start + self._batch_size])
+        os.remove(replay_path)
+
+
+def _spool_lines(batch: List[PendingChat]) -> str:
+    return "".join(json.dumps(chat.to_json(), ensure_ascii=False) + "\n" for chat in batch)
+
+
+def _is_process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        # Our own claim can only be left over from an earlier, cancelled replay.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _spool_lock(spool_path: str) -> Iterator[None]:
+    """
+    Hold the exclusive lock guarding ``spool_path``.
+
+    flock locks belong to the open file, so this serializes threads of one worker
+    as well as separate workers.
+    """
+    lock_path = f"{spool_path}.lock"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _append_to_spool(spool_path: str, data: str) -> None:
+    # Opened under the lock: an append never writes to a spool that was claimed meanwhile.
+    with _spool_lock(spool_path):
+        _append_to_file(spool_path, data)
+
+
+def _claim_spool(spool_path: str, source_path: str, replay_path: str) -> None:
+    with _spool_lock(spool_path):
+        os.replace(source_path, replay_path)
+
+
+def _append_to_file(path: str, data: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as spool:
+        spool.write(data)
+        spool.flush()
+        os.fsync(spool.fileno())
+
+
+def _read_spool(path: str) -> List[PendingChat]:
+    chats = []
+    with open(path, encoding="utf-8") as spool:
+        for line in spool:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                chats.append(PendingChat.from_json(json.loads(line)))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable spooled chat: {e}")
+    return chats
+
+
+async def write_chat_batch(batch: List[PendingChat]) -> None:
+    async with SessionLocal() as db_session:
+        await save_chats(db_session, batch)
+
+
+def is_write_behind_enabled() -> bool:
+    return get_bool("CHAT_WRITE_BEHIND_ENABLED")
+
+
+chat_writer = ChatWriteBehindQueue(
+    write_chat_batch,
+    batch_size=get_int("CHAT_WRITE_BATCH_SIZE"),
+    flush_interval_seconds=get_float("CHAT_WRITE_FLUSH_INTERVAL_SECONDS"),
+    max_queue_size=get_int("CHAT_WRITE_QUEUE_SIZE"),
+    spool_path=get("CHAT_WRITE_SPOOL_PATH"),
+    replay_interval_seconds=get_float("CHAT_WRITE_REPLAY_INTERVAL_SECONDS"),
+    stop_timeout_seconds=get_float("CHAT_WRITE_STOP_TIMEOUT_SECONDS"),
+)
+QUEUE_DEPTH = Gauge(
+    "chat_write_queue_depth",
+    "Chats waiting in the write-behind queue.",
+    function=chat_writer.queue_depth,
+)
@@ -1,14 +1,147 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Sequence
+from uuid import UUID
+
 from chat_api.chats.models import Chat
 from chat_api.chats.chats_reponse_model import ChatResponsePayload
-from sqlalchemy.orm import Session
+from chat_api.chats.history_builder import estimate_chat_size
+from chat_api.chats.response_parts import split_response
+from chat_api.passages.passage_repository import save_passages, to_passage_rows
+from chat_api.threads.models import Thread
+from sqlalchemy import Row, bindparam, case, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+if TYPE_CHECKING:
+    from chat_api.chats.chat_writer import PendingChat
 
-def save_chat(db: Session, response_payload: ChatResponsePayload):
+async def save_chat(db: AsyncSession, response_payload: ChatResponsePayload):
+    now = datetime.utcnow()
+    parts = split_response(response_payload.response)
+    passage_rows = to_passage_rows(parts.search_results or [])
+    await save_passages(db, passage_rows)
     chat = Chat(
         thread_id=response_payload.thread_id,
-        response=response_payload.response,
-        question=response_payload.question
+        response=parts.remaining,
+        answer=parts.answer,
+        passage_ids=[row["id"] for row in passage_rows] or None,
+        question=response_payload.question,
+        size_estimate=estimate_chat_size(response_payload.question, parts.answer),
+        created_at=now,
+        updated_at=now
     )
     db.add(chat)
-    db.commit()
-    db.refresh(chat)
-    return chat
\ No newline at end of file
+    await db.execute(
+        update(Thread)
+        .where(Thread.id == response_payload.thread_id)
+        .values(
+            title=func.coalesce(Thread.title, response_payload.question),
+            last_message_at=now,
+            # A chat is one user question plus one assistant answer.
+            message_count=Thread.message_count + 2,
+            updated_at=now
+        )
+    )
+    await db.commit()
+    await db.refresh(chat)
+    return chat
+
+
+async def save_chats(db: AsyncSession, chats: Sequence["PendingChat"]) -> int:
+    """
+    Insert ``chats`` in one statement and bump their threads' activity columns.
+
+    Chats whose id already exists are skipped, so replaying a batch is harmless.
+    Returns the number of chats actually inserted.
+    """
+    if not chats:
+        return 0
+    rows = []
+    passage_rows = []
+    for chat in chats:
+        parts = split_response(chat.response)
+        chat_passages = to_passage_rows(parts.search_results or [])
+        passage_rows.extend(chat_passages)
+        rows.append(dict(
+            id=chat.id,
+            thread_id=chat.thread_id,
+            question=chat.question,
+            response=parts.remaining,
+            answer=parts.answer,
+            passage_ids=[row["id"] for row in chat_passages] or None,
+            size_estimate=chat.size_estimate,
+            created_at=chat.created_at,
+            updated_at=chat.created_at
+        ))
+    await save_passages(db, passage_rows)
+    result = await db.execute(
+        insert(Chat)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Chat.id])
+        .returning(Chat.id)
+    )
+    inserted_ids = set(result.scalars().all())
+
+    activity: Dict[UUID, dict] = {}
+    for chat in sorted(chats, key=lambda chat: chat.created_at):
+        if chat.id not in inserted_ids:
+            continue
+        thread = activity.setdefault(chat.thread_id, dict(t_id=chat.thread_id, t_title=chat.question, t_count=0))
+        thread["t_last"] = chat.created_at
+        # A chat is one user question plus one assistant answer.
+        thread["t_count"] += 2
+
+    if activity:
+        threads = Thread.__table__
+        await db.execute(
+            update(threads)
+            .where(threads.c.id == bindparam("t_id"))
+            .values(
+                title=func.coalesce(threads.c.title, bindparam("t_title")),
+                last_message_at=func.greatest(threads.c.last_message_at, bindparam("t_last")),
+                message_count=threads.c.message_count + bindparam("t_count"),
+                updated_at=func.greatest(threads.c.updated_at, bindparam("t_last"))
+            ),
+            list(activity.values())
+        )
+    await db.commit()
+    return len(inserted_ids)
+
+
+def legacy_response():
+    """The response column, only for rows whose answer has not been backfilled yet."""
+    return case((Chat.answer.is_(None), Chat.response)).label("response")
+
+
+def turn_cost(strategy: str):
+    """SQL for the budget a turn costs under the named history strategy (see history_builder)."""
+    if strategy == "questions_only":
+        return func.length(Chat.question)
+    return func.coalesce(Chat.size_estimate, func.length(Chat.question))
+
+
+async def get_recent_turns(db: AsyncSession, thread_id: UUID, budget: int, strategy: str = "full") -> List[Row]:
+    """
+    Return the newest chats whose costs under ``strategy`` add up to at most
+    ``budget``, oldest first. build_history still does the exact trimming.
+    """
+    size = func.coalesce(Chat.size_estimate, func.length(Chat.question))
+    newest_first = (Chat.created_at.desc(), Chat.id.desc())
+    ranked = (
+        select(
+            Chat.question,
+            Chat.answer,
+            legacy_response(),
+            Chat.created_at,
+            size.label("size"),
+            func.sum(turn_cost(strategy)).over(order_by=newest_first).label("running_size")
+        )
+        .where(Chat.thread_id == thread_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(ranked.c.question, ranked.c.answer, ranked.c.response, ranked.c.size)
+        .where(ranked.c.running_size <= budget)
+        .order_by(ranked.c.created_at)
+    )
+    return list(result.all())
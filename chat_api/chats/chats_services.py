@@ -1,81 +1,202 @@
-from chat_api.config import get
-import httpx
+from chat_api.config import get, get_bool, get_int
 import json
-from typing import Optional
+import logging
+from functools import partial
+from typing import AsyncIterator, List, Optional
+from uuid import UUID
 
 from chat_api.chats.chats_reponse_model import ChatRequest, ChatUserQuery, chatRequestPayload, ChatResponsePayload
 from chat_api.error_contant import ErrorConstant,ResponseError
+from chat_api.http_client import get_http_client
 from fastapi import HTTPException
-from chat_api.threads.thread_response_model import ThreadResponse
+from starlette import status
+import httpx
 
 from chat_api.chats.models import Chat
 from chat_api.db import SessionLocal
-from chat_api.chats.chats_repository import save_chat
-
+from chat_api.chats.chats_repository import save_chat, get_recent_turns
+from chat_api.chats.admission import AdmissionSlot
+from chat_api.chats.chat_writer import PendingChat, chat_writer
+from chat_api.chats.response_cache import CacheKey, StreamEvent, is_response_cache_enabled, response_cache
+from chat_api.chats.stream_coalescer import CoalescedStreamError, is_stream_coalescing_enabled, stream_coalescer
+from chat_api.chats.circuit_breaker import CircuitOpenError
+from chat_api.chats.sse import coalesce_token_events, passthrough_events, token_coalesce_interval_seconds
+from chat_api.chats.upstream import upstream
+from chat_api.chats.history_builder import HistoryTurn, build_history, estimate_chat_size, extract_answer, get_history_strategy
+from chat_api.chats.history_cache import history_cache
+from chat_api.response_message import THREAD_NOT_FOUND, UPSTREAM_UNAVAILABLE
+
+from chat_api.threads import thread_repository
 from chat_api.threads.thread_service import create_thread
 from chat_api.threads.threads_request_model import ThreadCreateRequest
 
-from chat_api.threads.thread_service import get_thread_by_id
 
+from chat_api.auth_utils import AuthenticatedUser
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_ERROR_FRAME = (
+    f"data: {json.dumps({'type': 'error', 'data': {'message': UPSTREAM_UNAVAILABLE}})}\n\n"
+).encode("utf-8")
+
+class StreamAccumulator:
+    """
+    Folds streamed events into the merged chat response as they arrive.
+
+    Token data is buffered for a single join at the end, non-token events are
+    kept in arrival order and the last ``done`` event is placed last.
+    """
+
+    def __init__(self):
+        self._tokens: List[str] = []
+        self._events: List[dict] = []
+        self._done_item: Optional[dict] = None
+
+    def add(self, item: dict) -> None:
+        item_type = item.get("type")
+        if item_type == "token":
+            self._tokens.append(item.get("data", ""))
+        elif item_type == "done":
+            self._done_item = item
+        else:
+            self._events.append(item)
+
+    def __bool__(self) -> bool:
+        return bool(self._tokens or self._events or self._done_item is not None)
+
+    def merged(self) -> list:
+        merged_data = list(self._events)
+        token_data = "".join(self._tokens)
+        if token_data:
+            merged_data.append({"data": token_data, "type": "token"})
+        if self._done_item:
+            merged_data.append(self._done_item)
+        return merged_data
 
-from chat_api.auth_utils import get_user_email_from_token
 
 def merge_token_items(chat_list: list) -> list:
-    merged_data = []
-    token_data = ""
-    done_item = None
-    
+    accumulator = StreamAccumulator()
     for item in chat_list:
-        if item.get("type") == "token":
-            token_data += item.get("data", "")
-        elif item.get("type") == "done":
-            done_item = item
-        else:
-            merged_data.append(item)
-    
-    if token_data:
-        merged_data.append({"data": token_data, "type": "token"})
-    
-    if done_item:
-        merged_data.append(done_item)
-    print("merge data >>>>>>>>>>>>>", merged_data)
-    
-    return merged_data
+        accumulator.add(item)
+    return accumulator.merged()
 
-async def get_chat_stream(token: str, chat_request: ChatRequest):
-    email = get_user_email_from_token(token)
+async def get_chat_stream(user: AuthenticatedUser, chat_request: ChatRequest, slot: Optional[AdmissionSlot] = None):
 
     if chat_request.thread_id is not None:
-        thread: ThreadResponse = await get_thread_by_id(token, chat_request.thread_id)
-        user_query_payload = get_previous_chats(thread, chat_request.query)
+        user_query_payload = await get_conversation_history(chat_request.thread_id, chat_request.query)
     else:
         user_query_payload = chatRequestPayload(messages=[ChatUserQuery(role="user", content=chat_request.query)])
 
     chat_request_payload = user_query_payload.model_dump()
-    url = get("OPENPECHA_AI_URL")
-    chat_list = []
-    
-    async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, read=120.0)) as client:
-        async with client.stream("POST", url, json=chat_request_payload) as response:
-            if chat_request.thread_id is None:
-                thread_request = ThreadCreateRequest(email=email, device_type=chat_request.device_type, application_name=chat_request.application)
-                thread = create_thread(thread_request=thread_request)
+    events = open_chat_events(chat_request, chat_request_payload, slot)
+    coalesce_seconds = token_coalesce_interval_seconds()
+    if coalesce_seconds > 0:
+        events = coalesce_token_events(events, coalesce_seconds, get_int("CHAT_TOKEN_COALESCE_MAX_BYTES"))
+    accumulator = StreamAccumulator()
+    thread_id = chat_request.thread_id
+
+    forwarded = False
+    try:
+        async for frame, item in events:
+            if thread_id is None:
+                thread_request = ThreadCreateRequest(email=user.email, device_type=chat_request.device_type, application_name=chat_request.application)
+                thread = await create_thread(thread_request=thread_request)
+                thread_id = thread.id
                 yield (
                     f"data: {json.dumps({'thread_id': str(thread.id)})}\n\n"
                 ).encode("utf-8")
-            # Stream the response chunks
-            async for line in response.aiter_lines():
-                frame = sse_frame_from_line(line, on_json=chat_list.append)
-                if frame:
-                    yield frame    
-        
-            if len(chat_list) > 0:
+            if item is not None:
+                accumulator.add(item)
+            forwarded = True
+            yield frame
+    except (CircuitOpenError, CoalescedStreamError, httpx.HTTPError) as e:
+        if forwarded:
+            raise
+        # Nothing was sent yet and no thread was created: tell the client and stop.
+        logger.warning(f"Upstream unavailable before the first frame: {e!r}")
+        yield UPSTREAM_ERROR_FRAME
+        return
+
+    if accumulator:
+        merged_chat_list = accumulator.merged()
+        response_payload = ChatResponsePayload(thread_id=thread_id, response=merged_chat_list, question=chat_request.query)
+        if not chat_writer.submit(PendingChat.from_payload(response_payload)):
+            async with SessionLocal() as db_session:
+                await save_chat(db_session, response_payload=response_payload)
+
+        answer = extract_answer(merged_chat_list)
+        history_cache.append(
+            thread_id,
+            HistoryTurn(question=chat_request.query, answer=answer, size=estimate_chat_size(chat_request.query, answer)),
+            new_thread=chat_request.thread_id is None
+        )
+
+
+def open_chat_events(
+    chat_request: ChatRequest, payload: dict, slot: Optional[AdmissionSlot] = None
+) -> AsyncIterator[StreamEvent]:
+    """
+    Pick the event source for a chat.
+
+    Follow-ups always stream from the upstream. First turns are served from the
+    response cache when enabled, otherwise share an in-flight identical upstream stream;
+    ``slot``, the caller's admission slot, then stays with the shared stream.
+    """
+    if chat_request.thread_id is not None:
+        return upstream.stream(upstream_events, payload)
+
+    key = first_turn_key(chat_request)
+    cache_enabled = is_response_cache_enabled()
+    if cache_enabled:
+        recorded = response_cache.get(key)
+        if recorded is not None:
+            return response_cache.replay(recorded)
+
+    if is_stream_coalescing_enabled():
+        on_complete = partial(response_cache.put, key) if cache_enabled else None
+        return stream_coalescer.subscribe(key, partial(upstream.stream, upstream_events, payload), on_complete, slot)
+    if cache_enabled:
+        return response_cache.record(key, upstream.stream(upstream_events, payload))
+    return upstream.stream(upstream_events, payload)
+
+
+def first_turn_key(chat_request: ChatRequest) -> CacheKey:
+    return response_cache.key(chat_request.query, chat_request.application, upstream.endpoints.key)
+
+
+def needs_upstream_stream(chat_request: ChatRequest) -> bool:
+    """
+    Whether ``chat_request`` will open its own upstream stream.
+
+    First turns replayed from the response cache or joining an identical in-flight
+    stream do not. The answer can go stale before open_chat_events runs (an entry
+    expires, a shared stream ends); such a request then streams without a slot.
+    """
+    if chat_request.thread_id is not None:
+        return True
+    key = first_turn_key(chat_request)
+    if is_response_cache_enabled() and response_cache.get(key) is not None:
+        return False
+    return not (is_stream_coalescing_enabled() and key in stream_coalescer)
+
+
+async def upstream_events(url: str, payload: dict) -> AsyncIterator[StreamEvent]:
+    """Stream ``payload`` to the AI service and yield each SSE frame with its parsed event."""
+    async with get_http_client().stream("POST", url, json=payload) as response:
+        response.raise_for_status()
+        if is_sse_passthrough_enabled():
+            async for event in passthrough_events(response.aiter_bytes()):
+                yield event
+            return
+        async for line in response.aiter_lines():
+            items = []
+            frame = sse_frame_from_line(line, on_json=items.append)
+            if frame:
+                yield frame, items[0] if items else None
+
 
-                thread_id = chat_request.thread_id if chat_request.thread_id else thread.id
-                with SessionLocal() as db_session:
-                    merged_chat_list = merge_token_items(chat_list)
-                    response_payload = ChatResponsePayload(thread_id=thread_id, response=merged_chat_list, question=chat_request.query)
-                    save_chat(db_session, response_payload=response_payload)
+def is_sse_passthrough_enabled() -> bool:
+    return get_bool("UPSTREAM_SSE_PASSTHROUGH")
 
 
 def sse_frame_from_line(
@@ -97,10 +218,32 @@ def sse_frame_from_line(
     on_json(json.loads(payload))
     return (f"data: {payload}\n\n").encode("utf-8")
     
-def get_previous_chats(thread: ThreadResponse, current_query: str) -> chatRequestPayload:
-    messages = thread.messages
-    messages = [ChatUserQuery(role=message.role, content=message.content) for message in messages]
-    # Append the current user query to the message history
-    messages.append(ChatUserQuery(role="user", content=current_query))
-    chat_request_payload = chatRequestPayload(messages=messages)
-    return chat_request_payload
\ No newline at end of file
+async def get_conversation_history(thread_id: UUID, current_query: str) -> chatRequestPayload:
+    budget = get_int("CHAT_HISTORY_CHAR_BUDGET")
+    async with SessionLocal() as db_session:
+        # Always look the thread up: deletions and other workers' writes must be seen.
+        thread = await thread_repository.get_thread_by_id(db_session, thread_id)
+        if thread is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ResponseError(error=ErrorConstant.BAD_REQUEST, message=THREAD_NOT_FOUND).model_dump()
+            )
+        turns = history_cache.get(thread_id, thread.message_count)
+        if turns is None:
+            rows = await get_recent_turns(db_session, thread_id, budget, get("CHAT_HISTORY_STRATEGY"))
+            turns = [
+                HistoryTurn(
+                    question=row.question,
+                    answer=row.answer if row.answer is not None else extract_answer(row.response),
+                    size=row.size
+                )
+                for row in rows
+            ]
+            history_cache.put(thread_id, thread.message_count, turns)
+
+    return build_history(
+        turns,
+        current_query,
+        budget,
+        strategy=get_history_strategy(get("CHAT_HISTORY_STRATEGY"))
+    )
@@ -1,16 +1,17 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Optional
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from chat_api.chats.chats_services import get_chat_stream
+from chat_api.auth_utils import AuthenticatedUser, get_current_user
+from chat_api.chats.admission import AdmissionRejected, AdmissionSlot, chat_admission
+from chat_api.chats.chats_services import get_chat_stream, needs_upstream_stream
 from chat_api.chats.chats_reponse_model import ChatRequest
+from chat_api.chats.upstream import upstream
 from chat_api.config import get
 from fastapi import HTTPException
 from chat_api.error_contant import ErrorConstant, ResponseError
-
-oauth2_scheme = HTTPBearer()
+from chat_api.response_message import UPSTREAM_BUSY, UPSTREAM_UNAVAILABLE
 
 chats_router = APIRouter(
     prefix="/chats",
@@ -18,15 +19,63 @@ chats_router = APIRouter(
 )
 
 @chats_router.post("")
-def get_chats(
-    authentication_credential: Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)],
+async def get_chats(
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)],
     chat_request: ChatRequest) -> StreamingResponse:
 
     max_query_length = get("MAX_QUERY_LENGTH")
     if len(chat_request.query) > int(max_query_length):
         raise HTTPException(status_code=400, detail=ResponseError(error=ErrorConstant.BAD_REQUEST, message=ErrorConstant.MAX_QUERY_LENGTH_ERROR).model_dump())
-    
-    return StreamingResponse(
-        get_chat_stream(token=authentication_credential.credentials, chat_request=chat_request),
-        media_type="text/event-stream"
-    )
\ No newline at end of file
+
+    slot: Optional[AdmissionSlot] = None
+    # Cache replays and followers of a shared stream never reach the upstream.
+    if needs_upstream_stream(chat_request):
+        # Fail fast on open circuits, before waiting for a slot or reading history.
+        if not upstream.endpoints.available():
+            raise HTTPException(
+                status_code=503,
+                detail=ResponseError(error=ErrorConstant.SERVICE_UNAVAILABLE, message=UPSTREAM_UNAVAILABLE).model_dump(),
+                headers={"Retry-After": str(upstream.endpoints.retry_after_seconds())}
+            )
+
+        try:
+            slot = await chat_admission.acquire(chat_request.application, current_user.email)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail=ResponseError(error=ErrorConstant.TOO_MANY_REQUESTS, message=UPSTREAM_BUSY).model_dump(),
+                headers={"Retry-After": str(e.retry_after_seconds)}
+            )
+
+    stream = get_chat_stream(user=current_user, chat_request=chat_request, slot=slot)
+    if slot is not None:
+        return _AdmittedStreamingResponse(slot, stream, media_type="text/event-stream")
+    return StreamingResponse(stream, media_type="text/event-stream")
+
+
+async def _release_when_done(slot: AdmissionSlot, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        slot.release()
+
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streams a chat holding an admission slot.
+
+    The slot is released when the stream ends, and in any case once the response
+    is over: a body that never started (client gone before the first chunk) never
+    runs the generator's finally block.
+    """
+
+    def __init__(self, slot: AdmissionSlot, content: AsyncIterator[bytes], **kwargs):
+        super().__init__(_release_when_done(slot, content), **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
@@ -0,0 +1,123 @@
+import logging
+import time
+from collections import deque
+from typing import Deque
+
+from chat_api.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_TRANSITIONS = Counter(
+    "upstream_circuit_transitions_total",
+    "Upstream circuit breaker state changes, by endpoint and new state.",
+    ["endpoint", "state"],
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Upstream circuit breaker state by endpoint (0 closed, 1 half-open, 2 open).",
+    ["endpoint"],
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one upstream endpoint.
+
+    The last ``window_size`` calls are kept; once at least ``min_calls`` are known
+    and the share of failed or slow (first frame after ``slow_call_seconds``) calls
+    reaches ``failure_rate_threshold`` the breaker opens. After ``open_seconds`` one
+    probe call is let through: success closes the breaker, failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float,
+        slow_call_seconds: float,
+        window_size: int,
+        min_calls: int,
+        open_seconds: float,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], endpoint=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    @property
+    def allows_calls(self) -> bool:
+        """Whether ``before_call`` would let a call through now, without claiming the probe."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probe_in_flight)
+
+    def seconds_until_retry(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def before_call(self) -> bool:
+        """Return whether a call may go out now; a True in half-open state claims the probe."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def on_success(self, first_frame_seconds: float) -> None:
+        if first_frame_seconds > self.slow_call_seconds:
+            self._record(False)
+        else:
+            self._record(True)
+
+    def on_failure(self) -> None:
+        self._record(False)
+
+    def on_cancel(self) -> None:
+        """The call was abandoned without an outcome, e.g. it lost a hedge."""
+        self._probe_in_flight = False
+
+    def _record(self, ok: bool) -> None:
+        if self._state == HALF_OPEN:
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            self._transition(CLOSED if ok else OPEN)
+            return
+        self._outcomes.append(ok)
+        if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failure_rate = self._outcomes.count(False) / len(self._outcomes)
+            if failure_rate >= self.failure_rate_threshold:
+                self._outcomes.clear()
+                self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Upstream circuit for {self.name} is now {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        CIRCUIT_TRANSITIONS.inc(endpoint=self.name, state=state)
+        CIRCUIT_STATE.set(_STATE_VALUES[state], endpoint=self.name)
@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from chat_api.chats.chats_reponse_model import ChatUserQuery, chatRequestPayload
+
+
+@dataclass(frozen=True)
+class HistoryTurn:
+    question: str
+    answer: str
+    size: int
+
+
+# A strategy turns a stored turn into the messages sent upstream and reports
+# how many characters of the budget they cost.
+HistoryStrategy = Callable[[HistoryTurn], Tuple[List[ChatUserQuery], int]]
+
+
+def full_turn_strategy(turn: HistoryTurn) -> Tuple[List[ChatUserQuery], int]:
+    messages = [ChatUserQuery(role="user", content=turn.question)]
+    if turn.answer:
+        messages.append(ChatUserQuery(role="assistant", content=turn.answer))
+    return messages, turn.size
+
+
+def questions_only_strategy(turn: HistoryTurn) -> Tuple[List[ChatUserQuery], int]:
+    return [ChatUserQuery(role="user", content=turn.question)], len(turn.question)
+
+
+HISTORY_STRATEGIES: Dict[str, HistoryStrategy] = {
+    "full": full_turn_strategy,
+    "questions_only": questions_only_strategy,
+}
+
+
+def get_history_strategy(name: str) -> HistoryStrategy:
+    try:
+        return HISTORY_STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown chat history strategy '{name}', expected one of {sorted(HISTORY_STRATEGIES)}")
+
+
+def estimate_chat_size(question: str, answer: str) -> int:
+    return len(question) + len(answer)
+
+
+def extract_answer(response: Any) -> str:
+    if isinstance(response, list):
+        return "".join(
+            item.get("data", "") for item in response
+            if isinstance(item, dict) and item.get("type") == "token"
+        )
+    if isinstance(response, dict):
+        return response.get("answer", "")
+    return ""
+
+
+def build_history(
+    turns: Sequence[HistoryTurn],
+    current_query: str,
+    budget: int,
+    strategy: Optional[HistoryStrategy] = None,
+) -> chatRequestPayload:
+    """
+    Build the upstream payload from ``turns`` (oldest first) plus ``current_query``.
+
+    The most recent turns are kept until the next one would exceed ``budget``
+    characters. The current query is always sent, even if it alone is over budget.
+    """
+    strategy = strategy or full_turn_strategy
+    remaining = budget - len(current_query)
+    kept: List[List[ChatUserQuery]] = []
+
+    for turn in reversed(turns):
+        messages, size = strategy(turn)
+        if size > remaining:
+            break
+        remaining -= size
+        kept.append(messages)
+
+    history = [message for messages in reversed(kept) for message in messages]
+    history.append(ChatUserQuery(role="user", content=current_query))
+    return chatRequestPayload(messages=history)
@@ -0,0 +1,82 @@
+from typing import List, Optional, Tuple, Union
+from uuid import UUID
+
+from chat_api.chats.history_builder import HistoryStrategy, HistoryTurn, full_turn_strategy, get_history_strategy
+from chat_api.config import get, get_float, get_int
+from chat_api.ttl_cache import TTLCache
+
+
+class ConversationHistoryCache:
+    """
+    Per-thread LRU of the turns a follow-up message sends upstream.
+
+    Entries hold at most ``max_chars`` worth of the newest turns, costed like
+    ``strategy`` costs them, which is all build_history can ever use, and are
+    appended to as chats are saved.
+
+    The cache is local to one worker process, so every entry is tagged with the
+    thread's ``message_count`` and only returned while the caller's freshly read
+    count has not moved past it. A chat saved or a thread changed by another worker
+    therefore shows up as a miss rather than as stale history. An entry ahead of the
+    read count holds this worker's chats that are still queued for writing
+    (see chat_writer), so it is returned and never replaced by a reload, which
+    would be missing those chats.
+    """
+
+    def __init__(
+        self,
+        max_threads: int,
+        ttl_seconds: float,
+        max_chars: int,
+        strategy: HistoryStrategy = full_turn_strategy,
+    ):
+        self._turns = TTLCache(max_size=max_threads, ttl_seconds=ttl_seconds)
+        self._max_chars = max_chars
+        self._strategy = strategy
+
+    @staticmethod
+    def _key(thread_id: Union[UUID, str]) -> UUID:
+        return thread_id if isinstance(thread_id, UUID) else UUID(thread_id)
+
+    def get(self, thread_id: Union[UUID, str], message_count: int) -> Optional[List[HistoryTurn]]:
+        entry: Optional[Tuple[int, List[HistoryTurn]]] = self._turns.get(self._key(thread_id))
+        if entry is None or entry[0] < message_count:
+            return None
+        return entry[1]
+
+    def put(self, thread_id: Union[UUID, str], message_count: int, turns: List[HistoryTurn]) -> None:
+        entry: Optional[Tuple[int, List[HistoryTurn]]] = self._turns.get(self._key(thread_id))
+        if entry is not None and entry[0] > message_count:
+            return
+        self._turns.set(self._key(thread_id), (message_count, self._trim(list(turns))))
+
+    def append(self, thread_id: Union[UUID, str], turn: HistoryTurn, new_thread: bool = False) -> None:
+        entry = (0, []) if new_thread else self._turns.get(self._key(thread_id))
+        if entry is None:
+            return
+        message_count, turns = entry
+        turns.append(turn)
+        # A chat is one user question plus one assistant answer.
+        self._turns.set(self._key(thread_id), (message_count + 2, self._trim(turns)))
+
+    def invalidate(self, thread_id: Union[UUID, str]) -> None:
+        self._turns.pop(self._key(thread_id))
+
+    def _trim(self, turns: List[HistoryTurn]) -> List[HistoryTurn]:
+        costs = [self._strategy(turn)[1] for turn in turns]
+        total = sum(costs)
+        dropped = 0
+        while dropped < len(turns) and total > self._max_chars:
+            total -= costs[dropped]
+            dropped += 1
+        if dropped:
+            del turns[:dropped]
+        return turns
+
+
+history_cache = ConversationHistoryCache(
+    max_threads=get_int("CHAT_HISTORY_CACHE_SIZE"),
+    ttl_seconds=get_float("CHAT_HISTORY_CACHE_TTL_SECONDS"),
+    max_chars=get_int("CHAT_HISTORY_CHAR_BUDGET"),
+    strategy=get_history_strategy(get("CHAT_HISTORY_STRATEGY")),
+)
@@ -1,8 +1,8 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, String, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, Integer, Text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, JSONB
 from sqlalchemy.orm import relationship
 
 from chat_api.db.db import Base
@@ -10,12 +10,22 @@ from chat_api.db.db import Base
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        Index("ix_chats_thread_id_created_at", "thread_id", "created_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Stream events other than the answer and search results; legacy rows that have
+    # not been backfilled yet (answer is NULL) still hold the full response here.
     response = Column(JSONB, default=list, nullable=False)
+    answer = Column(Text, nullable=True)
+    # Ordered ids of the retrieved passages (see chat_api.passages).
+    passage_ids = Column(ARRAY(String(64)), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     question = Column(String, nullable=False)
+    # Characters of question + answer, used to budget conversation history.
+    size_estimate = Column(Integer, nullable=True)
     thread_id = Column(UUID(as_uuid=True), ForeignKey("threads.id"), nullable=False)
 
     thread = relationship("Thread", back_populates="chats")
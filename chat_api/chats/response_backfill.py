@@ -0,0 +1,105 @@
+"""
+Converts legacy chat rows to the answer / passage_ids columns in small batches.
+
+Run with ``python -m chat_api.chats.response_backfill`` after migrating; it is safe to
+stop and restart at any time and to run next to the API.
+"""
+import asyncio
+import logging
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import String, bindparam, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Import every model Chat's relationships refer to so the mappers can be configured
+# when this module runs on its own.
+from chat_api.applications.models import Application  # noqa: F401
+from chat_api.chats.models import Chat
+from chat_api.chats.response_parts import split_response
+from chat_api.config import get_float, get_int
+from chat_api.db import SessionLocal
+from chat_api.passages.passage_repository import save_passages, to_passage_rows
+from chat_api.threads.models import Thread  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_batch(db: AsyncSession, after_id: Optional[UUID], batch_size: int) -> Tuple[Optional[UUID], int]:
+    """
+    Convert up to ``batch_size`` chats with ids greater than ``after_id``.
+
+    Legacy rows get their answer split out of ``response`` and their search results
+    moved to the passages table.
+    Returns the last id scanned (None when nothing is left) and how many rows were converted.
+    Rows with an unrecognised response shape are skipped and left as they are.
+
+    Rows locked by a concurrent writer are waited for rather than skipped: the scan
+    only moves forward, so a skipped row would never be revisited in this run.
+    """
+    query = select(Chat.id, Chat.response).where(Chat.answer.is_(None))
+    if after_id is not None:
+        query = query.where(Chat.id > after_id)
+    query = query.order_by(Chat.id).limit(batch_size).with_for_update()
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return None, 0
+
+    params = []
+    passage_rows = []
+    for row in rows:
+        parts = split_response(row.response)
+        if parts is None:
+            logger.warning(f"Skipping chat {row.id} with unexpected response type {type(row.response)}")
+            continue
+        chat_passages = to_passage_rows(parts.search_results or [])
+        passage_rows.extend(chat_passages)
+        params.append(dict(
+            b_id=row.id,
+            b_answer=parts.answer,
+            b_passage_ids=[passage["id"] for passage in chat_passages] or None,
+            b_response=parts.remaining
+        ))
+
+    if params:
+        await save_passages(db, passage_rows)
+        chats = Chat.__table__
+        await db.execute(
+            update(chats)
+            .where(chats.c.id == bindparam("b_id"), chats.c.answer.is_(None))
+            .values(
+                answer=bindparam("b_answer"),
+                passage_ids=bindparam("b_passage_ids", type_=ARRAY(String(64))),
+                response=bindparam("b_response", type_=JSONB),
+                # A storage conversion, not an edit of the chat.
+                updated_at=chats.c.updated_at
+            ),
+            params
+        )
+    await db.commit()
+    return rows[-1].id, len(params)
+
+
+async def run_backfill(batch_size: int, pause_seconds: float) -> int:
+    converted = 0
+    after_id = None
+    while True:
+        async with SessionLocal() as db_session:
+            after_id, batch_converted = await backfill_batch(db_session, after_id, batch_size)
+        if after_id is None:
+            break
+        converted += batch_converted
+        logger.info(f"Backfilled {converted} chats so far")
+        # Leave room for live traffic between batches.
+        await asyncio.sleep(pause_seconds)
+    logger.info(f"Chat response backfill finished, {converted} chats converted")
+    return converted
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_backfill(
+        batch_size=get_int("CHAT_BACKFILL_BATCH_SIZE"),
+        pause_seconds=get_float("CHAT_BACKFILL_PAUSE_SECONDS")
+    ))
@@ -0,0 +1,74 @@
+import asyncio
+from typing import AsyncIterator, List, Optional, Tuple
+
+from chat_api.config import get_bool, get_float, get_int
+from chat_api.metrics import Counter
+from chat_api.ttl_cache import TTLCache
+
+# One forwarded SSE frame and the JSON event it carried, if any.
+StreamEvent = Tuple[bytes, Optional[dict]]
+CacheKey = Tuple[str, str, str]
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "chat_response_cache_lookups_total",
+    "First-turn response cache lookups, by result.",
+    ["result"],
+)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+class ResponseCache:
+    """
+    Recorded upstream event sequences for first-turn questions.
+
+    Keyed by normalized query, application and upstream URL; only complete
+    streams (ending with a ``done`` event) are stored.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, replay_interval_seconds: float):
+        self._events = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self._replay_interval_seconds = replay_interval_seconds
+
+    @staticmethod
+    def key(query: str, application: str, url: str) -> CacheKey:
+        return normalize_query(query), application, url
+
+    def get(self, key: CacheKey) -> Optional[List[StreamEvent]]:
+        events = self._events.get(key)
+        RESPONSE_CACHE_LOOKUPS.inc(result="miss" if events is None else "hit")
+        return events
+
+    def put(self, key: CacheKey, events: List[StreamEvent]) -> None:
+        if any(item is not None and item.get("type") == "done" for _, item in events):
+            self._events.set(key, tuple(events))
+
+    async def record(self, key: CacheKey, events: AsyncIterator[StreamEvent]) -> AsyncIterator[StreamEvent]:
+        """Pass ``events`` through and store them once the stream has ended normally."""
+        recorded = []
+        async for event in events:
+            recorded.append(event)
+            yield event
+        self.put(key, recorded)
+
+    async def replay(self, events: List[StreamEvent]) -> AsyncIterator[StreamEvent]:
+        for index, event in enumerate(events):
+            if index and self._replay_interval_seconds > 0:
+                await asyncio.sleep(self._replay_interval_seconds)
+            yield event
+
+    def clear(self) -> None:
+        self._events.clear()
+
+
+def is_response_cache_enabled() -> bool:
+    return get_bool("CHAT_RESPONSE_CACHE_ENABLED")
+
+
+response_cache = ResponseCache(
+    max_size=get_int("CHAT_RESPONSE_CACHE_SIZE"),
+    ttl_seconds=get_float("CHAT_RESPONSE_CACHE_TTL_SECONDS"),
+    replay_interval_seconds=get_float("CHAT_RESPONSE_CACHE_REPLAY_INTERVAL_MS") / 1000,
+)
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class ResponseParts(NamedTuple):
+    answer: str
+    search_results: Optional[List[Dict[str, str]]]
+    # Events other than the answer tokens and search results, e.g. ``done``.
+    remaining: list
+
+
+def _normalize_search_results(search_results_data: Any) -> Optional[List[Dict[str, str]]]:
+    if not search_results_data:
+        return None
+    return [
+        {"id": sr.get("id", ""), "title": sr.get("title", ""), "text": sr.get("text", "")}
+        for sr in search_results_data
+        if isinstance(sr, dict)
+    ]
+
+
+def split_response(response: Any) -> Optional[ResponseParts]:
+    """
+    Split a stored or streamed chat response into its answer, search results and other events.
+
+    Handles the merged event list written since streaming was introduced as well as the
+    older ``{"answer": ..., "search_results": [...]}`` dict. Returns None for any other shape.
+    """
+    if isinstance(response, list):
+        answer = ""
+        search_results = None
+        remaining = []
+        for item in response:
+            item_type = item.get("type")
+            if item_type == "token":
+                answer = item.get("data", "")
+            elif item_type == "search_results":
+                search_results = _normalize_search_results(item.get("data", []))
+            else:
+                remaining.append(item)
+        return ResponseParts(answer, search_results, remaining)
+    if isinstance(response, dict):
+        return ResponseParts(
+            response.get("answer", ""),
+            _normalize_search_results(response.get("search_results", [])),
+            []
+        )
+    return None
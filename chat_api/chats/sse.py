@@ -0,0 +1,139 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+
+from chat_api.chats.response_cache import StreamEvent
+from chat_api.config import get_float
+
+_DATA = b"data:"
+_FRAME_END = b"\n\n"
+# The upstream's token events, as serialized by json.dumps with and without spaces.
+_TOKEN_PREFIX = b'{"type": "token", "data": "'
+_TOKEN_PREFIX_COMPACT = b'{"type":"token","data":"'
+_TOKEN_SUFFIX = b'"}'
+
+
+def parse_event(payload: bytes) -> dict:
+    """
+    Parse one SSE data payload.
+
+    Plain token events (no escapes in the text) are sliced out without running the
+    JSON parser; anything else goes through ``json.loads``.
+    """
+    if payload.endswith(_TOKEN_SUFFIX):
+        if payload.startswith(_TOKEN_PREFIX):
+            text = payload[len(_TOKEN_PREFIX):-len(_TOKEN_SUFFIX)]
+        elif payload.startswith(_TOKEN_PREFIX_COMPACT):
+            text = payload[len(_TOKEN_PREFIX_COMPACT):-len(_TOKEN_SUFFIX)]
+        else:
+            text = None
+        if text is not None and b"\\" not in text and b'"' not in text:
+            return {"type": "token", "data": text.decode("utf-8")}
+    return json.loads(payload)
+
+
+def frame_from_line(line: bytes) -> Optional[StreamEvent]:
+    """
+    Turn one upstream line into the frame we forward and its parsed event.
+
+    Lines already in ``data: <payload>`` form are forwarded as the original bytes;
+    bare JSON lines and other ``data:`` spellings are normalized to that form.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith(b":"):
+        return line + _FRAME_END, None
+    if line.startswith(b"data: ") and line[6:7] != b" ":
+        return line + _FRAME_END, parse_event(line[6:])
+
+    payload = line[len(_DATA):].strip() if line.startswith(_DATA) else line
+    return b"data: " + payload + _FRAME_END, parse_event(payload)
+
+
+async def passthrough_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[StreamEvent]:
+    """Split a raw upstream byte stream into lines and yield their frames and events."""
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n") if pending else chunk.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            event = frame_from_line(line)
+            if event is not None:
+                yield event
+    if pending:
+        event = frame_from_line(pending)
+        if event is not None:
+            yield event
+
+
+def token_coalesce_interval_seconds() -> float:
+    """The outbound token coalescing window; 0 means every token is its own frame."""
+    return get_float("CHAT_TOKEN_COALESCE_MS") / 1000
+
+
+def merged_token_event(texts: List[str]) -> StreamEvent:
+    item = {"type": "token", "data": "".join(texts)}
+    return b"data: " + json.dumps(item).encode("utf-8") + _FRAME_END, item
+
+
+async def coalesce_token_events(
+    events: AsyncIterator[StreamEvent],
+    interval_seconds: float,
+    max_bytes: int,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Merge runs of token events into one event per ``interval_seconds`` or ``max_bytes``.
+
+    Non-token events (``done`` included) flush the pending tokens first and are
+    forwarded as they are, so event order is preserved. A single pending token is
+    forwarded with its original frame.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    pending: List[StreamEvent] = []
+    pending_bytes = 0
+    deadline = 0.0
+    next_event: Optional[asyncio.Future] = None
+
+    def flush() -> StreamEvent:
+        nonlocal pending, pending_bytes
+        batch, pending, pending_bytes = pending, [], 0
+        if len(batch) == 1:
+            return batch[0]
+        return merged_token_event([item["data"] for _, item in batch])
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+            if pending:
+                done, _ = await asyncio.wait({next_event}, timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield flush()
+                    continue
+            try:
+                event = await next_event
+            except StopAsyncIteration:
+                break
+            finally:
+                next_event = None
+
+            frame, item = event
+            if item is not None and item.get("type") == "token" and isinstance(item.get("data"), str):
+                if not pending:
+                    deadline = loop.time() + interval_seconds
+                pending.append(event)
+                pending_bytes += len(frame)
+                if pending_bytes >= max_bytes:
+                    yield flush()
+            else:
+                if pending:
+                    yield flush()
+                yield event
+
+        if pending:
+            yield flush()
+    finally:
+        if next_event is not None:
+            next_event.cancel()
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from chat_api.chats.admission import AdmissionSlot
+from chat_api.chats.response_cache import StreamEvent
+from chat_api.config import get_bool
+from chat_api.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+COALESCED_STREAMS = Counter(
+    "chat_coalesced_streams_total",
+    "First-turn streams by whether they opened the upstream (leader) or joined one (follower).",
+    ["role"],
+)
+
+
+class CoalescedStreamError(Exception):
+    """Raised to each subscriber of a shared stream that failed; chained to the upstream error."""
+
+
+class _Broadcast:
+
+    def __init__(self):
+        self.events: List[StreamEvent] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class StreamCoalescer:
+    """
+    Single-flight fan-out of identical upstream streams.
+
+    The first subscriber for a key starts a background task that owns the upstream
+    stream; everyone subscribed to the same key while it runs receives every event
+    from the start. The upstream is cancelled, and the key forgotten, once no
+    subscriber is left; a later subscriber starts a new stream.
+
+    An admission slot passed by the subscriber that starts the stream is taken
+    over by the stream itself and released when it ends, so the upstream stays
+    counted against the admission limit after that subscriber leaves.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def subscribe(
+        self,
+        key: Hashable,
+        open_stream: Callable[[], AsyncIterator[StreamEvent]],
+        on_complete: Optional[Callable[[List[StreamEvent]], None]] = None,
+        slot: Optional[AdmissionSlot] = None,
+    ) -> AsyncIterator[StreamEvent]:
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._inflight[key] = broadcast
+            broadcast.task = asyncio.create_task(self._pump(key, broadcast, open_stream(), on_complete))
+            if slot is not None:
+                stream_slot = slot.transfer()
+                # A done callback, unlike a finally in _pump, also runs for a task cancelled before it started.
+                broadcast.task.add_done_callback(lambda _: stream_slot.release())
+            COALESCED_STREAMS.inc(role="leader")
+        else:
+            COALESCED_STREAMS.inc(role="follower")
+
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = broadcast.changed
+                while index < len(broadcast.events):
+                    yield broadcast.events[index]
+                    index += 1
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        # A fresh exception per subscriber: one instance must not be raised in many tasks.
+                        raise CoalescedStreamError("Shared upstream stream failed") from broadcast.error
+                    return
+                await changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Forget the key before cancelling so nobody can join a dying stream.
+                if self._inflight.get(key) is broadcast:
+                    del self._inflight[key]
+                broadcast.task.cancel()
+
+    async def _pump(
+        self,
+        key: Hashable,
+        broadcast: _Broadcast,
+        stream: AsyncIterator[StreamEvent],
+        on_complete: Optional[Callable[[List[StreamEvent]], None]],
+    ) -> None:
+        try:
+            async for event in stream:
+                broadcast.events.append(event)
+                broadcast.notify()
+        except asyncio.CancelledError:
+            broadcast.error = asyncio.CancelledError()
+        except Exception as e:
+            logger.error(f"Coalesced upstream stream failed: {e}")
+            broadcast.error = e
+        else:
+            if on_complete is not None:
+                on_complete(broadcast.events)
+        finally:
+            broadcast.done = True
+            if self._inflight.get(key) is broadcast:
+                del self._inflight[key]
+            broadcast.notify()
+
+
+def is_stream_coalescing_enabled() -> bool:
+    return get_bool("CHAT_STREAM_COALESCING_ENABLED")
+
+
+stream_coalescer = StreamCoalescer()
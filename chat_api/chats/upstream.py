@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import suppress
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+from chat_api.chats.circuit_breaker import CircuitBreaker, CircuitOpenError
+from chat_api.chats.response_cache import StreamEvent
+from chat_api.config import get, get_float, get_int
+from chat_api.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_ATTEMPTS = Counter(
+    "upstream_attempts_total",
+    "Upstream stream attempts, by endpoint and outcome.",
+    ["endpoint", "outcome"],
+)
+
+OpenStream = Callable[[str, dict], AsyncIterator[StreamEvent]]
+
+_END = object()
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def is_client_error(error: BaseException) -> bool:
+    """A 4xx answer: the endpoint is up, it just refused this request."""
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500
+
+
+class UpstreamEndpoints:
+    """
+    The configured AI service endpoints and their recent health.
+
+    An endpoint that fails is tried last for ``cooldown_seconds``. Each endpoint
+    may also have a circuit breaker; endpoints whose breaker rejects the call are
+    not tried at all.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        cooldown_seconds: float,
+        breaker_factory: Optional[Callable[[str], CircuitBreaker]] = None,
+    ):
+        if not urls:
+            raise ValueError("At least one upstream endpoint is required")
+        self.urls = list(urls)
+        self.cooldown_seconds = cooldown_seconds
+        self._unhealthy_until: Dict[str, float] = {}
+        self.breakers: Dict[str, CircuitBreaker] = (
+            {url: breaker_factory(url) for url in self.urls} if breaker_factory else {}
+        )
+
+    @property
+    def key(self) -> str:
+        return ",".join(self.urls)
+
+    def ordered(self) -> List[str]:
+        now = time.monotonic()
+        healthy = [url for url in self.urls if self._unhealthy_until.get(url, 0.0) <= now]
+        cooling = sorted(
+            (url for url in self.urls if url not in healthy),
+            key=lambda url: self._unhealthy_until[url]
+        )
+        return healthy + cooling
+
+    def available(self) -> bool:
+        """Whether any endpoint's circuit would let a call through now."""
+        return not self.breakers or any(breaker.allows_calls for breaker in self.breakers.values())
+
+    def retry_after_seconds(self) -> int:
+        if not self.breakers:
+            return 1
+        return max(1, math.ceil(min(breaker.seconds_until_retry() for breaker in self.breakers.values())))
+
+    def claim(self, url: str) -> bool:
+        breaker = self.breakers.get(url)
+        return breaker is None or breaker.before_call()
+
+    def record_success(self, url: str, first_frame_seconds: float) -> None:
+        self._unhealthy_until.pop(url, None)
+        if url in self.breakers:
+            self.breakers[url].on_success(first_frame_seconds)
+        UPSTREAM_ATTEMPTS.inc(endpoint=url, outcome="success")
+
+    def record_failure(self, url: str) -> None:
+        self._unhealthy_until[url] = time.monotonic() + self.cooldown_seconds
+        if url in self.breakers:
+            self.breakers[url].on_failure()
+        UPSTREAM_ATTEMPTS.inc(endpoint=url, outcome="failure")
+
+    def record_rejected(self, url: str) -> None:
+        # Not a breaker failure, but the call is over: free a half-open probe.
+        if url in self.breakers:
+            self.breakers[url].on_cancel()
+        UPSTREAM_ATTEMPTS.inc(endpoint=url, outcome="rejected")
+
+    def record_interrupted(self, url: str) -> None:
+        """The stream broke after its first frame, which already counted as a success."""
+        self._unhealthy_until[url] = time.monotonic() + self.cooldown_seconds
+        UPSTREAM_ATTEMPTS.inc(endpoint=url, outcome="interrupted")
+
+    def record_cancelled(self, url: str) -> None:
+        if url in self.breakers:
+            self.breakers[url].on_cancel()
+        UPSTREAM_ATTEMPTS.inc(endpoint=url, outcome="cancelled")
+
+
+class _Attempt:
+    """One upstream stream read by a background task into a bounded queue."""
+
+    def __init__(self, url: str, stream: AsyncIterator[StreamEvent], queue_size: int):
+        self.url = url
+        self.started = time.monotonic()
+        self.first_frame_seconds = 0.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task = asyncio.create_task(self._read(stream))
+
+    async def _read(self, stream: AsyncIterator[StreamEvent]) -> None:
+        try:
+            async for event in stream:
+                await self.queue.put(event)
+        except Exception as e:
+            await self.queue.put(e)
+        else:
+            await self.queue.put(_END)
+
+    async def cancel(self) -> None:
+        self.task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self.task
+
+
+class HedgedUpstream:
+    """
+    Streams from the healthiest endpoint, hedging and retrying before the first frame.
+
+    If no frame arrives within ``hedge_after_seconds`` a second request goes to the
+    next endpoint; whichever produces a frame first is used and the other is
+    cancelled. Retryable errors (connection failures, 5xx) before any frame was
+    forwarded are retried up to ``max_retries`` times with exponential backoff.
+    Once a frame has been forwarded errors propagate unchanged.
+
+    The first frame is what proves an endpoint healthy, so it is recorded as a
+    success straight away rather than when the (possibly minutes long) stream ends.
+
+    Hedges are extra connections on the shared HTTP pool, so at most
+    ``max_concurrent_hedges`` run at once across all streams; beyond that a slow
+    stream simply keeps waiting on its first endpoint.
+    """
+
+    def __init__(
+        self,
+        endpoints: UpstreamEndpoints,
+        hedge_after_seconds: float,
+        max_retries: int,
+        retry_backoff_seconds: float,
+        max_concurrent_hedges: int = 16,
+        queue_size: int = 64,
+    ):
+        self.endpoints = endpoints
+        self.hedge_after_seconds = hedge_after_seconds
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_concurrent_hedges = max_concurrent_hedges
+        self.queue_size = queue_size
+        self.active_hedges = 0
+
+    async def stream(self, open_stream: OpenStream, payload: dict) -> AsyncIterator[StreamEvent]:
+        attempt_number = 0
+        while True:
+            try:
+                winner, first = await self._first_event(open_stream, payload)
+            except Exception as e:
+                if not is_retryable(e) or attempt_number >= self.max_retries:
+                    raise
+                delay = self.retry_backoff_seconds * (2 ** attempt_number)
+                attempt_number += 1
+                logger.warning(f"Upstream failed before the first frame, retry {attempt_number} in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        self.endpoints.record_success(winner.url, winner.first_frame_seconds)
+        try:
+            item = first
+            while item is not _END:
+                if isinstance(item, Exception):
+                    self.endpoints.record_interrupted(winner.url)
+                    raise item
+                yield item
+                item = await winner.queue.get()
+        finally:
+            await winner.cancel()
+
+    async def _first_event(self, open_stream: OpenStream, payload: dict):
+        """Return the attempt that produced a frame (or a clean end) first, and that item."""
+        spare_urls = self.endpoints.ordered()
+        first_url = self._claim_next(spare_urls)
+        if first_url is None:
+            raise CircuitOpenError("All upstream endpoints are unavailable")
+        pending: List[_Attempt] = [self._start(first_url, open_stream, payload)]
+        last_error: Optional[Exception] = None
+        hedges = 0
+        hedge_deadline = (
+            time.monotonic() + self.hedge_after_seconds
+            if self.hedge_after_seconds > 0 and spare_urls else None
+        )
+
+        try:
+            while pending:
+                timeout = None if hedge_deadline is None else max(0.0, hedge_deadline - time.monotonic())
+                getters = {asyncio.ensure_future(attempt.queue.get()): attempt for attempt in pending}
+                try:
+                    done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    # Also on cancellation (client gone): no getter may outlive this wait.
+                    for getter in getters:
+                        if not getter.done():
+                            getter.cancel()
+
+                if not done:
+                    hedge_deadline = None
+                    if self.active_hedges >= self.max_concurrent_hedges:
+                        logger.info(f"No upstream frame within {self.hedge_after_seconds}s, hedge limit reached")
+                        continue
+                    url = self._claim_next(spare_urls)
+                    if url is not None:
+                        logger.info(f"No upstream frame within {self.hedge_after_seconds}s, hedging to {url}")
+                        self.active_hedges += 1
+                        hedges += 1
+                        pending.append(self._start(url, open_stream, payload))
+                    continue
+
+                for getter in done:
+                    attempt = getters[getter]
+                    item = getter.result()
+                    if isinstance(item, Exception):
+                        if is_client_error(item):
+                            self.endpoints.record_rejected(attempt.url)
+                        else:
+                            self.endpoints.record_failure(attempt.url)
+                        last_error = item
+                        pending.remove(attempt)
+                        continue
+                    pending.remove(attempt)
+                    attempt.first_frame_seconds = time.monotonic() - attempt.started
+                    for loser in pending:
+                        self.endpoints.record_cancelled(loser.url)
+                        await loser.cancel()
+                    pending = []
+                    return attempt, item
+
+                if not pending and last_error is not None and is_retryable(last_error):
+                    # The attempt failed outright; try the next endpoint straight away.
+                    url = self._claim_next(spare_urls)
+                    if url is not None:
+                        pending.append(self._start(url, open_stream, payload))
+                        hedge_deadline = None
+        finally:
+            self.active_hedges -= hedges
+            for attempt in pending:
+                self.endpoints.record_cancelled(attempt.url)
+                await attempt.cancel()
+        raise last_error
+
+    def _claim_next(self, urls: List[str]) -> Optional[str]:
+        """Pop and return the first of ``urls`` whose circuit lets a call through."""
+        while urls:
+            url = urls.pop(0)
+            if self.endpoints.claim(url):
+                return url
+        return None
+
+    def _start(self, url: str, open_stream: OpenStream, payload: dict) -> _Attempt:
+        return _Attempt(url, open_stream(url, payload), self.queue_size)
+
+
+def get_upstream_urls() -> List[str]:
+    urls = [url.strip() for url in get("OPENPECHA_AI_URLS").split(",") if url.strip()]
+    return urls or [get("OPENPECHA_AI_URL")]
+
+
+def create_circuit_breaker(url: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        url,
+        failure_rate_threshold=get_float("UPSTREAM_CIRCUIT_FAILURE_RATE"),
+        slow_call_seconds=get_float("UPSTREAM_CIRCUIT_SLOW_CALL_SECONDS"),
+        window_size=get_int("UPSTREAM_CIRCUIT_WINDOW_SIZE"),
+        min_calls=get_int("UPSTREAM_CIRCUIT_MIN_CALLS"),
+        open_seconds=get_float("UPSTREAM_CIRCUIT_OPEN_SECONDS"),
+    )
+
+
+upstream = HedgedUpstream(
+    UpstreamEndpoints(
+        get_upstream_urls(),
+        cooldown_seconds=get_float("UPSTREAM_UNHEALTHY_COOLDOWN_SECONDS"),
+        breaker_factory=create_circuit_breaker,
+    ),
+    hedge_after_seconds=get_float("UPSTREAM_HEDGE_AFTER_SECONDS"),
+    max_retries=get_int("UPSTREAM_MAX_RETRIES"),
+    retry_backoff_seconds=get_float("UPSTREAM_RETRY_BACKOFF_SECONDS"),
+    max_concurrent_hedges=get_int("UPSTREAM_MAX_CONCURRENT_HEDGES"),
+)
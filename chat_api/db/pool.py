@@ -0,0 +1,64 @@
+import time
+import uuid
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from chat_api.config import get_bool, get_float, get_int
+from chat_api.metrics import Counter, Gauge, Histogram
+
+POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent acquiring a connection from the database pool.",
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Connection checkouts that gave up after DB_POOL_TIMEOUT_SECONDS.",
+)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """``AsyncAdaptedQueuePool`` that records checkout wait time and timeouts."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def get_engine_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = dict(
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=get_int("DB_POOL_SIZE"),
+        max_overflow=get_int("DB_MAX_OVERFLOW"),
+        pool_timeout=get_float("DB_POOL_TIMEOUT_SECONDS"),
+        pool_recycle=get_int("DB_POOL_RECYCLE_SECONDS"),
+        pool_pre_ping=get_bool("DB_POOL_PRE_PING"),
+    )
+    if get_bool("DB_PGBOUNCER_MODE"):
+        # PgBouncer in transaction mode hands each transaction a different server
+        # connection, so named prepared statements cannot be cached or reused.
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+def register_pool_metrics(engine) -> None:
+    # Read the pool through the engine on every scrape; dispose() swaps in a new pool.
+    Gauge("db_pool_size", "Configured number of persistent pool connections.",
+          function=lambda: engine.pool.size())
+    Gauge("db_pool_checked_out", "Connections currently checked out of the pool.",
+          function=lambda: engine.pool.checkedout())
+    Gauge("db_pool_checked_in", "Idle connections currently held by the pool.",
+          function=lambda: engine.pool.checkedin())
+    Gauge("db_pool_overflow", "Connections open beyond pool_size.",
+          function=lambda: max(engine.pool.overflow(), 0))
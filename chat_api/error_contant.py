@@ -4,6 +4,9 @@ class ErrorConstant:
     MAX_QUERY_LENGTH_ERROR = "Query cannot exceed 2000 characters"
     BAD_REQUEST = "Bad Request"
     UNAUTHORIZED = "Unauthorized"
+    INVALID_TOKEN = "Invalid or expired token"
+    TOO_MANY_REQUESTS = "Too Many Requests"
+    SERVICE_UNAVAILABLE = "Service Unavailable"
 
 class ResponseError(BaseModel):
     error: str
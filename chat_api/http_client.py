@@ -0,0 +1,56 @@
+import logging
+from typing import Optional
+
+import httpx
+
+from chat_api.config import get_bool, get_float, get_int
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    http2 = get_bool("HTTP_CLIENT_HTTP2")
+    if http2 and not _http2_available():
+        logger.warning("HTTP_CLIENT_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            get_float("HTTP_CLIENT_TIMEOUT_SECONDS"),
+            read=get_float("HTTP_CLIENT_READ_TIMEOUT_SECONDS")
+        ),
+        limits=httpx.Limits(
+            max_connections=get_int("HTTP_CLIENT_MAX_CONNECTIONS"),
+            max_keepalive_connections=get_int("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS"),
+            keepalive_expiry=get_float("HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS")
+        )
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide client for outbound HTTP calls.
+
+    Normally opened by the app lifespan; created on first use otherwise so scripts work too.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+class ModelJSONResponse(Response):
+    """
+    Encodes a pydantic model straight to JSON bytes.
+
+    Returning this from a route skips FastAPI's re-validation against
+    ``response_model`` and encodes with pydantic's serializer instead of the stdlib,
+    so the model is only validated where it was built (or not at all for
+    ``model_construct`` instances of trusted rows).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.model_dump_json().encode("utf-8")
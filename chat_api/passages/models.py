@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime, Text
+
+from chat_api.db.db import Base
+
+
+class Passage(Base):
+    __tablename__ = "passages"
+
+    # sha256 of source_id, title and text, so identical passages are stored once.
+    id = Column(String(64), primary_key=True)
+    source_id = Column(String, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,62 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import Row, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chat_api.passages.models import Passage
+
+# asyncpg allows at most 32767 bind parameters per statement; a passage row binds 5.
+ROWS_PER_INSERT = 32767 // 5
+
+
+def passage_id(source_id: str, title: str, text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (source_id, title, text):
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently.
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def _as_text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def to_passage_rows(search_results: Sequence[Dict[str, Any]]) -> List[dict]:
+    """Passage rows for ``search_results``; non-string fields are coerced and non-dict entries skipped."""
+    rows = []
+    for sr in search_results:
+        if not isinstance(sr, dict):
+            continue
+        source_id, title, text = _as_text(sr.get("id")), _as_text(sr.get("title")), _as_text(sr.get("text"))
+        rows.append(dict(id=passage_id(source_id, title, text), source_id=source_id, title=title, text=text))
+    return rows
+
+
+async def save_passages(db: AsyncSession, passage_rows: Iterable[dict]) -> None:
+    """Insert passages that are not stored yet; the caller commits."""
+    # Dedupe and sort so concurrent writers take row locks in the same order.
+    unique_rows = sorted({row["id"]: row for row in passage_rows}.values(), key=lambda row: row["id"])
+    if not unique_rows:
+        return
+    now = datetime.utcnow()
+    for start in range(0, len(unique_rows), ROWS_PER_INSERT):
+        await db.execute(
+            insert(Passage)
+            .values([dict(row, created_at=now) for row in unique_rows[start:start + ROWS_PER_INSERT]])
+            .on_conflict_do_nothing(index_elements=[Passage.id])
+        )
+
+
+async def get_passages_by_ids(db: AsyncSession, ids: Iterable[str]) -> Dict[str, Row]:
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(Passage.id, Passage.source_id, Passage.title, Passage.text).where(Passage.id.in_(ids))
+    )
+    return {row.id: row for row in result.all()}
@@ -3,3 +3,6 @@ THREAD_NOT_FOUND = "Thread not found"
 THREAD_DELETE_FAILED = "Failed to delete thread"
 BAD_REQUEST = "Bad request"
 UNTITLED_THREAD = "Untitled Thread"
+INVALID_CURSOR = "Invalid pagination cursor"
+UPSTREAM_BUSY = "The assistant is busy, please retry shortly"
+UPSTREAM_UNAVAILABLE = "The assistant is temporarily unavailable, please try again later"
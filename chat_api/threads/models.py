@@ -2,7 +2,7 @@ import uuid
 import enum
 from datetime import datetime
 
-from sqlalchemy import Column, ForeignKey, String, DateTime, Boolean, Enum
+from sqlalchemy import Column, ForeignKey, String, DateTime, Boolean, Enum, Index, Integer, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import foreign, relationship
 
@@ -15,6 +15,15 @@ class DeviceType(enum.Enum):
 
 class Thread(Base):
     __tablename__ = "threads"
+    __table_args__ = (
+        Index(
+            "ix_threads_email_application_id_updated_at",
+            "email",
+            "application_id",
+            text("updated_at DESC"),
+            postgresql_where=text("NOT is_deleted"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, nullable=False)
@@ -23,6 +32,10 @@ class Thread(Base):
     is_deleted = Column(Boolean, default=False, nullable=False)
     device_type = Column(Enum(DeviceType), nullable=False)
     application_id = Column(UUID(as_uuid=True), ForeignKey("applications.id"))
+    # Maintained by save_chat so reads never aggregate over chats.
+    title = Column(String, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
     
     application = relationship("Application", back_populates="threads")
-    chats = relationship("Chat", back_populates="thread")
+    chats = relationship("Chat", back_populates="thread", order_by="Chat.created_at")
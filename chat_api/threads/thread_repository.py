@@ -1,12 +1,16 @@
+from datetime import datetime
 from uuid import UUID
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Row, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Tuple
 
+from chat_api.chats.models import Chat
+from chat_api.chats.chats_repository import legacy_response
 from chat_api.threads.models import Thread
 from chat_api.threads.threads_request_model import ThreadCreateRequest
 
 
-def create_thread(db: Session, application_id: UUID, thread_request: ThreadCreateRequest) -> Thread:
+async def create_thread(db: AsyncSession, application_id: UUID, thread_request: ThreadCreateRequest) -> Thread:
 
     thread = Thread(
         email=thread_request.email,
@@ -14,58 +18,96 @@ def create_thread(db: Session, application_id: UUID, thread_request: ThreadCreat
         application_id=application_id
     )
     db.add(thread)
-    db.commit()
-    db.refresh(thread)
+    await db.commit()
+    await db.refresh(thread)
     return thread
 
 
-def get_thread_by_id(db: Session, thread_id: UUID) -> Optional[Thread]:
-    return (
-        db.query(Thread)
-        .options(joinedload(Thread.chats))
-        .filter(Thread.id == thread_id, Thread.is_deleted == False)
-        .first()
+async def get_thread_by_id(db: AsyncSession, thread_id: UUID) -> Optional[Thread]:
+    result = await db.execute(
+        select(Thread).where(Thread.id == thread_id, Thread.is_deleted == False)
     )
+    return result.scalars().first()
 
 
-def get_threads(
-    db: Session,
-    email: str,
-    application: str,
-    skip: int = 0, 
-    limit: int = 10
-) -> Tuple[List[Thread], int]:
-    query = db.query(Thread).filter(
+async def get_thread_chats(
+    db: AsyncSession,
+    thread_id: UUID,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[datetime, UUID]] = None
+) -> List[Row]:
+    """Return the latest ``limit`` chats older than ``before``, oldest first."""
+    query = select(
+        Chat.id,
+        Chat.question,
+        Chat.created_at,
+        Chat.answer,
+        Chat.passage_ids,
+        legacy_response()
+    ).where(Chat.thread_id == thread_id)
+    if before is not None:
+        query = query.where(tuple_(Chat.created_at, Chat.id) < tuple_(*before))
+    query = query.order_by(Chat.created_at.desc(), Chat.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+
+    result = await db.execute(query)
+    chats = list(result.all())
+    chats.reverse()
+    return chats
+
+
+def _listed_threads(email: str, application_id: UUID):
+    return select(Thread).where(
         Thread.is_deleted == False,
-        Thread.email == email
-    ).join(Thread.application).filter(Thread.application.has(name=application))
-    
-    total = query.count()
-    
-    threads = (
+        Thread.email == email,
+        Thread.application_id == application_id
+    )
+
+
+async def count_threads(db: AsyncSession, email: str, application_id: UUID) -> int:
+    query = _listed_threads(email, application_id).with_only_columns(func.count(Thread.id))
+    return await db.scalar(query)
+
+
+async def get_thread_summaries(
+    db: AsyncSession,
+    email: str,
+    application_id: UUID,
+    limit: int = 10,
+    skip: int = 0,
+    after: Optional[Tuple[datetime, UUID]] = None
+) -> List[Row]:
+    query = _listed_threads(email, application_id).with_only_columns(
+        Thread.id,
+        Thread.updated_at,
+        Thread.title
+    )
+    if after is not None:
+        query = query.where(tuple_(Thread.updated_at, Thread.id) < tuple_(*after))
+    else:
+        query = query.offset(skip)
+
+    result = await db.execute(
         query
-        .options(joinedload(Thread.chats))
-        .order_by(Thread.updated_at.desc())
-        .offset(skip)
+        .order_by(Thread.updated_at.desc(), Thread.id.desc())
         .limit(limit)
-        .all()
     )
-    
-    return threads, total
+    return list(result.all())
 
 
-def update_thread(db: Session, thread: Thread) -> Thread:
+async def update_thread(db: AsyncSession, thread: Thread) -> Thread:
     db.add(thread)
-    db.commit()
-    db.refresh(thread)
+    await db.commit()
+    await db.refresh(thread)
     return thread
 
 
-def delete_thread_by_id(db: Session, thread_id: UUID) -> int:
-    rows_updated = (
-        db.query(Thread)
-        .filter(Thread.id == thread_id, Thread.is_deleted == False)
-        .update({"is_deleted": True})
+async def delete_thread_by_id(db: AsyncSession, thread_id: UUID) -> int:
+    result = await db.execute(
+        update(Thread)
+        .where(Thread.id == thread_id, Thread.is_deleted == False)
+        .values(is_deleted=True)
     )
-    db.commit()
-    return rows_updated
\ No newline at end of file
+    await db.commit()
+    return result.rowcount
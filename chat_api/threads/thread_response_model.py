@@ -28,6 +28,7 @@ class ThreadResponse(BaseModel):
     id: UUID
     title: str
     messages: List[Message]
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -43,7 +44,8 @@ class ThreadSummary(BaseModel):
 
 class ThreadListResponse(BaseModel):
     data: List[ThreadSummary]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,96 +1,150 @@
+import base64
+from datetime import datetime
 from uuid import UUID
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 import logging
 
+from chat_api.config import get_float, get_int
 from chat_api.db.db import SessionLocal
+from chat_api.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 from chat_api.threads import thread_repository
-from chat_api.threads.thread_response_model import ThreadResponse, Message, SearchResult, ThreadListResponse, ResponseError
+from chat_api.threads.thread_response_model import ThreadResponse, Message, SearchResult, ThreadListResponse, ThreadSummary, ResponseError
 from chat_api.threads.thread_enums import MessageRole
-from chat_api.threads.models import Thread
 from chat_api.chats.models import Chat
-from chat_api.auth_utils import get_user_email_from_token
-from chat_api.response_message import THREAD_NOT_FOUND, BAD_REQUEST, UNTITLED_THREAD
+from chat_api.chats.history_cache import history_cache
+from chat_api.auth_utils import AuthenticatedUser
+from chat_api.response_message import THREAD_NOT_FOUND, BAD_REQUEST, UNTITLED_THREAD, INVALID_CURSOR
 from chat_api.threads.threads_request_model import ThreadCreateRequest
-from chat_api.applications.applications_services import get_application_by_name_service
-
-
-def create_thread(thread_request: ThreadCreateRequest) -> ThreadResponse:
-    with SessionLocal() as db_session:
-        application = get_application_by_name_service(db_session, name=thread_request.application_name)
-        if application is None:
-            raise HTTPException(status_code=404, detail="Application not found")
-        thread = thread_repository.create_thread(db_session, application_id=application.id, thread_request=thread_request)
+from chat_api.applications.application_registry import application_registry
+from chat_api.passages.passage_repository import get_passages_by_ids
+
+_thread_count_cache = TTLCache(
+    max_size=get_int("THREAD_COUNT_CACHE_SIZE"),
+    ttl_seconds=get_float("THREAD_COUNT_CACHE_TTL_SECONDS"),
+)
+
+
+async def create_thread(thread_request: ThreadCreateRequest) -> ThreadResponse:
+    application_id = await application_registry.get_application_id(thread_request.application_name)
+    if application_id is None:
+        raise HTTPException(status_code=404, detail="Application not found")
+    async with SessionLocal() as db_session:
+        thread = await thread_repository.create_thread(db_session, application_id=application_id, thread_request=thread_request)
+        _thread_count_cache.pop((thread_request.email, thread_request.application_name))
         return thread
 
 
 async def get_all_threads(
-    token: str,
+    user: AuthenticatedUser,
     application: str,
     skip: int = 0, 
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ) -> ThreadListResponse:
-    email = get_user_email_from_token(token)
-    
-    with SessionLocal() as db:
-        threads, total = thread_repository.get_threads(db, email, application, skip, limit)
-        
-        thread_data = []
-        for thread in threads:
-            title = extract_thread_title(thread)
-            thread_data.append({
-                "id": str(thread.id),
-                "title": title
-            })
-        
-        return ThreadListResponse(
-            data=thread_data,
-            total=total
+    after = decode_thread_cursor(cursor) if cursor else None
+    application_id = await application_registry.get_application_id(application)
+    if application_id is None:
+        return ThreadListResponse(data=[], total=0 if include_total else None)
+
+    async with SessionLocal() as db:
+        rows = await thread_repository.get_thread_summaries(
+            db, user.email, application_id, limit=limit + 1, skip=skip, after=after
+        )
+        total = await get_thread_count(db, user.email, application, application_id) if include_total else None
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_thread_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
+
+    # Rows come straight from the database, so the response is built without validation.
+    return ThreadListResponse.model_construct(
+        data=[ThreadSummary.model_construct(id=str(row.id), title=row.title or UNTITLED_THREAD) for row in rows],
+        total=total,
+        next_cursor=next_cursor
+    )
+
+
+async def get_thread_count(db: AsyncSession, email: str, application: str, application_id: UUID) -> int:
+    key = (email, application)
+    total = _thread_count_cache.get(key)
+    if total is None:
+        total = await thread_repository.count_threads(db, email, application_id)
+        _thread_count_cache.set(key, total)
+    return total
+
+
+def encode_thread_cursor(timestamp: datetime, row_id: UUID) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_thread_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(timestamp), UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ResponseError(error=BAD_REQUEST, message=INVALID_CURSOR).model_dump()
         )
 
-async def get_thread_by_id(token: str, thread_id: UUID) -> ThreadResponse:
-    get_user_email_from_token(token)
-    
-    with SessionLocal() as db:
-        thread = thread_repository.get_thread_by_id(db, thread_id)
+async def get_thread_by_id(
+    thread_id: UUID,
+    before: Optional[str] = None,
+    limit: Optional[int] = None
+) -> ThreadResponse:
+    before_key = decode_thread_cursor(before) if before else None
+
+    async with SessionLocal() as db:
+        thread = await thread_repository.get_thread_by_id(db, thread_id)
         
         if not thread:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=ResponseError(error=BAD_REQUEST, message=THREAD_NOT_FOUND).model_dump()
             )
-        
-        sorted_chats = sorted(thread.chats, key=lambda x: x.created_at) if thread.chats else []
-        title = sorted_chats[0].question if sorted_chats else UNTITLED_THREAD
-        messages = transform_chats_to_messages_from_sorted(sorted_chats)
-        
-        return ThreadResponse(
-            id=thread.id,
-            title=title,
-            messages=messages
-        )
 
-async def delete_thread_by_id(token: str, thread_id: UUID) -> None:
-    get_user_email_from_token(token)
-    
-    with SessionLocal() as db:
-        rows_updated = thread_repository.delete_thread_by_id(db, thread_id)
+        chats = await thread_repository.get_thread_chats(
+            db, thread_id, limit=limit + 1 if limit is not None else None, before=before_key
+        )
+        has_more = limit is not None and len(chats) > limit
+        if has_more:
+            chats = chats[1:]
+        passages = await get_passages_by_ids(db, (pid for chat in chats for pid in chat.passage_ids or ()))
+
+    next_cursor = encode_thread_cursor(chats[0].created_at, chats[0].id) if has_more else None
+
+    return ThreadResponse.model_construct(
+        id=thread.id,
+        title=thread.title or UNTITLED_THREAD,
+        messages=transform_chats_to_messages_from_sorted(chats, passages_to_search_results(passages)),
+        next_cursor=next_cursor
+    )
+
+async def delete_thread_by_id(user: AuthenticatedUser, thread_id: UUID) -> None:
+    async with SessionLocal() as db:
+        rows_updated = await thread_repository.delete_thread_by_id(db, thread_id)
         
         if rows_updated == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=ResponseError(error=BAD_REQUEST, message=THREAD_NOT_FOUND).model_dump()
             )
+    _thread_count_cache.discard_where(lambda key: key[0] == user.email)
+    history_cache.invalidate(thread_id)
 
-def extract_thread_title(thread: Thread) -> str:
-
-    if thread.chats:
-        first_chat = min(thread.chats, key=lambda chat: chat.created_at)
-        return first_chat.question
-    return UNTITLED_THREAD
+def passages_to_search_results(passages: Dict[str, Any]) -> Dict[str, SearchResult]:
+    return {
+        pid: SearchResult.model_construct(id=passage.source_id, title=passage.title, text=passage.text)
+        for pid, passage in passages.items()
+    }
 
 
 def transform_chats_to_messages(chats: List[Chat]) -> List[Message]:
@@ -98,11 +152,15 @@ def transform_chats_to_messages(chats: List[Chat]) -> List[Message]:
     return transform_chats_to_messages_from_sorted(sorted_chats)
 
 
-def transform_chats_to_messages_from_sorted(sorted_chats: List[Chat]) -> List[Message]:
+def transform_chats_to_messages_from_sorted(
+    sorted_chats: List[Chat],
+    passages: Optional[Dict[str, SearchResult]] = None
+) -> List[Message]:
     messages = []
+    passages = passages or {}
     
     for chat in sorted_chats:
-        user_message = Message(
+        user_message = Message.model_construct(
             role=MessageRole.USER,
             content=chat.question,
             id=chat.id,
@@ -110,7 +168,13 @@ def transform_chats_to_messages_from_sorted(sorted_chats: List[Chat]) -> List[Me
         )
         messages.append(user_message)
         
-        if isinstance(chat.response, list):
+        if chat.answer is not None:
+            answer = chat.answer
+            if chat.passage_ids:
+                search_results = [passages[pid] for pid in chat.passage_ids if pid in passages] or None
+            else:
+                search_results = None
+        elif isinstance(chat.response, list):
             answer, search_results = parse_list_response(chat.response)
         elif isinstance(chat.response, dict):
             answer, search_results = parse_dict_response(chat.response)
@@ -118,7 +182,7 @@ def transform_chats_to_messages_from_sorted(sorted_chats: List[Chat]) -> List[Me
             logger.warning(f"Invalid response format for chat {chat.id}: {type(chat.response)}")
             continue
         
-        assistant_message = Message(
+        assistant_message = Message.model_construct(
             role=MessageRole.ASSISTANT,
             content=answer,
             id=chat.id,
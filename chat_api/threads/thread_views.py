@@ -1,14 +1,14 @@
-from fastapi import APIRouter, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, Depends, Query
 from uuid import UUID
 from starlette import status
-from typing import Annotated
+from typing import Annotated, Optional
 
+from chat_api.auth_utils import AuthenticatedUser, get_current_user
+from chat_api.config import get_int
+from chat_api.json_response import ModelJSONResponse
 from chat_api.threads import thread_service
 from chat_api.threads.thread_response_model import ThreadResponse, ThreadListResponse
 
-oauth2_scheme = HTTPBearer()
-
 thread_router = APIRouter(
     prefix="/threads",
     tags=["Threads"]
@@ -17,36 +17,40 @@ thread_router = APIRouter(
 
 @thread_router.get("", status_code=status.HTTP_200_OK, response_model=ThreadListResponse)
 async def get_threads(
-    authentication_credential: Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)],
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)],
     application: str,
     skip: int = 0,
-    limit: int = 10
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
-    return await thread_service.get_all_threads(
-        token=authentication_credential.credentials,
+    return ModelJSONResponse(await thread_service.get_all_threads(
+        user=current_user,
         application=application,
         skip=skip,
-        limit=limit
-    )
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
+    ))
 
 
 @thread_router.get("/{thread_id}", status_code=status.HTTP_200_OK, response_model=ThreadResponse)
 async def get_thread_details(
-    authentication_credential: Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)],
-    thread_id: UUID
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)],
+    thread_id: UUID,
+    before: Optional[str] = None,
+    limit: Annotated[Optional[int], Query(ge=1)] = None
 ):
-    return await thread_service.get_thread_by_id(
-        token=authentication_credential.credentials,
-        thread_id=thread_id
-    )
+    # limit counts question/answer turns; pages hold the latest turns first. Without
+    # `before` or `limit` the whole thread is returned, as it was before paging.
+    if before is not None or limit is not None:
+        limit = min(limit or get_int("THREAD_MESSAGES_DEFAULT_LIMIT"), get_int("THREAD_MESSAGES_MAX_LIMIT"))
+    return ModelJSONResponse(await thread_service.get_thread_by_id(thread_id=thread_id, before=before, limit=limit))
 
 
 @thread_router.delete("/{thread_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_thread(
-    authentication_credential: Annotated[HTTPAuthorizationCredentials, Depends(oauth2_scheme)],
+    current_user: Annotated[AuthenticatedUser, Depends(get_current_user)],
     thread_id: UUID
 ):
-    return await thread_service.delete_thread_by_id(
-        token=authentication_credential.credentials,
-        thread_id=thread_id
-    )
+    return await thread_service.delete_thread_by_id(user=current_user, thread_id=thread_id)
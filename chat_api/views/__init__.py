@@ -1,5 +1,5 @@
 """FastAPI route modules ("views")."""
 
-from chat_api.views import hello
+from chat_api.views import hello, metrics
 
-__all__ = ["hello",]
+__all__ = ["hello", "metrics",]
@@ -27,6 +27,7 @@ from chat_api.db.db import Base
 from chat_api.threads.models import Thread
 from chat_api.chats.models import Chat
 from chat_api.applications.models import Application
+from chat_api.passages.models import Passage
 
 target_metadata = Base.metadata
 
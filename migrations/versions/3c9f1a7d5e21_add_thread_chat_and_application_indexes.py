@@ -0,0 +1,55 @@
+"""add thread, chat and application indexes
+
+Revision ID: 3c9f1a7d5e21
+Revises: 812db957037d
+Create Date: 2026-10-18 09:12:04.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c9f1a7d5e21'
+down_revision = '812db957037d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block. If a build
+    # fails it leaves an INVALID index behind; drop it before re-running.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_threads_email_application_id_updated_at',
+            'threads',
+            ['email', 'application_id', sa.text('updated_at DESC')],
+            unique=False,
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_chats_thread_id_created_at',
+            'chats',
+            ['thread_id', 'created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Fails if duplicate application names already exist; dedupe them first.
+        op.create_index(
+            'ix_applications_name',
+            'applications',
+            ['name'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_applications_name', table_name='applications', postgresql_concurrently=True)
+        op.drop_index('ix_chats_thread_id_created_at', table_name='chats', postgresql_concurrently=True)
+        op.drop_index(
+            'ix_threads_email_application_id_updated_at',
+            table_name='threads',
+            postgresql_concurrently=True,
+        )
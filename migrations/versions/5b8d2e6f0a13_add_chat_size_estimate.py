@@ -0,0 +1,43 @@
+"""add chat size estimate
+
+Revision ID: 5b8d2e6f0a13
+Revises: a4e27b90c1d8
+Create Date: 2026-10-18 13:05:17.664390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2e6f0a13'
+down_revision = 'a4e27b90c1d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('size_estimate', sa.Integer(), nullable=True))
+
+    # Same measure as save_chat: characters of the question plus the answer, where
+    # the answer is the token items of list responses or "answer" of dict responses.
+    op.execute(
+        """
+        UPDATE chats
+        SET size_estimate = length(question) + COALESCE(
+            CASE jsonb_typeof(response)
+                WHEN 'array' THEN (
+                    SELECT SUM(length(item->>'data'))
+                    FROM jsonb_array_elements(response) AS item
+                    WHERE item->>'type' = 'token'
+                )
+                WHEN 'object' THEN length(response->>'answer')
+            END,
+            0
+        )
+        WHERE size_estimate IS NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('chats', 'size_estimate')
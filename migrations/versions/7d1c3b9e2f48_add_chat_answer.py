@@ -0,0 +1,46 @@
+"""add chat answer
+
+Revision ID: 7d1c3b9e2f48
+Revises: 5b8d2e6f0a13
+Create Date: 2026-10-18 15:42:09.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1c3b9e2f48'
+down_revision = '5b8d2e6f0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows keep answer NULL and are converted in batches by
+    # `python -m chat_api.chats.response_backfill`, not inside this migration.
+    op.add_column('chats', sa.Column('answer', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    # Converted rows only keep their other events in response: put the answer back
+    # as a token event ahead of `done`, the order the stream merged them in.
+    op.execute("""
+        UPDATE chats SET response =
+            COALESCE((
+                SELECT jsonb_agg(event ORDER BY ordinal)
+                FROM jsonb_array_elements(CASE WHEN jsonb_typeof(response) = 'array' THEN response ELSE '[]'::jsonb END)
+                    WITH ORDINALITY AS events(event, ordinal)
+                WHERE event->>'type' IS DISTINCT FROM 'done'
+            ), '[]'::jsonb)
+            || CASE WHEN answer = '' THEN '[]'::jsonb
+                    ELSE jsonb_build_array(jsonb_build_object('type', 'token', 'data', answer)) END
+            || COALESCE((
+                SELECT jsonb_agg(event ORDER BY ordinal)
+                FROM jsonb_array_elements(CASE WHEN jsonb_typeof(response) = 'array' THEN response ELSE '[]'::jsonb END)
+                    WITH ORDINALITY AS events(event, ordinal)
+                WHERE event->>'type' = 'done'
+            ), '[]'::jsonb)
+        WHERE answer IS NOT NULL
+    """)
+    op.drop_column('chats', 'answer')
@@ -0,0 +1,50 @@
+"""add thread title and activity columns
+
+Revision ID: a4e27b90c1d8
+Revises: 3c9f1a7d5e21
+Create Date: 2026-10-18 11:40:52.207614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a4e27b90c1d8'
+down_revision = '3c9f1a7d5e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('threads', sa.Column('title', sa.String(), nullable=True))
+    op.add_column('threads', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.add_column('threads', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from existing chats: the first question becomes the title, every
+    # chat counts as a question and an answer, and updated_at catches up with the
+    # latest chat so the listing is ordered by activity.
+    op.execute(
+        """
+        UPDATE threads
+        SET title = stats.title,
+            last_message_at = stats.last_message_at,
+            message_count = stats.message_count,
+            updated_at = GREATEST(threads.updated_at, stats.last_message_at)
+        FROM (
+            SELECT DISTINCT ON (thread_id)
+                thread_id,
+                question AS title,
+                MAX(created_at) OVER (PARTITION BY thread_id) AS last_message_at,
+                2 * COUNT(*) OVER (PARTITION BY thread_id) AS message_count
+            FROM chats
+            ORDER BY thread_id, created_at
+        ) AS stats
+        WHERE threads.id = stats.thread_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('threads', 'message_count')
+    op.drop_column('threads', 'last_message_at')
+    op.drop_column('threads', 'title')
@@ -0,0 +1,54 @@
+"""add passages table
+
+Revision ID: c2f6a8d41b97
+Revises: 7d1c3b9e2f48
+Create Date: 2026-10-18 16:27:51.402337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c2f6a8d41b97'
+down_revision = '7d1c3b9e2f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('passages',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('source_id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_passages_source_id'), 'passages', ['source_id'], unique=False)
+    # Existing search results are moved over by `python -m chat_api.chats.response_backfill`.
+    op.add_column('chats', sa.Column('passage_ids', postgresql.ARRAY(sa.String(length=64)), nullable=True))
+
+
+def downgrade() -> None:
+    # Put each converted chat's passages back into response as a leading
+    # search_results event before the passages are dropped.
+    op.execute("""
+        UPDATE chats SET response =
+            jsonb_build_array(jsonb_build_object('type', 'search_results', 'data', restored.results))
+            || CASE WHEN jsonb_typeof(chats.response) = 'array' THEN chats.response ELSE '[]'::jsonb END
+        FROM (
+            SELECT chats.id, jsonb_agg(
+                jsonb_build_object('id', passages.source_id, 'title', passages.title, 'text', passages.text)
+                ORDER BY ids.ordinal
+            ) AS results
+            FROM chats
+            CROSS JOIN LATERAL unnest(chats.passage_ids) WITH ORDINALITY AS ids(passage_id, ordinal)
+            JOIN passages ON passages.id = ids.passage_id
+            GROUP BY chats.id
+        ) AS restored
+        WHERE chats.id = restored.id
+    """)
+    op.drop_column('chats', 'passage_ids')
+    op.drop_index(op.f('ix_passages_source_id'), table_name='passages')
+    op.drop_table('passages')
@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+from chat_api.applications.application_registry import ApplicationRegistry
+
+
+def test_application_registry_serves_ids_from_memory() -> None:
+    application_id = uuid4()
+    load_ids = AsyncMock(return_value={"webuddhist": application_id})
+    registry = ApplicationRegistry(load_ids, ttl_seconds=300, min_reload_interval_seconds=10)
+
+    async def _run():
+        return [await registry.get_application_id("webuddhist") for _ in range(5)]
+
+    assert asyncio.run(_run()) == [application_id] * 5
+    load_ids.assert_awaited_once()
+
+
+def test_application_registry_reloads_unknown_name_at_most_once_per_interval() -> None:
+    load_ids = AsyncMock(return_value={"webuddhist": uuid4()})
+    registry = ApplicationRegistry(load_ids, ttl_seconds=300, min_reload_interval_seconds=10)
+
+    with patch("chat_api.applications.application_registry.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 100.0
+        asyncio.run(registry.get_application_id("webuddhist"))
+
+        mock_monotonic.return_value = 105.0
+        assert asyncio.run(registry.get_application_id("missing")) is None
+        assert load_ids.await_count == 1
+
+        new_id = uuid4()
+        load_ids.return_value = {"webuddhist": uuid4(), "sherab": new_id}
+        mock_monotonic.return_value = 111.0
+        assert asyncio.run(registry.get_application_id("sherab")) == new_id
+        assert load_ids.await_count == 2
+
+
+def test_application_registry_invalidate_forces_reload() -> None:
+    load_ids = AsyncMock(return_value={"webuddhist": uuid4()})
+    registry = ApplicationRegistry(load_ids, ttl_seconds=300, min_reload_interval_seconds=10)
+
+    asyncio.run(registry.get_application_id("webuddhist"))
+    registry.invalidate()
+    asyncio.run(registry.get_application_id("webuddhist"))
+
+    assert load_ids.await_count == 2
+
+
+def test_application_registry_discards_reload_started_before_invalidate() -> None:
+    old_id, new_id = uuid4(), uuid4()
+    registry = ApplicationRegistry(AsyncMock(), ttl_seconds=300, min_reload_interval_seconds=10)
+
+    async def _run():
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def _slow_old_load():
+            started.set()
+            await finish.wait()
+            return {"webuddhist": old_id}
+
+        registry._load_ids = _slow_old_load
+        in_flight = asyncio.create_task(registry.reload())
+        await started.wait()
+        registry.invalidate()
+        registry._load_ids = AsyncMock(return_value={"webuddhist": new_id})
+        # Joining the stale reload would wait for ``finish`` forever.
+        fresh = await asyncio.wait_for(registry.get_application_id("webuddhist"), 1)
+        finish.set()
+        await in_flight
+        return fresh, await registry.get_application_id("webuddhist")
+
+    assert asyncio.run(_run()) == (new_id, new_id)
@@ -0,0 +1,179 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
+
+from chat_api.auth_utils import (
+    AuthenticatedUser,
+    JWKSKeyStore,
+    VerifiedClaimsCache,
+    get_current_user,
+    validate_token,
+)
+from chat_api.error_contant import ErrorConstant
+
+
+def test_jwks_key_store_caches_keys_within_ttl() -> None:
+    fetch_keys = AsyncMock(return_value={"kid-1": {"kid": "kid-1"}})
+    store = JWKSKeyStore(fetch_keys, ttl_seconds=60, min_refresh_interval_seconds=10)
+
+    async def _run():
+        first = await store.get_key("kid-1")
+        second = await store.get_key("kid-1")
+        return first, second
+
+    first, second = asyncio.run(_run())
+
+    assert first == {"kid": "kid-1"}
+    assert second == {"kid": "kid-1"}
+    fetch_keys.assert_awaited_once()
+
+
+def test_jwks_key_store_refetches_after_ttl() -> None:
+    fetch_keys = AsyncMock(return_value={"kid-1": {"kid": "kid-1"}})
+    store = JWKSKeyStore(fetch_keys, ttl_seconds=60, min_refresh_interval_seconds=10)
+
+    with patch("chat_api.auth_utils.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        asyncio.run(store.get_key("kid-1"))
+        mock_monotonic.return_value = 1061.0
+        asyncio.run(store.get_key("kid-1"))
+
+    assert fetch_keys.await_count == 2
+
+
+def test_jwks_key_store_unknown_kid_refresh_is_rate_limited() -> None:
+    fetch_keys = AsyncMock(return_value={"kid-1": {"kid": "kid-1"}})
+    store = JWKSKeyStore(fetch_keys, ttl_seconds=3600, min_refresh_interval_seconds=30)
+
+    with patch("chat_api.auth_utils.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        asyncio.run(store.get_key("kid-1"))
+
+        mock_monotonic.return_value = 1005.0
+        assert asyncio.run(store.get_key("unknown")) is None
+        assert asyncio.run(store.get_key("unknown")) is None
+        assert fetch_keys.await_count == 1
+
+        fetch_keys.return_value = {"kid-1": {"kid": "kid-1"}, "kid-2": {"kid": "kid-2"}}
+        mock_monotonic.return_value = 1031.0
+        assert asyncio.run(store.get_key("kid-2")) == {"kid": "kid-2"}
+        assert fetch_keys.await_count == 2
+
+
+def test_jwks_key_store_concurrent_callers_share_one_fetch() -> None:
+    async def _fetch_keys():
+        await asyncio.sleep(0.01)
+        return {"kid-1": {"kid": "kid-1"}}
+
+    fetch_keys = AsyncMock(side_effect=_fetch_keys)
+    store = JWKSKeyStore(fetch_keys, ttl_seconds=60, min_refresh_interval_seconds=10)
+
+    async def _run():
+        return await asyncio.gather(*(store.get_key("kid-1") for _ in range(20)))
+
+    results = asyncio.run(_run())
+
+    assert all(result == {"kid": "kid-1"} for result in results)
+    fetch_keys.assert_awaited_once()
+
+
+def test_jwks_key_store_keeps_stale_keys_when_fetch_fails() -> None:
+    fetch_keys = AsyncMock(return_value={"kid-1": {"kid": "kid-1"}})
+    store = JWKSKeyStore(fetch_keys, ttl_seconds=60, min_refresh_interval_seconds=10)
+
+    with patch("chat_api.auth_utils.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        asyncio.run(store.get_key("kid-1"))
+
+        fetch_keys.side_effect = RuntimeError("auth0 unavailable")
+        mock_monotonic.return_value = 1100.0
+        assert asyncio.run(store.get_key("kid-1")) == {"kid": "kid-1"}
+
+
+def test_verified_claims_cache_hit_and_miss_counters() -> None:
+    cache = VerifiedClaimsCache(max_size=10, max_ttl_seconds=300)
+
+    assert cache.get("token-a") is None
+    cache.put("token-a", {"email": "user@example.com"})
+
+    assert cache.get("token-a") == {"email": "user@example.com"}
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_verified_claims_cache_expires_at_token_exp() -> None:
+    cache = VerifiedClaimsCache(max_size=10, max_ttl_seconds=300)
+
+    with patch("chat_api.auth_utils.time.time") as mock_time:
+        mock_time.return_value = 1000.0
+        cache.put("token-a", {"email": "user@example.com", "exp": 1010})
+
+        mock_time.return_value = 1009.0
+        assert cache.get("token-a") is not None
+
+        mock_time.return_value = 1010.0
+        assert cache.get("token-a") is None
+
+
+def test_verified_claims_cache_caps_lifetime_at_max_ttl() -> None:
+    cache = VerifiedClaimsCache(max_size=10, max_ttl_seconds=60)
+
+    with patch("chat_api.auth_utils.time.time") as mock_time:
+        mock_time.return_value = 1000.0
+        cache.put("token-a", {"email": "user@example.com", "exp": 5000})
+
+        mock_time.return_value = 1061.0
+        assert cache.get("token-a") is None
+
+
+def test_verified_claims_cache_evicts_least_recently_used() -> None:
+    cache = VerifiedClaimsCache(max_size=2, max_ttl_seconds=300)
+
+    cache.put("token-a", {"email": "a@example.com"})
+    cache.put("token-b", {"email": "b@example.com"})
+    cache.get("token-a")
+    cache.put("token-c", {"email": "c@example.com"})
+
+    assert cache.get("token-b") is None
+    assert cache.get("token-a") is not None
+    assert cache.get("token-c") is not None
+    assert cache.evictions == 1
+
+
+@patch("chat_api.auth_utils.decode_backend_token")
+@patch("chat_api.auth_utils.jwt.get_unverified_claims")
+def test_validate_token_decodes_each_token_once(mock_unverified_claims, mock_decode) -> None:
+    mock_unverified_claims.return_value = {"iss": "https://pecha-v2.org"}
+    mock_decode.return_value = {"email": "user@example.com"}
+
+    with patch("chat_api.auth_utils.verified_claims_cache", VerifiedClaimsCache(10, 300)):
+        first = asyncio.run(validate_token("token-a"))
+        second = asyncio.run(validate_token("token-a"))
+
+    assert first == second == {"email": "user@example.com"}
+    mock_decode.assert_called_once_with("token-a")
+
+
+@patch("chat_api.auth_utils.validate_token", new_callable=AsyncMock)
+def test_get_current_user_resolves_email_and_issuer(mock_validate_token) -> None:
+    mock_validate_token.return_value = {"email": "user@example.com", "iss": "https://pecha-v2.org"}
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token-a")
+
+    user = asyncio.run(get_current_user(credentials))
+
+    assert user == AuthenticatedUser(email="user@example.com", issuer="https://pecha-v2.org")
+    mock_validate_token.assert_awaited_once_with("token-a")
+
+
+@patch("chat_api.auth_utils.validate_token", new_callable=AsyncMock)
+def test_get_current_user_rejects_invalid_token(mock_validate_token) -> None:
+    mock_validate_token.side_effect = ValueError("Token validation failed")
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="bad-token")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_current_user(credentials))
+
+    assert exc.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert exc.value.detail["error"] == ErrorConstant.UNAUTHORIZED
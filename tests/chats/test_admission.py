@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from chat_api.chats.admission import AdmissionRejected, FairAdmissionLimiter
+
+
+def test_acquire_admits_immediately_under_the_limit() -> None:
+    limiter = FairAdmissionLimiter(max_concurrent=2, max_queue_size=10, max_wait_seconds=1)
+
+    async def _run():
+        first = await limiter.acquire("app", "a@example.com")
+        second = await limiter.acquire("app", "a@example.com")
+        active = limiter.active
+        first.release()
+        second.release()
+        second.release()
+        return active
+
+    assert asyncio.run(_run()) == 2
+    assert limiter.active == 0
+
+
+def test_waiters_are_served_round_robin_across_users() -> None:
+    limiter = FairAdmissionLimiter(max_concurrent=1, max_queue_size=10, max_wait_seconds=1)
+    served = []
+
+    async def _waiter(user, label):
+        slot = await limiter.acquire("app", user)
+        served.append(label)
+        slot.release()
+
+    async def _run():
+        slot = await limiter.acquire("app", "heavy@example.com")
+        waiters = [
+            asyncio.create_task(_waiter("heavy@example.com", "heavy-1")),
+            asyncio.create_task(_waiter("heavy@example.com", "heavy-2")),
+            asyncio.create_task(_waiter("heavy@example.com", "heavy-3")),
+            asyncio.create_task(_waiter("light@example.com", "light-1")),
+        ]
+        await asyncio.sleep(0)
+        slot.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(_run())
+
+    assert served == ["heavy-1", "light-1", "heavy-2", "heavy-3"]
+
+
+def test_acquire_rejects_when_queue_is_full() -> None:
+    limiter = FairAdmissionLimiter(max_concurrent=1, max_queue_size=1, max_wait_seconds=1)
+
+    async def _run():
+        slot = await limiter.acquire("app", "a@example.com")
+        queued = asyncio.create_task(limiter.acquire("app", "b@example.com"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            await limiter.acquire("app", "c@example.com")
+        slot.release()
+        (await queued).release()
+        return exc.value
+
+    rejection = asyncio.run(_run())
+
+    assert rejection.reason == "queue_full"
+    # No slot was released yet: one max wait per request ahead, one waiting plus this one.
+    assert rejection.retry_after_seconds == 2
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+
+def test_acquire_gives_up_after_max_wait() -> None:
+    limiter = FairAdmissionLimiter(max_concurrent=1, max_queue_size=10, max_wait_seconds=0.01)
+
+    async def _run():
+        slot = await limiter.acquire("app", "a@example.com")
+        with pytest.raises(AdmissionRejected) as exc:
+            await limiter.acquire("app", "b@example.com")
+        waiting = limiter.waiting
+        slot.release()
+        return exc.value, waiting
+
+    rejection, waiting = asyncio.run(_run())
+
+    assert rejection.reason == "timeout"
+    assert waiting == 0
+    assert limiter.active == 0
+
+
+def test_retry_after_scales_with_queue_depth_and_hold_time() -> None:
+    limiter = FairAdmissionLimiter(max_concurrent=2, max_queue_size=10, max_wait_seconds=10)
+
+    async def _run():
+        with patch("chat_api.chats.admission.time.monotonic", return_value=100.0):
+            slot = await limiter.acquire("app", "a@example.com")
+        with patch("chat_api.chats.admission.time.monotonic", return_value=104.0):
+            slot.release()
+
+    asyncio.run(_run())
+
+    assert limiter.mean_hold_seconds == 4.0
+    assert limiter.retry_after_seconds == 2
+    limiter.waiting = 5
+    assert limiter.retry_after_seconds == 12
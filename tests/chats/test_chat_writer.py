@@ -0,0 +1,239 @@
+import asyncio
+import fcntl
+import json
+import os
+from datetime import datetime
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from chat_api.chats.chat_writer import ChatWriteBehindQueue, PendingChat, _read_spool
+
+
+def _pending_chat(question: str = "What is karma?") -> PendingChat:
+    return PendingChat(
+        id=uuid4(),
+        thread_id=uuid4(),
+        question=question,
+        response=[{"type": "token", "data": "An answer"}],
+        size_estimate=len(question) + 9,
+        created_at=datetime(2024, 1, 1, 12, 0, 0),
+    )
+
+
+def _writer(write_batch, tmp_path, batch_size=10, flush_interval_seconds=0.01, stop_timeout_seconds=5):
+    return ChatWriteBehindQueue(
+        write_batch,
+        batch_size=batch_size,
+        flush_interval_seconds=flush_interval_seconds,
+        max_queue_size=100,
+        spool_path=str(tmp_path / "spool.jsonl"),
+        replay_interval_seconds=60,
+        stop_timeout_seconds=stop_timeout_seconds,
+    )
+
+
+def test_submit_returns_false_when_writer_is_not_running(tmp_path) -> None:
+    writer = _writer(AsyncMock(), tmp_path)
+
+    assert writer.submit(_pending_chat()) is False
+
+
+def test_chats_are_written_in_batches_of_batch_size(tmp_path) -> None:
+    write_batch = AsyncMock()
+    writer = _writer(write_batch, tmp_path, batch_size=2, flush_interval_seconds=5)
+    chats = [_pending_chat(f"question {index}") for index in range(4)]
+
+    async def _run():
+        await writer.start()
+        for chat in chats:
+            assert writer.submit(chat) is True
+        await asyncio.sleep(0.05)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    assert [call.args[0] for call in write_batch.await_args_list] == [chats[:2], chats[2:]]
+
+
+def test_partial_batch_is_flushed_after_interval(tmp_path) -> None:
+    write_batch = AsyncMock()
+    writer = _writer(write_batch, tmp_path, batch_size=100, flush_interval_seconds=0.01)
+    chat = _pending_chat()
+
+    async def _run():
+        await writer.start()
+        writer.submit(chat)
+        await asyncio.sleep(0.05)
+        flushed = write_batch.await_count
+        await writer.stop()
+        return flushed
+
+    assert asyncio.run(_run()) == 1
+    write_batch.assert_awaited_once_with([chat])
+
+
+def test_stop_drains_queued_chats(tmp_path) -> None:
+    write_batch = AsyncMock()
+    writer = _writer(write_batch, tmp_path, batch_size=100, flush_interval_seconds=60)
+    chats = [_pending_chat(f"question {index}") for index in range(3)]
+
+    async def _run():
+        await writer.start()
+        for chat in chats:
+            writer.submit(chat)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    write_batch.assert_awaited_once_with(chats)
+    assert writer.running is False
+
+
+def test_failed_batch_is_spooled_and_replayed_on_next_start(tmp_path) -> None:
+    write_batch = AsyncMock(side_effect=ConnectionError("database unavailable"))
+    writer = _writer(write_batch, tmp_path)
+    chat = _pending_chat()
+
+    async def _run():
+        await writer.start()
+        writer.submit(chat)
+        await writer.stop()
+
+        write_batch.side_effect = None
+        write_batch.reset_mock()
+        await writer.start()
+        await asyncio.sleep(0.05)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    write_batch.assert_awaited_once_with([chat])
+    assert os.listdir(tmp_path) == ["spool.jsonl.lock"]
+
+
+def test_stop_waits_for_the_in_flight_batch(tmp_path) -> None:
+    written = []
+
+    async def slow_write(batch):
+        await asyncio.sleep(0.1)
+        written.extend(batch)
+
+    writer = _writer(slow_write, tmp_path)
+    chat = _pending_chat()
+
+    async def _run():
+        await writer.start()
+        writer.submit(chat)
+        await asyncio.sleep(0.03)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    assert written == [chat]
+    assert os.listdir(tmp_path) == ["spool.jsonl.lock"]
+
+
+def test_stop_spools_the_in_flight_batch_after_timeout(tmp_path) -> None:
+    async def hanging_write(batch):
+        await asyncio.sleep(60)
+
+    writer = _writer(hanging_write, tmp_path, stop_timeout_seconds=0.05)
+    chats = [_pending_chat(f"question {index}") for index in range(2)]
+
+    async def _run():
+        await writer.start()
+        writer.submit(chats[0])
+        await asyncio.sleep(0.03)
+        writer.submit(chats[1])
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    assert _read_spool(str(tmp_path / "spool.jsonl")) == chats
+
+
+def test_submit_returns_false_once_stopping(tmp_path) -> None:
+    async def slow_write(batch):
+        await asyncio.sleep(0.05)
+
+    writer = _writer(slow_write, tmp_path)
+
+    async def _run():
+        await writer.start()
+        writer.submit(_pending_chat())
+        await asyncio.sleep(0.02)
+        stopping = asyncio.create_task(writer.stop())
+        await asyncio.sleep(0)
+        accepted = writer.submit(_pending_chat())
+        await stopping
+        return accepted
+
+    assert asyncio.run(_run()) is False
+
+
+def test_bad_row_is_quarantined_and_the_rest_of_the_batch_written(tmp_path) -> None:
+    good = [_pending_chat("good one"), _pending_chat("good two")]
+    bad = _pending_chat("bad")
+    written = []
+
+    async def write_batch(batch):
+        if bad in batch:
+            raise ValueError("A string literal cannot contain NUL characters.")
+        written.extend(batch)
+
+    writer = _writer(write_batch, tmp_path)
+
+    async def _run():
+        await writer.start()
+        for chat in (good[0], bad, good[1]):
+            writer.submit(chat)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    assert written == good
+    assert _read_spool(str(tmp_path / "spool.jsonl.quarantine")) == [bad]
+    assert not os.path.exists(tmp_path / "spool.jsonl")
+
+
+def test_orphaned_replay_file_of_a_dead_worker_is_replayed_on_start(tmp_path) -> None:
+    write_batch = AsyncMock()
+    writer = _writer(write_batch, tmp_path)
+    chat = _pending_chat()
+    # No process has pid 2**22 + 1, above Linux's pid_max.
+    orphan = tmp_path / f"spool.jsonl.{2 ** 22 + 1}.replay"
+    orphan.write_text(json.dumps(chat.to_json()) + "\n", encoding="utf-8")
+
+    async def _run():
+        await writer.start()
+        await asyncio.sleep(0.05)
+        await writer.stop()
+
+    asyncio.run(_run())
+
+    write_batch.assert_awaited_once_with([chat])
+    assert os.listdir(tmp_path) == ["spool.jsonl.lock"]
+
+
+def test_spool_is_not_claimed_while_an_append_holds_the_lock(tmp_path) -> None:
+    writer = _writer(AsyncMock(), tmp_path)
+    spool_path = tmp_path / "spool.jsonl"
+    chat = _pending_chat()
+    spool_path.write_text(json.dumps(chat.to_json()) + "\n", encoding="utf-8")
+
+    async def _run():
+        with open(f"{spool_path}.lock", "a") as lock_file:
+            # Stands in for another worker midway through an append.
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            replay = asyncio.create_task(writer._replay_spool())
+            await asyncio.sleep(0.05)
+            claimed_while_locked = not spool_path.exists()
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        await replay
+        return claimed_while_locked
+
+    claimed_while_locked = asyncio.run(_run())
+
+    assert claimed_while_locked is False
+    assert not spool_path.exists()
+    writer._write_batch.assert_awaited_once_with([chat])
@@ -0,0 +1,27 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+from sqlalchemy.dialects import postgresql
+
+from chat_api.chats.chats_repository import get_recent_turns
+
+
+def _recent_turns_sql(strategy: str) -> str:
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    asyncio.run(get_recent_turns(db, uuid4(), 100, strategy))
+    statement = db.execute.await_args.args[0]
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_get_recent_turns_prefilters_on_full_turn_size_by_default() -> None:
+    sql = _recent_turns_sql("full")
+
+    assert "sum(coalesce(chats.size_estimate, length(chats.question))) OVER" in sql
+
+
+def test_get_recent_turns_prefilters_on_question_length_for_questions_only() -> None:
+    sql = _recent_turns_sql("questions_only")
+
+    assert "sum(length(chats.question)) OVER" in sql
@@ -2,18 +2,31 @@ import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
+from chat_api.auth_utils import AuthenticatedUser
 from chat_api.chats.chats_reponse_model import ChatRequest
-from chat_api.chats.chats_services import sse_frame_from_line, get_chat_stream, merge_token_items
+from chat_api.chats.response_cache import ResponseCache
+from chat_api.chats.circuit_breaker import CircuitOpenError
+from chat_api.chats.chats_services import (
+    UPSTREAM_ERROR_FRAME, StreamAccumulator, first_turn_key, get_chat_stream, merge_token_items,
+    needs_upstream_stream, sse_frame_from_line
+)
 from chat_api.threads.models import DeviceType
 
 
 def _sessionlocal_cm(session):
     cm = MagicMock()
-    cm.__enter__.return_value = session
-    cm.__exit__.return_value = False
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=False)
     return cm
 
 
+def _lines_as_bytes(aiter_lines):
+    async def _aiter_bytes():
+        async for line in aiter_lines():
+            yield (line + "\n").encode("utf-8")
+    return _aiter_bytes
+
+
 def test_sse_frame_from_line_empty_line_returns_none() -> None:
     assert sse_frame_from_line("") is None
     assert sse_frame_from_line("   ") is None
@@ -96,12 +109,36 @@ def test_merge_token_items_done_item_always_last() -> None:
     assert result[2] == {"type": "done", "data": {}}
 
 
+def test_stream_accumulator_matches_merge_token_items() -> None:
+    chat_list = [
+        {"type": "search_results", "data": [{"id": "123", "text": "result"}]},
+        {"type": "token", "data": "Hello"},
+        {"type": "done", "data": {}},
+        {"type": "token", "data": " world"},
+    ]
+    accumulator = StreamAccumulator()
+    for item in chat_list:
+        accumulator.add(item)
+
+    assert accumulator.merged() == merge_token_items(chat_list)
+    assert accumulator.merged()[-1] == {"type": "done", "data": {}}
+
+
+def test_stream_accumulator_is_empty_until_an_event_arrives() -> None:
+    accumulator = StreamAccumulator()
+    assert not accumulator
+
+    accumulator.add({"type": "token", "data": ""})
+    assert accumulator
+    assert accumulator.merged() == []
+
+
 @patch("chat_api.chats.chats_services.save_chat")
 @patch("chat_api.chats.chats_services.SessionLocal")
 @patch("chat_api.chats.chats_services.create_thread")
-@patch("chat_api.chats.chats_services.httpx.AsyncClient")
+@patch("chat_api.chats.chats_services.get_http_client")
 def test_get_chat_stream_creates_thread_and_persists_chat(
-    mock_async_client, mock_create_thread, mock_sessionlocal, mock_save_chat
+    mock_get_http_client, mock_create_thread, mock_sessionlocal, mock_save_chat
 ) -> None:
     thread_id = uuid4()
     mock_create_thread.return_value = MagicMock(id=thread_id)
@@ -113,6 +150,7 @@ def test_get_chat_stream_creates_thread_and_persists_chat(
         yield 'data: {"role":"assistant","content":"hello"}'
 
     stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
 
     stream_cm = MagicMock()
     stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
@@ -121,10 +159,7 @@ def test_get_chat_stream_creates_thread_and_persists_chat(
     client_instance = MagicMock()
     client_instance.stream.return_value = stream_cm
 
-    client_cm = MagicMock()
-    client_cm.__aenter__ = AsyncMock(return_value=client_instance)
-    client_cm.__aexit__ = AsyncMock(return_value=False)
-    mock_async_client.return_value = client_cm
+    mock_get_http_client.return_value = client_instance
 
     db_session = MagicMock()
     mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
@@ -138,7 +173,7 @@ def test_get_chat_stream_creates_thread_and_persists_chat(
     )
 
     async def _collect():
-        return [chunk async for chunk in get_chat_stream(chat_request)]
+        return [chunk async for chunk in get_chat_stream(user=AuthenticatedUser(email="user@example.com"), chat_request=chat_request)]
 
     chunks = asyncio.run(_collect())
 
@@ -151,26 +186,35 @@ def test_get_chat_stream_creates_thread_and_persists_chat(
     assert "thread_id" in first_chunk
     assert str(thread_id) in first_chunk
     
-    mock_create_thread.assert_called_once()
+    mock_create_thread.assert_awaited_once()
     mock_sessionlocal.assert_called_once()
-    mock_save_chat.assert_called_once()
+    mock_save_chat.assert_awaited_once()
 
 
 @patch("chat_api.chats.chats_services.save_chat")
 @patch("chat_api.chats.chats_services.SessionLocal")
 @patch("chat_api.chats.chats_services.create_thread")
-@patch("chat_api.chats.chats_services.get_thread_by_id")
-@patch("chat_api.chats.chats_services.httpx.AsyncClient")
+@patch("chat_api.chats.chats_services.get_recent_turns")
+@patch("chat_api.chats.chats_services.thread_repository.get_thread_by_id")
+@patch("chat_api.chats.chats_services.get_http_client")
 def test_get_chat_stream_uses_existing_thread_id(
-    mock_async_client, mock_get_thread_by_id, mock_create_thread, mock_sessionlocal, mock_save_chat
+    mock_get_http_client,
+    mock_get_thread_by_id,
+    mock_get_recent_turns,
+    mock_create_thread,
+    mock_sessionlocal,
+    mock_save_chat,
 ) -> None:
     existing_thread_id = str(uuid4())
-    mock_get_thread_by_id.return_value = MagicMock(
-        messages=[
-            MagicMock(role="user", content="previous question"),
-            MagicMock(role="assistant", content="previous answer"),
-        ]
-    )
+    mock_get_thread_by_id.return_value = MagicMock()
+    mock_get_recent_turns.return_value = [
+        MagicMock(
+            question="previous question",
+            answer=None,
+            response=[{"type": "token", "data": "previous answer"}],
+            size=len("previous question") + len("previous answer"),
+        )
+    ]
 
     stream_response = MagicMock()
 
@@ -178,6 +222,7 @@ def test_get_chat_stream_uses_existing_thread_id(
         yield 'data: {"role":"assistant","content":"hello"}'
 
     stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
 
     stream_cm = MagicMock()
     stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
@@ -186,10 +231,7 @@ def test_get_chat_stream_uses_existing_thread_id(
     client_instance = MagicMock()
     client_instance.stream.return_value = stream_cm
 
-    client_cm = MagicMock()
-    client_cm.__aenter__ = AsyncMock(return_value=client_instance)
-    client_cm.__aexit__ = AsyncMock(return_value=False)
-    mock_async_client.return_value = client_cm
+    mock_get_http_client.return_value = client_instance
 
     db_session = MagicMock()
     mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
@@ -203,14 +245,15 @@ def test_get_chat_stream_uses_existing_thread_id(
     )
 
     async def _collect():
-        return [chunk async for chunk in get_chat_stream(chat_request)]
+        return [chunk async for chunk in get_chat_stream(user=AuthenticatedUser(email="user@example.com"), chat_request=chat_request)]
 
     chunks = asyncio.run(_collect())
 
     # Should not create a new thread
     mock_create_thread.assert_not_called()
     mock_get_thread_by_id.assert_awaited_once()
-    mock_save_chat.assert_called_once()
+    mock_get_recent_turns.assert_awaited_once()
+    mock_save_chat.assert_awaited_once()
     # Thread ID should NOT be in chunks when using existing thread (only yielded for new threads)
     assert not any(b"thread_id" in c for c in chunks)
     
@@ -225,6 +268,7 @@ def test_get_chat_stream_uses_existing_thread_id(
         "messages": [
             {"role": "user", "content": "previous question"},
             {"role": "assistant", "content": "previous answer"},
+            {"role": "user", "content": "hi"},
         ]
     }
 
@@ -232,9 +276,9 @@ def test_get_chat_stream_uses_existing_thread_id(
 @patch("chat_api.chats.chats_services.save_chat")
 @patch("chat_api.chats.chats_services.SessionLocal")
 @patch("chat_api.chats.chats_services.create_thread")
-@patch("chat_api.chats.chats_services.httpx.AsyncClient")
+@patch("chat_api.chats.chats_services.get_http_client")
 def test_get_chat_stream_merges_tokens_before_saving(
-    mock_async_client, mock_create_thread, mock_sessionlocal, mock_save_chat
+    mock_get_http_client, mock_create_thread, mock_sessionlocal, mock_save_chat
 ) -> None:
     thread_id = uuid4()
     mock_create_thread.return_value = MagicMock(id=thread_id)
@@ -250,6 +294,7 @@ def test_get_chat_stream_merges_tokens_before_saving(
         yield 'data: {"type": "done", "data": {}}'
 
     stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
 
     stream_cm = MagicMock()
     stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
@@ -258,10 +303,7 @@ def test_get_chat_stream_merges_tokens_before_saving(
     client_instance = MagicMock()
     client_instance.stream.return_value = stream_cm
 
-    client_cm = MagicMock()
-    client_cm.__aenter__ = AsyncMock(return_value=client_instance)
-    client_cm.__aexit__ = AsyncMock(return_value=False)
-    mock_async_client.return_value = client_cm
+    mock_get_http_client.return_value = client_instance
 
     db_session = MagicMock()
     mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
@@ -275,12 +317,12 @@ def test_get_chat_stream_merges_tokens_before_saving(
     )
 
     async def _collect():
-        return [chunk async for chunk in get_chat_stream(chat_request)]
+        return [chunk async for chunk in get_chat_stream(user=AuthenticatedUser(email="user@example.com"), chat_request=chat_request)]
 
     chunks = asyncio.run(_collect())
 
     # Verify save_chat was called with merged tokens
-    mock_save_chat.assert_called_once()
+    mock_save_chat.assert_awaited_once()
     call_args = mock_save_chat.call_args
     response_payload = call_args[1]["response_payload"]
     
@@ -296,3 +338,200 @@ def test_get_chat_stream_merges_tokens_before_saving(
     assert response_payload.question == "hi"
 
 
+@patch("chat_api.chats.chats_services.save_chat")
+@patch("chat_api.chats.chats_services.SessionLocal")
+@patch("chat_api.chats.chats_services.create_thread")
+@patch("chat_api.chats.chats_services.token_coalesce_interval_seconds", return_value=60.0)
+@patch("chat_api.chats.chats_services.get_http_client")
+def test_get_chat_stream_coalesces_outbound_token_frames(
+    mock_get_http_client, mock_coalesce_interval, mock_create_thread, mock_sessionlocal, mock_save_chat
+) -> None:
+    thread_id = uuid4()
+    mock_create_thread.return_value = MagicMock(id=thread_id)
+
+    stream_response = MagicMock()
+
+    async def _aiter_lines():
+        yield 'data: {"type": "search_results", "data": []}'
+        yield 'data: {"type": "token", "data": "Hello"}'
+        yield 'data: {"type": "token", "data": " world"}'
+        yield 'data: {"type": "done", "data": {}}'
+
+    stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
+
+    stream_cm = MagicMock()
+    stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
+    stream_cm.__aexit__ = AsyncMock(return_value=False)
+
+    client_instance = MagicMock()
+    client_instance.stream.return_value = stream_cm
+    mock_get_http_client.return_value = client_instance
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+
+    chat_request = ChatRequest(
+        email="user@example.com",
+        query="hi",
+        application="webuddhist",
+        device_type=DeviceType.web.value,
+        thread_id=None,
+    )
+
+    async def _collect():
+        return [chunk async for chunk in get_chat_stream(user=AuthenticatedUser(email="user@example.com"), chat_request=chat_request)]
+
+    chunks = asyncio.run(_collect())
+
+    assert chunks[1:] == [
+        b'data: {"type": "search_results", "data": []}\n\n',
+        b'data: {"type": "token", "data": "Hello world"}\n\n',
+        b'data: {"type": "done", "data": {}}\n\n',
+    ]
+    response_payload = mock_save_chat.call_args[1]["response_payload"]
+    assert response_payload.response[1] == {"type": "token", "data": "Hello world"}
+
+
+@patch("chat_api.chats.chats_services.save_chat")
+@patch("chat_api.chats.chats_services.SessionLocal")
+@patch("chat_api.chats.chats_services.create_thread")
+@patch("chat_api.chats.chats_services.is_response_cache_enabled", return_value=True)
+@patch("chat_api.chats.chats_services.get_http_client")
+def test_get_chat_stream_replays_cached_first_turn(
+    mock_get_http_client, mock_cache_enabled, mock_create_thread, mock_sessionlocal, mock_save_chat
+) -> None:
+    mock_create_thread.side_effect = [MagicMock(id=uuid4()), MagicMock(id=uuid4())]
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+
+    stream_response = MagicMock()
+
+    async def _aiter_lines():
+        yield 'data: {"type": "token", "data": "Hello"}'
+        yield 'data: {"type": "done", "data": {}}'
+
+    stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
+    stream_cm = MagicMock()
+    stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
+    stream_cm.__aexit__ = AsyncMock(return_value=False)
+    client_instance = MagicMock()
+    client_instance.stream.return_value = stream_cm
+    mock_get_http_client.return_value = client_instance
+
+    def _request(query):
+        return ChatRequest(query=query, application="webuddhist", device_type=DeviceType.web.value, thread_id=None)
+
+    async def _collect(query):
+        user = AuthenticatedUser(email="user@example.com")
+        return [chunk async for chunk in get_chat_stream(user=user, chat_request=_request(query))]
+
+    with patch("chat_api.chats.chats_services.response_cache", ResponseCache(10, 60, 0)):
+        first = asyncio.run(_collect("What is karma?"))
+        second = asyncio.run(_collect("what is  karma?"))
+
+    assert client_instance.stream.call_count == 1
+    assert first[1:] == second[1:]
+    assert first[0] != second[0]
+    assert mock_create_thread.await_count == 2
+    assert mock_save_chat.await_count == 2
+    assert mock_save_chat.await_args_list[1].kwargs["response_payload"].question == "what is  karma?"
+
+
+@patch("chat_api.chats.chats_services.save_chat")
+@patch("chat_api.chats.chats_services.SessionLocal")
+@patch("chat_api.chats.chats_services.create_thread")
+@patch("chat_api.chats.chats_services.is_stream_coalescing_enabled", return_value=True)
+@patch("chat_api.chats.chats_services.get_http_client")
+def test_get_chat_stream_coalesces_identical_first_turns(
+    mock_get_http_client, mock_coalescing_enabled, mock_create_thread, mock_sessionlocal, mock_save_chat
+) -> None:
+    thread_ids = [uuid4(), uuid4()]
+    mock_create_thread.side_effect = [MagicMock(id=thread_id) for thread_id in thread_ids]
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+
+    stream_response = MagicMock()
+
+    async def _aiter_lines():
+        yield 'data: {"type": "token", "data": "Hello"}'
+        await asyncio.sleep(0.01)
+        yield 'data: {"type": "done", "data": {}}'
+
+    stream_response.aiter_lines = _aiter_lines
+    stream_response.aiter_bytes = _lines_as_bytes(_aiter_lines)
+    stream_cm = MagicMock()
+    stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
+    stream_cm.__aexit__ = AsyncMock(return_value=False)
+    client_instance = MagicMock()
+    client_instance.stream.return_value = stream_cm
+    mock_get_http_client.return_value = client_instance
+
+    async def _collect():
+        user = AuthenticatedUser(email="user@example.com")
+        chat_request = ChatRequest(query="hi", application="webuddhist", device_type=DeviceType.web.value, thread_id=None)
+        return [chunk async for chunk in get_chat_stream(user=user, chat_request=chat_request)]
+
+    async def _run():
+        return await asyncio.gather(_collect(), _collect())
+
+    first, second = asyncio.run(_run())
+
+    assert client_instance.stream.call_count == 1
+    assert first[1:] == second[1:]
+    saved_threads = {call.kwargs["response_payload"].thread_id for call in mock_save_chat.await_args_list}
+    assert saved_threads == set(thread_ids)
+
+
+@patch("chat_api.chats.chats_services.save_chat")
+@patch("chat_api.chats.chats_services.create_thread")
+@patch("chat_api.chats.chats_services.upstream.stream")
+def test_get_chat_stream_reports_unavailable_upstream_without_creating_thread(
+    mock_upstream_stream, mock_create_thread, mock_save_chat
+) -> None:
+    async def _unavailable(*args):
+        raise CircuitOpenError("All upstream endpoints are unavailable")
+        yield
+
+    mock_upstream_stream.side_effect = _unavailable
+
+    async def _collect():
+        user = AuthenticatedUser(email="user@example.com")
+        chat_request = ChatRequest(query="hi", application="webuddhist", device_type=DeviceType.web.value, thread_id=None)
+        return [chunk async for chunk in get_chat_stream(user=user, chat_request=chat_request)]
+
+    chunks = asyncio.run(_collect())
+
+    assert chunks == [UPSTREAM_ERROR_FRAME]
+    assert b'"type": "error"' in chunks[0]
+    mock_create_thread.assert_not_called()
+    mock_save_chat.assert_not_called()
+
+
+def _chat_request(thread_id=None) -> ChatRequest:
+    return ChatRequest(
+        email="user@example.com",
+        query="What is karma?",
+        application="webuddhist",
+        device_type=DeviceType.web.value,
+        thread_id=thread_id,
+    )
+
+
+def test_needs_upstream_stream_is_false_for_cached_first_turns() -> None:
+    cache = ResponseCache(max_size=10, ttl_seconds=60, replay_interval_seconds=0)
+    request = _chat_request()
+
+    with patch("chat_api.chats.chats_services.response_cache", cache), \
+            patch("chat_api.chats.chats_services.is_response_cache_enabled", return_value=True):
+        assert needs_upstream_stream(request) is True
+        cache.put(first_turn_key(request), [(b"data: x\n\n", {"type": "done", "data": {}})])
+        assert needs_upstream_stream(request) is False
+        assert needs_upstream_stream(_chat_request(thread_id=str(uuid4()))) is True
+
+
+def test_needs_upstream_stream_is_false_when_joining_a_shared_stream() -> None:
+    request = _chat_request()
+    coalescer = MagicMock()
+    coalescer.__contains__.return_value = True
+
+    with patch("chat_api.chats.chats_services.stream_coalescer", coalescer), \
+            patch("chat_api.chats.chats_services.is_stream_coalescing_enabled", return_value=True):
+        assert needs_upstream_stream(request) is False
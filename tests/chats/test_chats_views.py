@@ -1,14 +1,27 @@
-from unittest.mock import patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
 
 from chat_api.app import api
+from chat_api.auth_utils import AuthenticatedUser, get_current_user
+from chat_api.chats.admission import AdmissionRejected
+from chat_api.chats.chats_views import _AdmittedStreamingResponse
 from chat_api.error_contant import ErrorConstant
 
 client = TestClient(api)
 
 
+@pytest.fixture(autouse=True)
+def authenticated_user():
+    api.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(email="user@example.com")
+    yield
+    api.dependency_overrides.pop(get_current_user, None)
+
+
 @patch("chat_api.chats.chats_views.get")
 def test_get_chats_rejects_long_query(mock_get) -> None:
     mock_get.return_value = "5"
@@ -49,5 +62,98 @@ def test_get_chats_streaming_success(mock_get, mock_get_chat_stream) -> None:
     assert resp.status_code == status.HTTP_200_OK
     assert resp.headers["content-type"].startswith("text/event-stream")
     assert b"data: hello" in resp.content
+    # The stream gets the admission slot so a shared upstream stream can keep it.
+    assert mock_get_chat_stream.call_args.kwargs["slot"] is not None
+
+
+@patch("chat_api.chats.chats_views.get_chat_stream")
+@patch("chat_api.chats.chats_views.chat_admission.acquire", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_views.get")
+def test_get_chats_returns_429_when_upstream_is_saturated(mock_get, mock_acquire, mock_get_chat_stream) -> None:
+    mock_get.return_value = "2000"
+    mock_acquire.side_effect = AdmissionRejected("queue_full", retry_after_seconds=10)
+
+    payload = {
+        "query": "hi",
+        "application": "webuddhist",
+        "device_type": "web",
+        "thread_id": None,
+    }
+    resp = client.post("/chats", json=payload)
+
+    assert resp.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert resp.headers["retry-after"] == "10"
+    assert resp.json()["detail"]["error"] == ErrorConstant.TOO_MANY_REQUESTS
+    mock_get_chat_stream.assert_not_called()
+
+
+@patch("chat_api.chats.chats_views.get_chat_stream")
+@patch("chat_api.chats.chats_views.chat_admission.acquire", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_views.upstream.endpoints.retry_after_seconds", return_value=12)
+@patch("chat_api.chats.chats_views.upstream.endpoints.available", return_value=False)
+@patch("chat_api.chats.chats_views.get")
+def test_get_chats_returns_503_without_queueing_when_circuits_are_open(
+    mock_get, mock_available, mock_retry_after, mock_acquire, mock_get_chat_stream
+) -> None:
+    mock_get.return_value = "2000"
+
+    payload = {
+        "query": "hi",
+        "application": "webuddhist",
+        "device_type": "web",
+        "thread_id": None,
+    }
+    resp = client.post("/chats", json=payload)
+
+    assert resp.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert resp.headers["retry-after"] == "12"
+    assert resp.json()["detail"]["error"] == ErrorConstant.SERVICE_UNAVAILABLE
+    mock_acquire.assert_not_awaited()
+    mock_get_chat_stream.assert_not_called()
+
+
+@patch("chat_api.chats.chats_views.get_chat_stream")
+@patch("chat_api.chats.chats_views.chat_admission.acquire", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_views.upstream.endpoints.available", return_value=False)
+@patch("chat_api.chats.chats_views.needs_upstream_stream", return_value=False)
+@patch("chat_api.chats.chats_views.get")
+def test_get_chats_served_without_upstream_take_no_slot(
+    mock_get, mock_needs_upstream, mock_available, mock_acquire, mock_get_chat_stream
+) -> None:
+    mock_get.return_value = "2000"
+
+    async def fake_stream():
+        yield b"data: cached\n\n"
+
+    mock_get_chat_stream.return_value = fake_stream()
+
+    payload = {
+        "query": "hi",
+        "application": "webuddhist",
+        "device_type": "web",
+        "thread_id": None,
+    }
+    resp = client.post("/chats", json=payload)
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert b"data: cached" in resp.content
+    mock_acquire.assert_not_awaited()
+
+
+def test_admitted_response_releases_the_slot_when_the_body_never_starts() -> None:
+    slot = MagicMock()
+
+    async def fake_stream():
+        yield b"data: hello\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
 
+    response = _AdmittedStreamingResponse(slot, fake_stream(), media_type="text/event-stream")
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
 
+    slot.release.assert_called_once_with()
@@ -0,0 +1,100 @@
+from unittest.mock import patch
+
+from chat_api.chats.circuit_breaker import (
+    CIRCUIT_TRANSITIONS,
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+)
+
+
+def _breaker(name="https://upstream"):
+    return CircuitBreaker(
+        name,
+        failure_rate_threshold=0.5,
+        slow_call_seconds=5,
+        window_size=10,
+        min_calls=4,
+        open_seconds=30,
+    )
+
+
+def test_breaker_opens_once_failure_rate_reaches_threshold() -> None:
+    breaker = _breaker("https://opens")
+
+    breaker.on_success(0.1)
+    breaker.on_failure()
+    breaker.on_success(0.1)
+    assert breaker.state == CLOSED
+
+    breaker.on_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.before_call() is False
+    assert CIRCUIT_TRANSITIONS.value(endpoint="https://opens", state=OPEN) == 1
+
+
+def test_slow_first_frames_count_as_failures() -> None:
+    breaker = _breaker()
+
+    for _ in range(4):
+        breaker.on_success(6.0)
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success() -> None:
+    breaker = _breaker()
+
+    with patch("chat_api.chats.circuit_breaker.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        for _ in range(4):
+            breaker.on_failure()
+        assert breaker.state == OPEN
+
+        mock_monotonic.return_value = 1031.0
+        assert breaker.state == HALF_OPEN
+        assert breaker.before_call() is True
+        assert breaker.before_call() is False
+
+        breaker.on_success(0.1)
+
+    assert breaker.state == CLOSED
+    assert breaker.before_call() is True
+
+
+def test_failed_probe_reopens_and_cancelled_probe_frees_the_slot() -> None:
+    breaker = _breaker()
+
+    with patch("chat_api.chats.circuit_breaker.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        for _ in range(4):
+            breaker.on_failure()
+
+        mock_monotonic.return_value = 1031.0
+        assert breaker.before_call() is True
+        breaker.on_cancel()
+        assert breaker.before_call() is True
+
+        breaker.on_failure()
+        assert breaker.state == OPEN
+        assert breaker.before_call() is False
+
+
+def test_allows_calls_reports_availability_without_claiming_the_probe() -> None:
+    breaker = _breaker()
+
+    with patch("chat_api.chats.circuit_breaker.time.monotonic") as mock_monotonic:
+        mock_monotonic.return_value = 1000.0
+        for _ in range(4):
+            breaker.on_failure()
+        mock_monotonic.return_value = 1010.0
+        assert breaker.allows_calls is False
+        assert breaker.seconds_until_retry() == 20.0
+
+        mock_monotonic.return_value = 1031.0
+        assert breaker.allows_calls is True
+        assert breaker.allows_calls is True
+        assert breaker.before_call() is True
+        assert breaker.allows_calls is False
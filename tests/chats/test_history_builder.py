@@ -0,0 +1,56 @@
+from chat_api.chats.history_builder import (
+    HistoryTurn,
+    build_history,
+    extract_answer,
+    questions_only_strategy,
+)
+
+
+def _turn(question: str, answer: str) -> HistoryTurn:
+    return HistoryTurn(question=question, answer=answer, size=len(question) + len(answer))
+
+
+def test_build_history_keeps_everything_within_budget() -> None:
+    turns = [_turn("q1", "a1"), _turn("q2", "a2")]
+
+    payload = build_history(turns, "q3", budget=100)
+
+    assert [(m.role, m.content) for m in payload.messages] == [
+        ("user", "q1"),
+        ("assistant", "a1"),
+        ("user", "q2"),
+        ("assistant", "a2"),
+        ("user", "q3"),
+    ]
+
+
+def test_build_history_drops_oldest_turns_over_budget() -> None:
+    turns = [_turn("old question", "old answer"), _turn("q2", "a2")]
+
+    payload = build_history(turns, "q3", budget=10)
+
+    assert [m.content for m in payload.messages] == ["q2", "a2", "q3"]
+
+
+def test_build_history_always_keeps_current_query() -> None:
+    payload = build_history([_turn("q1", "a1")], "a very long current query", budget=5)
+
+    assert [m.content for m in payload.messages] == ["a very long current query"]
+
+
+def test_build_history_uses_strategy_cost() -> None:
+    turns = [_turn("q1", "a long answer that does not fit"), _turn("q2", "another long answer")]
+
+    payload = build_history(turns, "q3", budget=10, strategy=questions_only_strategy)
+
+    assert [(m.role, m.content) for m in payload.messages] == [
+        ("user", "q1"),
+        ("user", "q2"),
+        ("user", "q3"),
+    ]
+
+
+def test_extract_answer_handles_list_and_dict_responses() -> None:
+    assert extract_answer([{"type": "search_results", "data": []}, {"type": "token", "data": "hi"}]) == "hi"
+    assert extract_answer({"answer": "legacy", "search_results": []}) == "legacy"
+    assert extract_answer(None) == ""
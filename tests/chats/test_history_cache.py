@@ -0,0 +1,173 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from chat_api.chats.chats_services import get_conversation_history
+from chat_api.chats.history_builder import HistoryTurn, questions_only_strategy
+from chat_api.chats.history_cache import ConversationHistoryCache
+
+
+def _turn(question: str, answer: str) -> HistoryTurn:
+    return HistoryTurn(question=question, answer=answer, size=len(question) + len(answer))
+
+
+def test_history_cache_appends_only_to_cached_threads() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    cached_thread, uncached_thread = uuid4(), uuid4()
+    cache.put(cached_thread, 2, [_turn("q1", "a1")])
+
+    cache.append(cached_thread, _turn("q2", "a2"))
+    cache.append(uncached_thread, _turn("q2", "a2"))
+
+    assert [turn.question for turn in cache.get(cached_thread, 4)] == ["q1", "q2"]
+    assert cache.get(uncached_thread, 2) is None
+
+
+def test_history_cache_starts_entry_for_new_thread_and_accepts_str_ids() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+
+    cache.append(thread_id, _turn("q1", "a1"), new_thread=True)
+
+    assert [turn.question for turn in cache.get(str(thread_id), 2)] == ["q1"]
+
+
+def test_history_cache_trims_oldest_turns_beyond_max_chars() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=8)
+    thread_id = uuid4()
+    cache.put(thread_id, 4, [_turn("q1", "a1"), _turn("q2", "a2")])
+
+    cache.append(thread_id, _turn("q3", "a3"))
+
+    assert [turn.question for turn in cache.get(thread_id, 6)] == ["q2", "q3"]
+
+
+def test_history_cache_trims_by_the_strategy_cost() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=6, strategy=questions_only_strategy)
+    thread_id = uuid4()
+
+    cache.put(thread_id, 6, [_turn("q1", "a long answer"), _turn("q2", "a long answer"), _turn("q3", "a long answer")])
+
+    assert [turn.question for turn in cache.get(thread_id, 6)] == ["q1", "q2", "q3"]
+
+
+def test_history_cache_invalidate() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+
+    cache.invalidate(thread_id)
+
+    assert cache.get(thread_id, 2) is None
+
+
+def test_history_cache_misses_when_message_count_changed() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+
+    assert cache.get(thread_id, 4) is None
+
+
+def test_history_cache_keeps_turns_not_yet_written() -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    cache.append(thread_id, _turn("q2", "a2"))
+
+    # The write-behind queue has not flushed q2 yet, so the thread still reads 2.
+    assert [turn.question for turn in cache.get(thread_id, 2)] == ["q1", "q2"]
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    assert [turn.question for turn in cache.get(thread_id, 4)] == ["q1", "q2"]
+
+
+def _sessionlocal_cm(session):
+    cm = MagicMock()
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=False)
+    return cm
+
+
+@patch("chat_api.chats.chats_services.get_recent_turns", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.thread_repository.get_thread_by_id", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.SessionLocal")
+def test_get_conversation_history_skips_turn_query_on_cache_hit(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_recent_turns
+) -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_by_id.return_value = MagicMock(message_count=2)
+
+    with patch("chat_api.chats.chats_services.history_cache", cache):
+        payload = asyncio.run(get_conversation_history(str(thread_id), "q2"))
+
+    assert [m.content for m in payload.messages] == ["q1", "a1", "q2"]
+    mock_get_recent_turns.assert_not_awaited()
+
+
+@patch("chat_api.chats.chats_services.get_recent_turns", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.thread_repository.get_thread_by_id", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.SessionLocal")
+def test_get_conversation_history_rejects_deleted_thread_despite_cache(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_recent_turns
+) -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_by_id.return_value = None
+
+    with patch("chat_api.chats.chats_services.history_cache", cache):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(get_conversation_history(str(thread_id), "q2"))
+
+    assert exc_info.value.status_code == 404
+    mock_get_recent_turns.assert_not_awaited()
+
+
+@patch("chat_api.chats.chats_services.get_recent_turns", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.thread_repository.get_thread_by_id", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.SessionLocal")
+def test_get_conversation_history_reloads_when_thread_changed_elsewhere(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_recent_turns
+) -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_by_id.return_value = MagicMock(message_count=4)
+    mock_get_recent_turns.return_value = [
+        MagicMock(question="q1", answer="a1", size=4),
+        MagicMock(question="q2", answer="a2", size=4),
+    ]
+
+    with patch("chat_api.chats.chats_services.history_cache", cache):
+        payload = asyncio.run(get_conversation_history(str(thread_id), "q3"))
+
+    assert [m.content for m in payload.messages] == ["q1", "a1", "q2", "a2", "q3"]
+    assert [turn.question for turn in cache.get(thread_id, 4)] == ["q1", "q2"]
+
+
+@patch("chat_api.chats.chats_services.get_recent_turns", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.thread_repository.get_thread_by_id", new_callable=AsyncMock)
+@patch("chat_api.chats.chats_services.SessionLocal")
+def test_get_conversation_history_includes_chat_still_queued_for_writing(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_recent_turns
+) -> None:
+    cache = ConversationHistoryCache(max_threads=10, ttl_seconds=60, max_chars=1000)
+    thread_id = uuid4()
+    cache.put(thread_id, 2, [_turn("q1", "a1")])
+    cache.append(thread_id, _turn("q2", "a2"))
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_by_id.return_value = MagicMock(message_count=2)
+
+    with patch("chat_api.chats.chats_services.history_cache", cache):
+        payload = asyncio.run(get_conversation_history(str(thread_id), "q3"))
+
+    assert [m.content for m in payload.messages] == ["q1", "a1", "q2", "a2", "q3"]
+    mock_get_recent_turns.assert_not_awaited()
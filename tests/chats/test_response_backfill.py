@@ -0,0 +1,144 @@
+import asyncio
+import subprocess
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from chat_api.chats.response_backfill import backfill_batch
+from chat_api.chats.response_parts import split_response
+from chat_api.passages import passage_repository
+from chat_api.passages.passage_repository import passage_id, save_passages, to_passage_rows
+
+
+def test_split_response_list_shape() -> None:
+    parts = split_response([
+        {"type": "search_results", "data": [{"id": "123", "title": "Title", "text": "Text"}]},
+        {"type": "token", "data": "An answer"},
+        {"type": "done", "data": {}},
+    ])
+
+    assert parts.answer == "An answer"
+    assert parts.search_results == [{"id": "123", "title": "Title", "text": "Text"}]
+    assert parts.remaining == [{"type": "done", "data": {}}]
+
+
+def test_split_response_dict_shape() -> None:
+    parts = split_response({"answer": "An answer", "search_results": [{"id": "123"}]})
+
+    assert parts.answer == "An answer"
+    assert parts.search_results == [{"id": "123", "title": "", "text": ""}]
+    assert parts.remaining == []
+
+
+def test_split_response_unknown_shape() -> None:
+    assert split_response("not a response") is None
+
+
+def _row(response):
+    row = MagicMock()
+    row.id = uuid4()
+    row.response = response
+    return row
+
+
+def test_backfill_batch_converts_rows_and_skips_unknown_shapes() -> None:
+    rows = [
+        _row([{"type": "token", "data": "An answer"}]),
+        _row("not a response"),
+        _row({"answer": "Old answer", "search_results": []}),
+    ]
+    select_result = MagicMock()
+    select_result.all.return_value = rows
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[select_result, MagicMock()])
+    db.commit = AsyncMock()
+
+    with patch("chat_api.chats.response_backfill.save_passages", new_callable=AsyncMock):
+        last_id, converted = asyncio.run(backfill_batch(db, None, batch_size=3))
+
+    assert last_id == rows[-1].id
+    assert converted == 2
+    params = db.execute.await_args_list[1].args[1]
+    assert [param["b_answer"] for param in params] == ["An answer", "Old answer"]
+    assert [param["b_passage_ids"] for param in params] == [None, None]
+    db.commit.assert_awaited_once()
+
+
+def test_backfill_batch_moves_inline_search_results_to_passages() -> None:
+    search_results = [{"id": "123", "title": "Title", "text": "Text"}]
+    row = _row([
+        {"type": "search_results", "data": search_results},
+        {"type": "token", "data": "An answer"},
+        {"type": "done", "data": {}},
+    ])
+    select_result = MagicMock()
+    select_result.all.return_value = [row]
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[select_result, MagicMock()])
+    db.commit = AsyncMock()
+
+    with patch("chat_api.chats.response_backfill.save_passages", new_callable=AsyncMock) as mock_save_passages:
+        asyncio.run(backfill_batch(db, None, batch_size=10))
+
+    passage_rows = mock_save_passages.await_args.args[1]
+    assert passage_rows == [dict(id=passage_id("123", "Title", "Text"), source_id="123", title="Title", text="Text")]
+    params = db.execute.await_args_list[1].args[1]
+    assert params[0]["b_passage_ids"] == [passage_id("123", "Title", "Text")]
+    assert params[0]["b_answer"] == "An answer"
+    assert params[0]["b_response"] == [{"type": "done", "data": {}}]
+
+
+def test_backfill_batch_returns_none_when_done() -> None:
+    select_result = MagicMock()
+    select_result.all.return_value = []
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=select_result)
+    db.commit = AsyncMock()
+
+    assert asyncio.run(backfill_batch(db, uuid4(), batch_size=10)) == (None, 0)
+    db.commit.assert_not_awaited()
+
+
+def test_passage_id_is_stable_and_content_addressed() -> None:
+    assert passage_id("123", "Title", "Text") == passage_id("123", "Title", "Text")
+    assert passage_id("123", "Title", "Text") != passage_id("123", "Title", "Other text")
+    assert passage_id("ab", "c", "") != passage_id("a", "bc", "")
+
+
+def test_to_passage_rows_coerces_ids_and_skips_malformed_results() -> None:
+    rows = to_passage_rows([{"id": 42, "title": None, "text": "Text"}, "not a result"])
+
+    assert rows == [dict(id=passage_id("42", "", "Text"), source_id="42", title="", text="Text")]
+
+
+def test_split_response_skips_malformed_search_results() -> None:
+    parts = split_response([{"type": "search_results", "data": [None, {"id": "1", "title": "t", "text": "x"}]}])
+
+    assert parts.search_results == [{"id": "1", "title": "t", "text": "x"}]
+
+
+def test_save_passages_chunks_inserts_under_the_bind_parameter_limit() -> None:
+    db = MagicMock()
+    db.execute = AsyncMock()
+    rows = to_passage_rows([{"id": str(index), "title": "t", "text": "x"} for index in range(5)])
+
+    with patch.object(passage_repository, "ROWS_PER_INSERT", 2):
+        asyncio.run(save_passages(db, rows))
+
+    assert db.execute.await_count == 3
+
+
+def test_backfill_module_configures_mappers_on_its_own() -> None:
+    # A fresh interpreter, so models imported by other tests cannot hide a missing import.
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import chat_api.chats.response_backfill\n"
+            "from sqlalchemy.orm import configure_mappers\n"
+            "configure_mappers()"
+        ],
+        capture_output=True,
+        text=True
+    )
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,45 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from chat_api.chats.response_cache import ResponseCache, normalize_query
+
+DONE = (b'data: {"type": "done", "data": {}}\n\n', {"type": "done", "data": {}})
+TOKEN = (b'data: {"type": "token", "data": "Hi"}\n\n', {"type": "token", "data": "Hi"})
+
+
+def test_normalize_query_ignores_case_and_whitespace() -> None:
+    assert normalize_query("  What is   KARMA?\n") == normalize_query("what is karma?")
+
+
+def test_key_separates_applications_and_urls() -> None:
+    key = ResponseCache.key("What is karma?", "webuddhist", "https://a")
+
+    assert key == ResponseCache.key("what is  karma?", "webuddhist", "https://a")
+    assert key != ResponseCache.key("what is karma?", "other-app", "https://a")
+    assert key != ResponseCache.key("what is karma?", "webuddhist", "https://b")
+
+
+def test_put_only_stores_complete_streams() -> None:
+    cache = ResponseCache(max_size=10, ttl_seconds=60, replay_interval_seconds=0)
+    complete = ResponseCache.key("complete", "app", "url")
+    partial = ResponseCache.key("partial", "app", "url")
+
+    cache.put(complete, [TOKEN, DONE])
+    cache.put(partial, [TOKEN])
+
+    assert list(cache.get(complete)) == [TOKEN, DONE]
+    assert cache.get(partial) is None
+
+
+def test_replay_paces_frames() -> None:
+    cache = ResponseCache(max_size=10, ttl_seconds=60, replay_interval_seconds=0.05)
+
+    async def _run():
+        return [event async for event in cache.replay([TOKEN, TOKEN, DONE])]
+
+    with patch("chat_api.chats.response_cache.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        events = asyncio.run(_run())
+
+    assert events == [TOKEN, TOKEN, DONE]
+    assert mock_sleep.await_count == 2
+    mock_sleep.assert_awaited_with(0.05)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+from chat_api.chats.chats_services import sse_frame_from_line
+from chat_api.chats.sse import coalesce_token_events, frame_from_line, parse_event, passthrough_events
+
+LINES = [
+    'data: {"type": "search_results", "data": [{"id": "1", "title": "t", "text": "x"}]}',
+    'data: {"type": "token", "data": "Hello"}',
+    'data:{"type":"token","data":" world"}',
+    '{"type": "token", "data": "\\"quoted\\""}',
+    'data: {"type": "token", "data": "བོད་"}',
+    ":keep-alive",
+    "",
+    'data: {"type": "done", "data": {}}',
+]
+
+
+def _legacy(line):
+    items = []
+    frame = sse_frame_from_line(line, on_json=items.append)
+    return None if frame is None else (frame, items[0] if items else None)
+
+
+def test_frame_from_line_matches_line_parser() -> None:
+    for line in LINES:
+        assert frame_from_line(line.encode("utf-8")) == _legacy(line), line
+
+
+def test_parse_event_token_fast_path_falls_back_for_escapes() -> None:
+    assert parse_event(b'{"type": "token", "data": "plain"}') == {"type": "token", "data": "plain"}
+    escaped = '{"type": "token", "data": "line\\nbreak"}'.encode("utf-8")
+    assert parse_event(escaped) == json.loads(escaped)
+    extra = b'{"type": "token", "data": "a", "id": "b"}'
+    assert parse_event(extra) == {"type": "token", "data": "a", "id": "b"}
+
+
+def test_passthrough_events_handles_frames_split_across_chunks() -> None:
+    raw = "\n".join(LINES).encode("utf-8")
+
+    async def _chunks():
+        for start in range(0, len(raw), 7):
+            yield raw[start:start + 7]
+
+    async def _run():
+        return [event async for event in passthrough_events(_chunks())]
+
+    expected = [event for event in map(_legacy, LINES) if event is not None]
+    assert asyncio.run(_run()) == expected
+
+
+def _token(text):
+    item = {"type": "token", "data": text}
+    return f"data: {json.dumps(item)}\n\n".encode("utf-8"), item
+
+
+def _event(kind):
+    item = {"type": kind, "data": {}}
+    return f"data: {json.dumps(item)}\n\n".encode("utf-8"), item
+
+
+async def _from(events, delay=0.0):
+    for event in events:
+        if delay:
+            await asyncio.sleep(delay)
+        yield event
+
+
+def _coalesced(source, interval_seconds=60.0, max_bytes=1 << 20):
+    async def _run():
+        return [event async for event in coalesce_token_events(source, interval_seconds, max_bytes)]
+
+    return asyncio.run(_run())
+
+
+def test_coalesce_merges_tokens_and_flushes_on_other_events() -> None:
+    events = [_event("search_results"), _token("Hel"), _token("lo"), _event("done")]
+
+    result = _coalesced(_from(events))
+
+    assert [item for _, item in result] == [
+        {"type": "search_results", "data": {}},
+        {"type": "token", "data": "Hello"},
+        {"type": "done", "data": {}},
+    ]
+    assert result[1][0] == _token("Hello")[0]
+
+
+def test_coalesce_forwards_a_single_token_frame_unchanged() -> None:
+    token = (b'data:{"type":"token","data":"a"}\n\n', {"type": "token", "data": "a"})
+
+    assert _coalesced(_from([token])) == [token]
+
+
+def test_coalesce_flushes_when_max_bytes_is_reached() -> None:
+    frame_size = len(_token("a")[0])
+    events = [_token(text) for text in "abcde"]
+
+    result = _coalesced(_from(events), max_bytes=2 * frame_size)
+
+    assert [item["data"] for _, item in result] == ["ab", "cd", "e"]
+
+
+def test_coalesce_flushes_after_interval_while_upstream_is_idle() -> None:
+    events = [_token("a"), _token("b"), _token("c")]
+
+    result = _coalesced(_from(events, delay=0.05), interval_seconds=0.01)
+
+    assert [item["data"] for _, item in result] == ["a", "b", "c"]
@@ -0,0 +1,180 @@
+import asyncio
+
+from chat_api.chats.admission import FairAdmissionLimiter
+from chat_api.chats.stream_coalescer import CoalescedStreamError, StreamCoalescer
+
+
+def _event(data: str):
+    return (f"data: {data}\n\n".encode("utf-8"), {"type": "token", "data": data})
+
+
+def test_concurrent_subscribers_share_one_upstream_and_see_every_event() -> None:
+    coalescer = StreamCoalescer()
+    opened = []
+
+    async def _run():
+        gate = asyncio.Event()
+
+        async def _upstream():
+            opened.append(True)
+            yield _event("a")
+            await gate.wait()
+            yield _event("b")
+
+        first = coalescer.subscribe("key", _upstream)
+        first_events = [await first.__anext__()]
+        # Joins after "a" was emitted and must still receive it.
+        second_task = asyncio.create_task(_collect(coalescer.subscribe("key", _upstream)))
+        await asyncio.sleep(0)
+        gate.set()
+        first_events += [event async for event in first]
+        return first_events, await second_task
+
+    first_events, second_events = asyncio.run(_run())
+
+    assert len(opened) == 1
+    assert first_events == second_events == [_event("a"), _event("b")]
+    assert len(coalescer) == 0
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_on_complete_receives_the_full_stream() -> None:
+    coalescer = StreamCoalescer()
+    completed = []
+
+    async def _upstream():
+        yield _event("a")
+        yield _event("b")
+
+    async def _run():
+        return await _collect(coalescer.subscribe("key", _upstream, completed.append))
+
+    events = asyncio.run(_run())
+
+    assert completed == [events]
+
+
+def test_upstream_errors_reach_every_subscriber() -> None:
+    coalescer = StreamCoalescer()
+
+    async def _upstream():
+        yield _event("a")
+        raise ConnectionError("upstream went away")
+
+    async def _run():
+        return await asyncio.gather(
+            _collect(coalescer.subscribe("key", _upstream)),
+            _collect(coalescer.subscribe("key", _upstream)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(_run())
+
+    assert all(isinstance(result, CoalescedStreamError) for result in results)
+    assert all(isinstance(result.__cause__, ConnectionError) for result in results)
+    assert results[0] is not results[1]
+    assert len(coalescer) == 0
+
+
+def test_upstream_is_cancelled_when_last_subscriber_leaves() -> None:
+    coalescer = StreamCoalescer()
+    cancelled = []
+
+    async def _upstream():
+        try:
+            yield _event("a")
+            await asyncio.sleep(10)
+            yield _event("b")
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def _run():
+        events = coalescer.subscribe("key", _upstream)
+        await events.__anext__()
+        await events.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(_run())
+
+    assert cancelled == [True]
+    assert len(coalescer) == 0
+
+
+def test_subscriber_arriving_after_the_last_one_left_starts_a_new_stream() -> None:
+    coalescer = StreamCoalescer()
+    opened = []
+
+    async def _upstream():
+        opened.append(True)
+        yield _event("a")
+        await asyncio.sleep(10)
+
+    async def _run():
+        events = coalescer.subscribe("key", _upstream)
+        await events.__anext__()
+        await events.aclose()
+        # No yield to the loop: the old upstream task has not finished cancelling yet.
+        assert len(coalescer) == 0
+        events = coalescer.subscribe("key", _upstream)
+        first = await events.__anext__()
+        await events.aclose()
+        return first
+
+    assert asyncio.run(_run()) == _event("a")
+    assert len(opened) == 2
+
+
+def test_leader_slot_stays_held_by_the_shared_stream_after_the_leader_leaves() -> None:
+    coalescer = StreamCoalescer()
+    limiter = FairAdmissionLimiter(max_concurrent=1, max_queue_size=10, max_wait_seconds=1)
+
+    async def _run():
+        gate = asyncio.Event()
+
+        async def _upstream():
+            yield _event("a")
+            await gate.wait()
+            yield _event("b")
+
+        slot = await limiter.acquire("app", "leader")
+        leader = coalescer.subscribe("key", _upstream, slot=slot)
+        await leader.__anext__()
+        follower = coalescer.subscribe("key", _upstream)
+        await follower.__anext__()
+
+        await leader.aclose()
+        # The view releases the leader's handle when its response ends.
+        slot.release()
+        held_after_leader_left = limiter.active
+        gate.set()
+        rest = await _collect(follower)
+        await asyncio.sleep(0)
+        return held_after_leader_left, rest, limiter.active
+
+    held_after_leader_left, rest, active_after_stream = asyncio.run(_run())
+
+    assert held_after_leader_left == 1
+    assert rest == [_event("b")]
+    assert active_after_stream == 0
+
+
+def test_leader_slot_is_released_when_the_shared_stream_is_cancelled() -> None:
+    coalescer = StreamCoalescer()
+    limiter = FairAdmissionLimiter(max_concurrent=1, max_queue_size=10, max_wait_seconds=1)
+
+    async def _upstream():
+        yield _event("a")
+        await asyncio.sleep(10)
+
+    async def _run():
+        events = coalescer.subscribe("key", _upstream, slot=await limiter.acquire("app", "leader"))
+        await events.__anext__()
+        await events.aclose()
+        await asyncio.sleep(0.01)
+        return limiter.active
+
+    assert asyncio.run(_run()) == 0
@@ -0,0 +1,264 @@
+import asyncio
+
+import httpx
+import pytest
+
+from chat_api.chats.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from chat_api.chats.upstream import HedgedUpstream, UpstreamEndpoints
+
+
+def _event(data: str):
+    return (f"data: {data}\n\n".encode("utf-8"), {"type": "token", "data": data})
+
+
+def _upstream(urls, hedge_after_seconds=0.05, max_retries=2):
+    return HedgedUpstream(
+        UpstreamEndpoints(urls, cooldown_seconds=30),
+        hedge_after_seconds=hedge_after_seconds,
+        max_retries=max_retries,
+        retry_backoff_seconds=0,
+    )
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_endpoints_order_puts_failed_endpoints_last() -> None:
+    endpoints = UpstreamEndpoints(["https://a", "https://b", "https://c"], cooldown_seconds=30)
+
+    endpoints.record_failure("https://a")
+    assert endpoints.ordered() == ["https://b", "https://c", "https://a"]
+
+    endpoints.record_success("https://a", first_frame_seconds=0.1)
+    assert endpoints.ordered() == ["https://a", "https://b", "https://c"]
+
+
+def test_fast_primary_is_not_hedged() -> None:
+    upstream = _upstream(["https://a", "https://b"])
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        yield _event("a")
+        yield _event("b")
+
+    events = asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert events == [_event("a"), _event("b")]
+    assert opened == ["https://a"]
+
+
+def test_slow_primary_is_hedged_and_cancelled() -> None:
+    upstream = _upstream(["https://slow", "https://fast"], hedge_after_seconds=0.01)
+    cancelled = []
+
+    async def _open(url, payload):
+        if url == "https://slow":
+            try:
+                await asyncio.sleep(10)
+                yield _event("slow")
+            except asyncio.CancelledError:
+                cancelled.append(url)
+                raise
+        else:
+            yield _event("fast")
+
+    events = asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert events == [_event("fast")]
+    assert cancelled == ["https://slow"]
+
+
+def test_connection_errors_fail_over_before_the_first_frame() -> None:
+    upstream = _upstream(["https://down", "https://up"], hedge_after_seconds=0)
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        if url == "https://down":
+            raise httpx.ConnectError("connection refused")
+        yield _event("a")
+
+    events = asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert events == [_event("a")]
+    assert opened == ["https://down", "https://up"]
+    assert upstream.endpoints.ordered() == ["https://up", "https://down"]
+
+
+def test_retries_with_backoff_then_gives_up() -> None:
+    upstream = _upstream(["https://down"], max_retries=2)
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        raise httpx.ConnectError("connection refused")
+        yield
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert len(opened) == 3
+
+
+def test_errors_after_the_first_frame_are_not_retried() -> None:
+    upstream = _upstream(["https://a", "https://b"])
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        yield _event("a")
+        raise httpx.ReadError("connection reset")
+
+    async def _run():
+        received = []
+        with pytest.raises(httpx.ReadError):
+            async for event in upstream.stream(_open, {}):
+                received.append(event)
+        return received
+
+    assert asyncio.run(_run()) == [_event("a")]
+    assert opened == ["https://a"]
+
+
+def test_open_circuits_fail_fast_without_calling_the_upstream() -> None:
+    upstream = HedgedUpstream(
+        UpstreamEndpoints(
+            ["https://a"],
+            cooldown_seconds=30,
+            breaker_factory=lambda url: CircuitBreaker(url, 0.5, 5, window_size=10, min_calls=1, open_seconds=30),
+        ),
+        hedge_after_seconds=0,
+        max_retries=2,
+        retry_backoff_seconds=0,
+    )
+    upstream.endpoints.breakers["https://a"].on_failure()
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        yield _event("a")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert opened == []
+
+
+def _breaker_upstream(urls, max_retries=0):
+    return HedgedUpstream(
+        UpstreamEndpoints(
+            urls,
+            cooldown_seconds=30,
+            breaker_factory=lambda url: CircuitBreaker(url, 0.5, 5, window_size=10, min_calls=1, open_seconds=30),
+        ),
+        hedge_after_seconds=0,
+        max_retries=max_retries,
+        retry_backoff_seconds=0,
+    )
+
+
+def test_half_open_probe_is_released_at_the_first_frame() -> None:
+    upstream = _breaker_upstream(["https://a"])
+    breaker = upstream.endpoints.breakers["https://a"]
+    breaker._state = HALF_OPEN
+    release = asyncio.Event()
+
+    async def _open(url, payload):
+        yield _event("a")
+        await release.wait()
+        yield _event("b")
+
+    async def _run():
+        stream = upstream.stream(_open, {})
+        first = await stream.__anext__()
+        state_mid_stream = breaker.state
+        available_mid_stream = upstream.endpoints.available()
+        release.set()
+        rest = [event async for event in stream]
+        return [first] + rest, state_mid_stream, available_mid_stream
+
+    events, state_mid_stream, available_mid_stream = asyncio.run(_run())
+
+    assert events == [_event("a"), _event("b")]
+    assert state_mid_stream == CLOSED
+    assert available_mid_stream is True
+
+
+def test_client_errors_do_not_count_against_the_circuit() -> None:
+    upstream = _breaker_upstream(["https://a"])
+    request = httpx.Request("POST", "https://a")
+
+    async def _open(url, payload):
+        raise httpx.HTTPStatusError("bad request", request=request, response=httpx.Response(422, request=request))
+        yield
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert upstream.endpoints.breakers["https://a"].state == CLOSED
+    assert upstream.endpoints.ordered() == ["https://a"]
+
+
+def test_server_errors_open_the_circuit() -> None:
+    upstream = _breaker_upstream(["https://a"])
+    request = httpx.Request("POST", "https://a")
+
+    async def _open(url, payload):
+        raise httpx.HTTPStatusError("unavailable", request=request, response=httpx.Response(503, request=request))
+        yield
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_collect(upstream.stream(_open, {})))
+
+    assert upstream.endpoints.breakers["https://a"].state == OPEN
+    assert upstream.endpoints.available() is False
+    assert upstream.endpoints.retry_after_seconds() == 30
+
+
+def test_hedges_are_capped_across_streams() -> None:
+    upstream = HedgedUpstream(
+        UpstreamEndpoints(["https://a", "https://b"], cooldown_seconds=30),
+        hedge_after_seconds=0.01,
+        max_retries=0,
+        retry_backoff_seconds=0,
+        max_concurrent_hedges=1,
+    )
+    opened = []
+
+    async def _open(url, payload):
+        opened.append(url)
+        await asyncio.sleep(0.05)
+        yield _event(url)
+
+    async def _run():
+        return await asyncio.gather(
+            _collect(upstream.stream(_open, {})),
+            _collect(upstream.stream(_open, {})),
+        )
+
+    asyncio.run(_run())
+
+    assert sorted(opened) == ["https://a", "https://a", "https://b"]
+    assert upstream.active_hedges == 0
+
+
+def test_client_disconnect_before_the_first_frame_leaves_no_tasks_behind() -> None:
+    upstream = _upstream(["https://a", "https://b"], hedge_after_seconds=0.01)
+
+    async def _open(url, payload):
+        await asyncio.sleep(10)
+        yield _event(url)
+
+    async def _run():
+        consumer = asyncio.create_task(_collect(upstream.stream(_open, {})))
+        await asyncio.sleep(0.05)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(_run()) == []
+    assert upstream.active_hedges == 0
@@ -0,0 +1,34 @@
+import asyncio
+from unittest.mock import patch
+
+from chat_api import http_client
+from chat_api.http_client import close_http_client, create_http_client, get_http_client
+
+
+def test_get_http_client_reuses_one_client_until_closed() -> None:
+    async def _run():
+        first = get_http_client()
+        second = get_http_client()
+        await close_http_client()
+        third = get_http_client()
+        await close_http_client()
+        return first, second, third
+
+    first, second, third = asyncio.run(_run())
+
+    assert first is second
+    assert first.is_closed
+    assert third is not first
+    assert http_client._client is None
+
+
+def test_create_http_client_falls_back_to_http1_without_h2() -> None:
+    with patch.dict("os.environ", {"HTTP_CLIENT_HTTP2": "true"}), \
+            patch("chat_api.http_client._http2_available", return_value=False), \
+            patch("chat_api.http_client.httpx.AsyncClient") as mock_async_client:
+        create_http_client()
+
+    assert mock_async_client.call_args.kwargs["http2"] is False
+    limits = mock_async_client.call_args.kwargs["limits"]
+    assert limits.max_connections == 100
+    assert limits.keepalive_expiry == 30.0
@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import exc
+
+from chat_api.app import api
+from chat_api.db.pool import POOL_TIMEOUTS, POOL_WAIT_SECONDS, InstrumentedAsyncQueuePool
+from chat_api.metrics import Counter, Gauge, Histogram, MetricsRegistry, _Metric
+
+client = TestClient(api)
+
+
+def test_counter_renders_labelled_samples() -> None:
+    with patch("chat_api.metrics.REGISTRY", MetricsRegistry()) as registry:
+        counter = Counter("requests_total", "Requests.", ["route"])
+        counter.inc(route="/threads")
+        counter.inc(2, route="/threads")
+
+        rendered = registry.render()
+
+    assert "# TYPE requests_total counter" in rendered
+    assert 'requests_total{route="/threads"} 3.0' in rendered
+
+
+def test_gauge_reads_callback_on_render() -> None:
+    values = iter([1, 7])
+    with patch("chat_api.metrics.REGISTRY", MetricsRegistry()) as registry:
+        Gauge("in_flight", "In flight.", function=lambda: next(values))
+
+        assert "in_flight 1.0" in registry.render()
+        assert "in_flight 7.0" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    with patch("chat_api.metrics.REGISTRY", MetricsRegistry()) as registry:
+        histogram = Histogram("wait_seconds", "Wait.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+
+        rendered = registry.render()
+
+    assert 'wait_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'wait_seconds_bucket{le="1.0"} 2' in rendered
+    assert 'wait_seconds_bucket{le="+Inf"} 3' in rendered
+    assert "wait_seconds_count 3" in rendered
+
+
+def test_instrumented_pool_records_wait_and_timeouts() -> None:
+    waits_before = POOL_WAIT_SECONDS.count()
+    timeouts_before = POOL_TIMEOUTS.value()
+
+    with patch(
+        "chat_api.db.pool.AsyncAdaptedQueuePool.connect",
+        side_effect=exc.TimeoutError("QueuePool limit reached"),
+    ):
+        pool = InstrumentedAsyncQueuePool(lambda: None)
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+
+    assert POOL_WAIT_SECONDS.count() == waits_before + 1
+    assert POOL_TIMEOUTS.value() == timeouts_before + 1
+
+
+def test_metrics_endpoint_exposes_pool_stats() -> None:
+    resp = client.get("/metrics")
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "db_pool_checked_out" in resp.text
+    assert "db_pool_wait_seconds_bucket" in resp.text
+
+
+def test_metric_base_class_cannot_be_instantiated() -> None:
+    with pytest.raises(TypeError):
+        _Metric("incomplete_metric", "A metric without samples.")
@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from chat_api.app import api
+from chat_api.auth_utils import AuthenticatedUser, get_current_user
+from chat_api.json_response import ModelJSONResponse
+from chat_api.threads.thread_enums import MessageRole
+from chat_api.threads.thread_response_model import (
+    Message, SearchResult, ThreadListResponse, ThreadResponse, ThreadSummary
+)
+
+client = TestClient(api)
+
+
+@pytest.fixture(autouse=True)
+def authenticated_user():
+    api.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(email="user@example.com")
+    yield
+    api.dependency_overrides.pop(get_current_user, None)
+
+
+def _thread_response() -> ThreadResponse:
+    chat_id = uuid4()
+    return ThreadResponse.model_construct(
+        id=uuid4(),
+        title="བོད་ thread",
+        messages=[
+            Message.model_construct(role=MessageRole.USER, content="What is karma?", id=chat_id, searchResults=None),
+            Message.model_construct(
+                role=MessageRole.ASSISTANT,
+                content="Karma is action.",
+                id=chat_id,
+                searchResults=[SearchResult.model_construct(id="s1", title="Source", text="Passage")],
+            ),
+        ],
+        next_cursor="abc",
+    )
+
+
+@patch("chat_api.threads.thread_views.thread_service.get_thread_by_id", new_callable=AsyncMock)
+def test_get_thread_details_encodes_constructed_response(mock_get_thread_by_id) -> None:
+    response = _thread_response()
+    mock_get_thread_by_id.return_value = response
+
+    resp = client.get(f"/threads/{response.id}")
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.json() == ThreadResponse.model_validate(response.model_dump()).model_dump(mode="json")
+    assert resp.json()["messages"][0]["role"] == "user"
+
+
+@patch("chat_api.threads.thread_views.thread_service.get_all_threads", new_callable=AsyncMock)
+def test_get_threads_encodes_constructed_response(mock_get_all_threads) -> None:
+    mock_get_all_threads.return_value = ThreadListResponse.model_construct(
+        data=[ThreadSummary.model_construct(id="t1", title="Title")], total=1, next_cursor=None
+    )
+
+    resp = client.get("/threads", params={"application": "webuddhist"})
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json() == {"data": [{"id": "t1", "title": "Title"}], "total": 1, "next_cursor": None}
+
+
+def test_model_json_response_uses_pydantic_encoder() -> None:
+    response = _thread_response()
+
+    assert ModelJSONResponse(response).body == response.model_dump_json().encode("utf-8")
+
+
+@patch("chat_api.threads.thread_views.thread_service.get_thread_by_id", new_callable=AsyncMock)
+def test_get_thread_details_without_paging_returns_the_whole_thread(mock_get_thread_by_id) -> None:
+    response = _thread_response()
+    mock_get_thread_by_id.return_value = response
+
+    client.get(f"/threads/{response.id}")
+
+    mock_get_thread_by_id.assert_awaited_once_with(thread_id=response.id, before=None, limit=None)
+
+
+@patch("chat_api.threads.thread_views.get_int", side_effect=lambda key: {"THREAD_MESSAGES_DEFAULT_LIMIT": 50, "THREAD_MESSAGES_MAX_LIMIT": 200}[key])
+@patch("chat_api.threads.thread_views.thread_service.get_thread_by_id", new_callable=AsyncMock)
+def test_get_thread_details_pages_when_a_cursor_or_limit_is_given(mock_get_thread_by_id, mock_get_int) -> None:
+    response = _thread_response()
+    mock_get_thread_by_id.return_value = response
+
+    client.get(f"/threads/{response.id}", params={"before": "abc"})
+    client.get(f"/threads/{response.id}", params={"limit": 500})
+
+    assert [call.kwargs["limit"] for call in mock_get_thread_by_id.await_args_list] == [50, 200]
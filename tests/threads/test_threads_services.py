@@ -1,28 +1,39 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 from datetime import datetime
 
 import pytest
 from fastapi import HTTPException, status
 
+from chat_api.auth_utils import AuthenticatedUser
+from chat_api.response_message import UNTITLED_THREAD
 from chat_api.threads.models import DeviceType
 from chat_api.threads.threads_request_model import ThreadCreateRequest
 from chat_api.threads.thread_enums import MessageRole
-from chat_api.threads.thread_service import create_thread, transform_chats_to_messages
+from chat_api.threads.thread_service import (
+    create_thread,
+    decode_thread_cursor,
+    encode_thread_cursor,
+    get_all_threads,
+    get_thread_by_id,
+    transform_chats_to_messages,
+)
+from chat_api.ttl_cache import TTLCache
 
 
 def _sessionlocal_cm(session):
     cm = MagicMock()
-    cm.__enter__.return_value = session
-    cm.__exit__.return_value = False
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=False)
     return cm
 
 
 @patch("chat_api.threads.thread_service.thread_repository.create_thread")
-@patch("chat_api.threads.thread_service.get_application_by_name_service")
+@patch("chat_api.threads.thread_service.application_registry.get_application_id")
 @patch("chat_api.threads.thread_service.SessionLocal")
 def test_create_thread_success(
-    mock_sessionlocal, mock_get_application_by_name_service, mock_create_thread_repo
+    mock_sessionlocal, mock_get_application_id, mock_create_thread_repo
 ) -> None:
     db_session = MagicMock()
     mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
@@ -33,46 +44,41 @@ def test_create_thread_success(
         application_name="webuddhist",
     )
 
-    fake_application = MagicMock()
-    fake_application.id = MagicMock()
-    mock_get_application_by_name_service.return_value = fake_application
+    application_id = uuid4()
+    mock_get_application_id.return_value = application_id
 
     fake_thread = MagicMock()
     mock_create_thread_repo.return_value = fake_thread
 
-    result = create_thread(thread_request=req)
+    result = asyncio.run(create_thread(thread_request=req))
 
     assert result is fake_thread
     mock_sessionlocal.assert_called_once()
-    mock_get_application_by_name_service.assert_called_once_with(
-        db_session, name="webuddhist"
-    )
-    mock_create_thread_repo.assert_called_once_with(
-        db_session, application_id=fake_application.id, thread_request=req
+    mock_get_application_id.assert_awaited_once_with("webuddhist")
+    mock_create_thread_repo.assert_awaited_once_with(
+        db_session, application_id=application_id, thread_request=req
     )
 
 
 @patch("chat_api.threads.thread_service.thread_repository.create_thread")
-@patch("chat_api.threads.thread_service.get_application_by_name_service")
+@patch("chat_api.threads.thread_service.application_registry.get_application_id")
 @patch("chat_api.threads.thread_service.SessionLocal")
 def test_create_thread_application_not_found(
-    mock_sessionlocal, mock_get_application_by_name_service, mock_create_thread_repo
+    mock_sessionlocal, mock_get_application_id, mock_create_thread_repo
 ) -> None:
-    db_session = MagicMock()
-    mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
-
     req = ThreadCreateRequest(
         email="user@example.com",
         device_type=DeviceType.web,
         application_name="missing",
     )
-    mock_get_application_by_name_service.return_value = None
+    mock_get_application_id.return_value = None
 
     with pytest.raises(HTTPException) as exc:
-        create_thread(thread_request=req)
+        asyncio.run(create_thread(thread_request=req))
 
     assert exc.value.status_code == status.HTTP_404_NOT_FOUND
     assert exc.value.detail == "Application not found"
+    mock_sessionlocal.assert_not_called()
     mock_create_thread_repo.assert_not_called()
 
 
@@ -83,6 +89,7 @@ def test_transform_chats_to_messages_with_new_format() -> None:
     mock_chat.id = chat_id
     mock_chat.question = "what is emptiness"
     mock_chat.created_at = datetime.utcnow()
+    mock_chat.answer = None
     mock_chat.response = [
         {
             "type": "search_results",
@@ -137,6 +144,7 @@ def test_transform_chats_to_messages_with_old_format() -> None:
     mock_chat.id = chat_id
     mock_chat.question = "test question"
     mock_chat.created_at = datetime.utcnow()
+    mock_chat.answer = None
     mock_chat.response = {
         "answer": "test answer",
         "search_results": [
@@ -164,6 +172,7 @@ def test_transform_chats_to_messages_no_search_results() -> None:
     mock_chat.id = chat_id
     mock_chat.question = "simple question"
     mock_chat.created_at = datetime.utcnow()
+    mock_chat.answer = None
     mock_chat.response = [
         {
             "type": "token",
@@ -182,3 +191,208 @@ def test_transform_chats_to_messages_no_search_results() -> None:
     assert messages[1].searchResults is None
 
 
+def test_transform_chats_to_messages_reads_backfilled_columns() -> None:
+    chat_id = uuid4()
+    mock_chat = MagicMock()
+    mock_chat.id = chat_id
+    mock_chat.question = "what is emptiness"
+    mock_chat.created_at = datetime.utcnow()
+    mock_chat.answer = "Emptiness refers to the lack of inherent existence."
+    mock_chat.passage_ids = None
+    mock_chat.response = None
+
+    messages = transform_chats_to_messages([mock_chat])
+
+    assert len(messages) == 2
+    assert messages[1].content == "Emptiness refers to the lack of inherent existence."
+    assert messages[1].searchResults is None
+
+
+def _summary_row(title, updated_at):
+    row = MagicMock()
+    row.id = uuid4()
+    row.title = title
+    row.updated_at = updated_at
+    return row
+
+
+@patch("chat_api.threads.thread_service.thread_repository.count_threads")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_summaries")
+@patch("chat_api.threads.thread_service.application_registry.get_application_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_all_threads_returns_next_cursor_when_more_rows(
+    mock_sessionlocal, mock_get_application_id, mock_get_thread_summaries, mock_count_threads
+) -> None:
+    application_id = uuid4()
+    mock_get_application_id.return_value = application_id
+    db_session = MagicMock()
+    mock_sessionlocal.return_value = _sessionlocal_cm(db_session)
+    rows = [
+        _summary_row("first question", datetime(2025, 1, 3)),
+        _summary_row(None, datetime(2025, 1, 2)),
+        _summary_row("third question", datetime(2025, 1, 1)),
+    ]
+    mock_get_thread_summaries.return_value = rows
+    mock_count_threads.return_value = 7
+    user = AuthenticatedUser(email="cursor@example.com")
+
+    with patch("chat_api.threads.thread_service._thread_count_cache", TTLCache(10, 60)):
+        result = asyncio.run(get_all_threads(user=user, application="webuddhist", limit=2))
+
+    assert [item.title for item in result.data] == ["first question", UNTITLED_THREAD]
+    assert result.total == 7
+    assert decode_thread_cursor(result.next_cursor) == (rows[1].updated_at, rows[1].id)
+    mock_get_thread_summaries.assert_awaited_once_with(
+        db_session, "cursor@example.com", application_id, limit=3, skip=0, after=None
+    )
+
+
+@patch("chat_api.threads.thread_service.thread_repository.count_threads")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_summaries")
+@patch("chat_api.threads.thread_service.application_registry.get_application_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_all_threads_pages_after_cursor_and_caches_total(
+    mock_sessionlocal, mock_get_application_id, mock_get_thread_summaries, mock_count_threads
+) -> None:
+    mock_get_application_id.return_value = uuid4()
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_summaries.return_value = [_summary_row("older question", datetime(2025, 1, 1))]
+    mock_count_threads.return_value = 3
+    user = AuthenticatedUser(email="cursor@example.com")
+    after = (datetime(2025, 1, 2, 10, 30), uuid4())
+    cursor = encode_thread_cursor(*after)
+
+    with patch("chat_api.threads.thread_service._thread_count_cache", TTLCache(10, 60)):
+        first = asyncio.run(get_all_threads(user=user, application="webuddhist", limit=2, cursor=cursor))
+        second = asyncio.run(get_all_threads(user=user, application="webuddhist", limit=2, cursor=cursor))
+
+    assert first.next_cursor is None
+    assert first.total == second.total == 3
+    mock_count_threads.assert_awaited_once()
+    assert mock_get_thread_summaries.await_args.kwargs["after"] == after
+
+
+@patch("chat_api.threads.thread_service.thread_repository.count_threads")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_summaries")
+@patch("chat_api.threads.thread_service.application_registry.get_application_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_all_threads_can_skip_total(
+    mock_sessionlocal, mock_get_application_id, mock_get_thread_summaries, mock_count_threads
+) -> None:
+    mock_get_application_id.return_value = uuid4()
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_summaries.return_value = []
+    user = AuthenticatedUser(email="cursor@example.com")
+
+    result = asyncio.run(get_all_threads(user=user, application="webuddhist", include_total=False))
+
+    assert result.total is None
+    mock_count_threads.assert_not_called()
+
+
+def test_decode_thread_cursor_rejects_garbage() -> None:
+    with pytest.raises(HTTPException) as exc:
+        decode_thread_cursor("not-a-cursor")
+
+    assert exc.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _chat(question, created_at):
+    chat = MagicMock()
+    chat.id = uuid4()
+    chat.question = question
+    chat.created_at = created_at
+    chat.answer = f"answer to {question}"
+    chat.passage_ids = None
+    chat.response = []
+    return chat
+
+
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_chats")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_by_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_thread_by_id_uses_stored_title(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_thread_chats
+) -> None:
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    thread = MagicMock()
+    thread.id = uuid4()
+    thread.title = "the first question"
+    mock_get_thread_by_id.return_value = thread
+    mock_get_thread_chats.return_value = [_chat("a later question", datetime(2025, 1, 2))]
+
+    result = asyncio.run(get_thread_by_id(thread.id))
+
+    assert result.title == "the first question"
+    assert [message.content for message in result.messages] == [
+        "a later question",
+        "answer to a later question",
+    ]
+    assert result.next_cursor is None
+    assert mock_get_thread_chats.await_args.kwargs == {"limit": None, "before": None}
+
+
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_chats")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_by_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_thread_by_id_returns_latest_window_and_cursor(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_thread_chats
+) -> None:
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    thread = MagicMock()
+    thread.id = uuid4()
+    thread.title = "q1"
+    mock_get_thread_by_id.return_value = thread
+    chats = [_chat(f"q{i}", datetime(2025, 1, i)) for i in range(2, 5)]
+    mock_get_thread_chats.return_value = chats
+    before = (datetime(2025, 1, 5), uuid4())
+
+    result = asyncio.run(get_thread_by_id(thread.id, before=encode_thread_cursor(*before), limit=2))
+
+    assert [message.content for message in result.messages if message.role == MessageRole.USER] == ["q3", "q4"]
+    assert decode_thread_cursor(result.next_cursor) == (chats[1].created_at, chats[1].id)
+    assert mock_get_thread_chats.await_args.kwargs == {"limit": 3, "before": before}
+
+
+@patch("chat_api.threads.thread_service.get_passages_by_ids")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_chats")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_by_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_thread_by_id_fetches_shared_passages_once(
+    mock_sessionlocal, mock_get_thread_by_id, mock_get_thread_chats, mock_get_passages_by_ids
+) -> None:
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    thread = MagicMock()
+    thread.id = uuid4()
+    thread.title = "q1"
+    mock_get_thread_by_id.return_value = thread
+    chats = [_chat("q1", datetime(2025, 1, 1)), _chat("q2", datetime(2025, 1, 2))]
+    chats[0].passage_ids = ["hash-a", "hash-b"]
+    chats[1].passage_ids = ["hash-b"]
+    mock_get_thread_chats.return_value = chats
+    passage = MagicMock(source_id="source-b", title="Title B", text="Text B")
+    mock_get_passages_by_ids.return_value = {
+        "hash-a": MagicMock(source_id="source-a", title="Title A", text="Text A"),
+        "hash-b": passage,
+    }
+
+    result = asyncio.run(get_thread_by_id(thread.id))
+
+    mock_get_passages_by_ids.assert_awaited_once()
+    assert sorted(mock_get_passages_by_ids.await_args.args[1]) == ["hash-a", "hash-b", "hash-b"]
+    assert [sr.id for sr in result.messages[1].searchResults] == ["source-a", "source-b"]
+    assert [sr.id for sr in result.messages[3].searchResults] == ["source-b"]
+
+
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_chats")
+@patch("chat_api.threads.thread_service.thread_repository.get_thread_by_id")
+@patch("chat_api.threads.thread_service.SessionLocal")
+def test_get_thread_by_id_not_found(mock_sessionlocal, mock_get_thread_by_id, mock_get_thread_chats) -> None:
+    mock_sessionlocal.return_value = _sessionlocal_cm(MagicMock())
+    mock_get_thread_by_id.return_value = None
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(get_thread_by_id(uuid4()))
+
+    assert exc.value.status_code == status.HTTP_404_NOT_FOUND
+    mock_get_thread_chats.assert_not_called()